@@ -0,0 +1,262 @@
+# cleaner/benchmark.py
+# Parity + timing harness for the cleaner: no MinIO, RabbitMQ or gold file needed.
+#
+#   python benchmark.py --rows 250000
+#   python benchmark.py --parity            # parity only (exit 1 on a mismatch)
+#   python benchmark.py --ingest            # gold MERGE throughput per hand-off form
+#
+# 1. generates a merged frame shaped like the transformer's hand-off: list
+#    columns as JSON text (CSV) or as native lists (parquet / arrow), with a
+#    sprinkling of missing, malformed and out-of-range values,
+# 2. checks cleaning_rules.aggregate against aggregate_rowwise for both
+#    hand-offs (same columns, dtypes and values),
+# 3. times both, reporting rows/s.
+# --ingest instead times reading the CSV hand-off (plain pd.read_csv vs
+# read_frame's Arrow-backed strings) and duckdb_writer's MERGE into a
+# scratch gold file, fed a numpy / object-dtype frame and an Arrow-backed
+# one, each through DuckDB's pandas scan and converted to an Arrow table
+# (what the writer registers), and a ready Arrow table.
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from typing import Any, Dict, List
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import cleaning_rules as R
+import duckdb_writer as W
+from minio_io import read_frame
+
+VEHICLE_USES = ["PERSONAL", "POLICE", "TAXI/FOR HIRE", "COMMERCIAL - SINGLE UNIT", "FIRE",
+                "CAMPER/RV - SINGLE UNIT", "UNKNOWN/NA", "OTHER", "CTA", "RIDESHARE SERVICE"]
+PERSON_TYPES = ["DRIVER", "PASSENGER", "PEDESTRIAN", "BICYCLE", "NON-MOTOR VEHICLE", "NON-CONTACT VEHICLE"]
+
+# hand-written corner cases, appended to every generated frame (CSV hand-off only)
+EDGE_AGES = [None, "", "[]", "not json", "{\"age\": 30}", "42", "[null]", "[9, 10, 110, 111]",
+             "[\"35\", \" 40 \", \"abc\", true, false]", "[\"1e1\", 2.5e1, \"nan\", \"inf\"]"]
+EDGE_USES = [None, "[]", "bad[", "[\"POLICE\"]", "[\"police\"]", "[1, null, \"PERSONAL\"]"]
+EDGE_TYPES = [None, "[]", "[\"BICYCLE\"]", "[\"NON-MOTOR VEHICLE\", \"DRIVER\"]", "\"BICYCLE\""]
+
+
+def _sorted_unique(values: List[Any]) -> List[Any]:
+    return sorted(set(values))
+
+
+def generate_lists(rows: int, seed: int) -> Dict[str, List[Any]]:
+    """Per-crash lists as the transformer aggregates them (sorted, unique)."""
+    rng = random.Random(seed)
+    ages, uses, types, counts = [], [], [], []
+    for _ in range(rows):
+        n_veh = rng.choice([1, 1, 2, 2, 2, 3, 4, 7])
+        n_ppl = rng.randint(0, 9)
+        counts.append(n_veh)
+        uses.append(_sorted_unique(rng.choice(VEHICLE_USES) for _ in range(n_veh)))
+        types.append(_sorted_unique(rng.choice(PERSON_TYPES) for _ in range(n_ppl)))
+        ages.append(_sorted_unique(rng.randint(0, 120) for _ in range(n_ppl) if rng.random() > 0.1))
+    return {"ages": ages, "uses": uses, "types": types, "counts": counts}
+
+
+def make_frame(lists: Dict[str, List[Any]], fmt: str) -> pd.DataFrame:
+    """Merged frame as read_frame returns it for the given hand-off format."""
+    n = len(lists["ages"])
+    if fmt == "csv":
+        def col(values, edges):
+            out = [json.dumps(v) if v else (np.nan if i % 7 == 0 else "[]") for i, v in enumerate(values)]
+            return out + [np.nan if e is None else e for e in edges]
+        extra = max(len(EDGE_AGES), len(EDGE_USES), len(EDGE_TYPES))
+        pad = lambda e: e + [None] * (extra - len(e))
+        df = pd.DataFrame({
+            "crash_record_id": [f"id{i}" for i in range(n + extra)],
+            "veh_count": lists["counts"] + [0] * extra,
+            "ppl_age_list_json": col(lists["ages"], pad(EDGE_AGES)),
+            "veh_vehicle_use_list_json": col(lists["uses"], pad(EDGE_USES)),
+            "ppl_person_type_list_json": col(lists["types"], pad(EDGE_TYPES)),
+        })
+    else:
+        # to_pandas hands list columns over as numpy arrays (None where missing)
+        def col(values, dtype):
+            return [np.array(v, dtype=dtype) if (v or i % 7) else None for i, v in enumerate(values)]
+        df = pd.DataFrame({
+            "crash_record_id": [f"id{i}" for i in range(n)],
+            "veh_count": lists["counts"],
+            "ppl_age_list_json": col(lists["ages"], np.int64),
+            "veh_vehicle_use_list_json": col(lists["uses"], object),
+            "ppl_person_type_list_json": col(lists["types"], object),
+        })
+    # a gappy index, as type_to_binary leaves it after dropping unlabeled rows
+    df.index = df.index * 2
+    return df
+
+
+def check_parity(df: pd.DataFrame) -> None:
+    expected = R.aggregate_rowwise(df.copy())
+    got = R.aggregate(df.copy())
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+
+def _time(fn, df: pd.DataFrame, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        frame = df.copy()
+        t0 = time.perf_counter()
+        fn(frame)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_benchmark(rows: int, seed: int, repeats: int, parity_only: bool = False) -> List[Dict[str, Any]]:
+    lists = generate_lists(rows, seed)
+    results = []
+    for fmt in ("csv", "parquet"):
+        df = make_frame(lists, fmt)
+        check_parity(df)
+        if parity_only:
+            results.append({"handoff": fmt, "rows": len(df), "parity": True})
+            continue
+        rowwise = _time(R.aggregate_rowwise, df, repeats)
+        columnar = _time(R.aggregate, df, repeats)
+        results.append({
+            "handoff": fmt, "rows": len(df), "parity": True,
+            "rowwise_s": round(rowwise, 3), "columnar_s": round(columnar, 3),
+            "rowwise_rows_per_s": int(len(df) / rowwise), "columnar_rows_per_s": int(len(df) / columnar),
+            "speedup": round(rowwise / columnar, 1),
+        })
+    return results
+
+
+def make_cleaned(rows: int, seed: int) -> pd.DataFrame:
+    """A frame shaped like clean_frame's output: mostly text columns, some numbers, the row hash."""
+    rng = np.random.default_rng(seed)
+    words = np.array(["CLEAR", "RAIN", "SNOW", "DRY", "WET", "NOT DIVIDED", "FOUR WAY",
+                      "STRAIGHT AND LEVEL", "UNKNOWN", "NO CONTROLS", "TRAFFIC SIGNAL"], dtype=object)
+    data: Dict[str, Any] = {"crash_record_id": [f"{i:016x}{seed:08x}" for i in range(rows)]}
+    for i in range(16):
+        col = words[rng.integers(0, len(words), rows)].copy()
+        col[rng.random(rows) < 0.05] = None
+        data[f"text_{i:02d}"] = col
+    data["crash_date"] = [f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:00:00" for i in range(rows)]
+    data["veh_make_list_json"] = [json.dumps(["FORD", "TOYOTA"][: 1 + i % 2]) for i in range(rows)]
+    for i in range(8):
+        data[f"num_{i}"] = rng.normal(size=rows)
+    for c in ("year", "month", "day", "hour", "veh_count", "has_emergency", "has_bicycle"):
+        data[c] = rng.integers(0, 50, rows)
+    data["row_hash"] = rng.integers(-2**62, 2**62, rows)
+    return pd.DataFrame(data)
+
+
+def _merge_time(db_path: str, source: Any, convert, columns: List[str]) -> float:
+    """Seconds for one MERGE of `source` (after convert) into gold at db_path, conversion included."""
+    con = duckdb.connect(db_path)
+    try:
+        t0 = time.perf_counter()
+        con.register("source_rows", convert(source))
+        W._merge(con, "source_rows", "source_rows", columns)
+        return time.perf_counter() - t0
+    finally:
+        con.close()
+
+
+def run_ingest_benchmark(rows: int, seed: int, repeats: int) -> List[Dict[str, Any]]:
+    frame = make_cleaned(rows, seed)
+    buf = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), buf)
+    arrow_frame = read_frame(pa.py_buffer(buf.getvalue()), "parquet")   # Arrow-backed strings
+    columns = list(frame.columns)
+    arrow_table = pa.Table.from_pandas(frame, preserve_index=False)
+    to_table = lambda df: pa.Table.from_pandas(df, preserve_index=False)
+    ways = [
+        ("numpy frame", frame, lambda df: df),
+        ("numpy -> from_pandas", frame, to_table),
+        ("arrow-backed frame", arrow_frame, lambda df: df),
+        ("arrow-backed -> table", arrow_frame, to_table),   # what the writer registers
+        ("arrow table", arrow_table, lambda t: t),
+    ]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-gold-") as tmp:
+        for name, source, convert in ways:
+            best = {"insert": float("inf"), "unchanged": float("inf")}
+            for r in range(repeats):
+                db = os.path.join(tmp, f"gold-{len(results)}-{r}.duckdb")
+                best["insert"] = min(best["insert"], _merge_time(db, source, convert, columns))       # empty gold
+                best["unchanged"] = min(best["unchanged"], _merge_time(db, source, convert, columns))  # same rows again
+            results.append({
+                "source": name, "rows": rows,
+                "insert_s": round(best["insert"], 3), "unchanged_s": round(best["unchanged"], 3),
+                "insert_rows_per_s": int(rows / best["insert"]),
+                "unchanged_rows_per_s": int(rows / best["unchanged"]),
+            })
+    return results
+
+
+def run_read_benchmark(rows: int, seed: int, repeats: int) -> List[Dict[str, Any]]:
+    """Seconds to read the CSV hand-off: plain pd.read_csv (numpy / object) vs read_frame (Arrow strings)."""
+    data = make_cleaned(rows, seed).to_csv(index=False).encode("utf-8")
+    ways = [
+        ("pd.read_csv", lambda: pd.read_csv(io.BytesIO(data))),
+        ("read_frame", lambda: read_frame(io.BytesIO(data), "csv")),
+    ]
+    results = []
+    for name, read in ways:
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            read()
+            best = min(best, time.perf_counter() - t0)
+        results.append({"source": name, "rows": rows, "read_s": round(best, 3),
+                        "read_rows_per_s": int(rows / best)})
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Check and time the cleaner's list aggregation")
+    ap.add_argument("--rows", type=int, default=250000)
+    ap.add_argument("--seed", type=int, default=489)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--parity", action="store_true", help="only check aggregate against aggregate_rowwise")
+    ap.add_argument("--ingest", action="store_true", help="time the gold MERGE per hand-off form")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    if args.ingest:
+        reads = run_read_benchmark(args.rows, args.seed, args.repeats)
+        results = run_ingest_benchmark(args.rows, args.seed, args.repeats)
+        if args.json:
+            print(json.dumps(reads + results, indent=2))
+            return
+        for r in reads:
+            print(f"{r['source']:22s} {r['rows']:>8d} rows  read   {r['read_s']:7.3f}s "
+                  f"({r['read_rows_per_s']:>9d} rows/s)")
+        for r in results:
+            print(f"{r['source']:22s} {r['rows']:>8d} rows  insert {r['insert_s']:7.3f}s "
+                  f"({r['insert_rows_per_s']:>9d} rows/s)  unchanged {r['unchanged_s']:7.3f}s "
+                  f"({r['unchanged_rows_per_s']:>9d} rows/s)")
+        return
+
+    try:
+        results = run_benchmark(args.rows, args.seed, args.repeats, parity_only=args.parity)
+    except AssertionError as e:
+        print(f"parity FAILED: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        if "speedup" in r:
+            print(f"{r['handoff']:8s} {r['rows']:>8d} rows  rowwise {r['rowwise_s']:7.3f}s  "
+                  f"columnar {r['columnar_s']:7.3f}s  ({r['speedup']}x)  parity ok")
+        else:
+            print(f"{r['handoff']:8s} {r['rows']:>8d} rows  parity ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,22 +4,32 @@ import time
 import random
 import traceback
 import logging
+import tempfile
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pika.exceptions import AMQPConnectionError, ProbableAccessDeniedError, ProbableAuthenticationError
 
 import os
+import duckdb
+import pyarrow as pa
 
 #Other files:
-from minio_io import download_object
-from duckdb_writer import write_to_duckdb
+from minio_io import read_object_frame, object_format
+from duckdb_writer import write_to_duckdb, gold_connection
 import sanity
-from cleaning_rules import run_cleaning
+from cleaning_rules import clean_frame
 
 from metrics import (
     CLEAN_MESSAGES_TOTAL,
     CLEANER_UPTIME_SECONDS,
     RABBIT_CONNECTIONS,
     MINIO_ROWS_READ_TOTAL,
-    CLEANER_RUN_DURATION_SECONDS
+    CLEANER_RUN_DURATION_SECONDS,
+    CLEANER_BYTES_READ_TOTAL,
+    CLEANER_OBJECTS_FETCHED_TOTAL,
+    CLEANER_JOBS_IN_FLIGHT,
+    stage_timer,
 )
 
 
@@ -49,6 +59,14 @@ MINIO_ENDPOINT   = os.getenv("MINIO_ENDPOINT")
 MINIO_ACCESS     = os.getenv("MINIO_USER")
 MINIO_SECRET     = os.getenv("MINIO_PASS")
 MINIO_SECURE     = os.getenv("MINIO_SSL", "false").lower() == "true"
+CLEAN_WORKERS    = int(os.getenv("CLEAN_WORKERS", "1"))        # clean jobs in flight per container
+CLEAN_WORK_DIR   = os.getenv("CLEAN_WORK_DIR") or None        # parent of per-job scratch dirs (default: system temp)
+GOLD_LOCK_WAIT_S = float(os.getenv("GOLD_LOCK_WAIT_S", "300"))  # wait for another process's gold write
+GOLD_DB          = "/data/gold/gold.duckdb"
+
+# Cleaning runs in parallel; gold has one writer at a time (one lock here,
+# DuckDB's file lock across replicas sharing the volume)
+GOLD_LOCK = threading.Lock()
 #CLEAN_BUCKET     = os.getenv("CLEAN_BUCKET", "gold")   # e.g. where cleaned data goes
 
 def wait_for_port(host, port, tries=30, delay=1.0):
@@ -62,9 +80,38 @@ def wait_for_port(host, port, tries=30, delay=1.0):
     return False
 
 
+def write_gold(cleaned):
+    """Merge into gold and run the sanity checks on one connection, one writer at a time."""
+    keys = pa.table({"crash_record_id": cleaned["crash_record_id"]})
+    with stage_timer("gold_wait", "gold"):
+        GOLD_LOCK.acquire()
+    try:
+        deadline = time.time() + GOLD_LOCK_WAIT_S
+        while True:
+            try:
+                # merge and checks share the connection; it is released when the block ends
+                with gold_connection(GOLD_DB) as con:
+                    with stage_timer("merge", "gold"):
+                        write_to_duckdb(cleaned, GOLD_DB)
+                    logging.info("[Cleaner] Now running sanity checks")
+                    with stage_timer("sanity", "gold"):
+                        report = sanity.run_sanity_checks(GOLD_DB, con, keys=keys)
+                break
+            except duckdb.IOException as e:
+                # another replica (or a reader) holds the file; its hold is short
+                if "lock" not in str(e).lower() or time.time() > deadline:
+                    raise
+                logging.info("[cleaner] gold.duckdb is locked by another process; retrying")
+                time.sleep(1 + random.random())
+        sanity.log_sanity_report(report)
+    finally:
+        GOLD_LOCK.release()
+
+
 def run_clean_job(msg):
-    """Main cleaning entry point."""
+    """Main cleaning entry point; raises if the job failed."""
     start_time = time.time()
+    CLEANER_JOBS_IN_FLIGHT.inc()
     try:
         
         logging.info(f"[cleaner] Running clean job: {msg}")
@@ -73,27 +120,30 @@ def run_clean_job(msg):
         job_id = msg.get("job_id")
         bucket = msg.get("bucket")
         file_key = msg.get("file")
+        fmt = object_format(msg)
 
         # Wrap the process in a with so we can time it for the prometheus metric
-        with CLEANER_RUN_DURATION_SECONDS.labels(bucket = bucket).time():
-
-            local_path = "merged.csv"
+        # Every job gets its own scratch dir (removed afterwards), so concurrent
+        # jobs and replicas sharing a volume never touch each other's files
+        with CLEANER_RUN_DURATION_SECONDS.labels(bucket = bucket).time(), \
+                tempfile.TemporaryDirectory(prefix="clean-", dir=CLEAN_WORK_DIR) as workdir:
 
-            row_count = download_object(bucket, file_key, local_path)
+            # Straight from MinIO into one frame (big columnar objects spool to workdir)
+            with stage_timer("download"):
+                merged, nbytes = read_object_frame(bucket, file_key, fmt, workdir)
+            CLEANER_BYTES_READ_TOTAL.labels(dataset="merged").inc(nbytes)
+            CLEANER_OBJECTS_FETCHED_TOTAL.labels(dataset="merged").inc()
 
             MINIO_ROWS_READ_TOTAL.labels(
                 bucket=bucket,
-            ).inc(row_count)# Count rows
+            ).inc(len(merged))# Count rows
 
             logging.info("[cleaner] Actually going to run the cleaning code")
-            run_cleaning(local_path)
-
-            logging.info("[Cleaner] Outputting file to duckdb")
-            write_to_duckdb("cleaned.csv")
+            cleaned = clean_frame(merged)
+            del merged
 
-            logging.info("[Cleaner] Now running sanity checks")
-            report = sanity.run_sanity_checks("/data/gold/gold.duckdb")
-            sanity.log_sanity_report(report)
+            logging.info("[Cleaner] Outputting frame to duckdb")
+            write_gold(cleaned)
 
             logging.info(f"Cleaning complete for {file_key}")
 
@@ -104,8 +154,11 @@ def run_clean_job(msg):
         CLEAN_JOBS_TOTAL.labels(status="failure").inc()
         logging.exception("[cleaner] Error while running clean job")
         # Re-raise so existing error handling in on_msg works as befor
-    duration = time.time() - start_time
-    CLEAN_JOB_DURATION_SECONDS.observe(duration)
+        raise
+    finally:
+        CLEANER_JOBS_IN_FLIGHT.dec()
+        duration = time.time() - start_time
+        CLEAN_JOB_DURATION_SECONDS.observe(duration)
 
 """
 def run_clean_job(msg):
@@ -160,32 +213,49 @@ def start_cleaner():
 
     ch = conn.channel()
     ch.queue_declare(queue=CLEAN_QUEUE, durable=True)
-    ch.basic_qos(prefetch_count=1)
-
-    def on_msg(chx, method, props, body):
+    ch.basic_qos(prefetch_count=max(1, CLEAN_WORKERS))
+
+    # Jobs run on worker threads so this (I/O) thread keeps servicing heartbeats;
+    # acks/nacks are handed back to it through add_callback_threadsafe.
+    pool = ThreadPoolExecutor(max_workers=max(1, CLEAN_WORKERS), thread_name_prefix="clean")
+
+    def settle(delivery_tag, ok):
+        if not ch.is_open:
+            return  # channel is gone; the broker redelivers unacked messages
+        if ok:
+            ch.basic_ack(delivery_tag=delivery_tag)
+        else:
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=False)
+
+    def work(delivery_tag, body):
+        ok = True
         try:
             msg = json.loads(body.decode("utf-8"))
             if msg.get("type") != "clean":
                 logging.info(f"Ignoring non-clean message: {msg}")
                 CLEAN_MESSAGES_TOTAL.labels(result="ignored").inc()
-                chx.basic_ack(delivery_tag=method.delivery_tag)
-                return
-
-            run_clean_job(msg)
-            CLEAN_MESSAGES_TOTAL.labels(result="processed").inc()
-            chx.basic_ack(delivery_tag=method.delivery_tag)
+            else:
+                run_clean_job(msg)
+                CLEAN_MESSAGES_TOTAL.labels(result="processed").inc()
         except Exception:
             CLEAN_MESSAGES_TOTAL.labels(result="failed").inc()
             traceback.print_exc()
-            chx.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            ok = False
+        conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, ok))
+
+    def on_msg(chx, method, props, body):
+        pool.submit(work, method.delivery_tag, body)
 
-    logging.info(f"[cleaner] Waiting for clean jobs on queue '{CLEAN_QUEUE}'")
+    logging.info(f"[cleaner] Waiting for clean jobs on queue '{CLEAN_QUEUE}' (workers={CLEAN_WORKERS})")
     ch.basic_consume(queue=CLEAN_QUEUE, on_message_callback=on_msg)
 
     try:
         ch.start_consuming()
     except KeyboardInterrupt:
         ch.stop_consuming()
+        pool.shutdown(wait=True)
+        try: conn.process_data_events(time_limit=0)  # flush pending acks
+        except Exception: pass
         conn.close()
 
 
@@ -201,7 +271,6 @@ if __name__ == "__main__":
             CLEANER_UPTIME_SECONDS.set(time.time() - start_time)
             time.sleep(5)
 
-    import threading
     threading.Thread(target=update_uptime, daemon=True).start()
 
 
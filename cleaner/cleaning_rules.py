@@ -5,9 +5,16 @@
 #imports
 import pandas as pd
 import numpy as np
+import os
 import json
 import logging
 
+import duckdb
+import pyarrow as pa
+
+from minio_io import read_frame
+from metrics import CLEANER_BYTES_WRITTEN_TOTAL, stage_timer
+
 #This function drops irrelevant cols
 def drop_garbage(data):
 
@@ -128,6 +135,8 @@ def clean_traff_way_type(data):
 
 # This is a supporter function for converting those json lists to numpy arrays
 def parse_to_array(x):
+        if isinstance(x, (list, tuple, np.ndarray)):
+            return np.array(list(x))  # native list column (parquet / arrow hand-off)
         if pd.isna(x) or not isinstance(x, str):
             return np.array([])  # empty array if missing
         try:
@@ -161,10 +170,10 @@ def to_filtered_array(arr):
 
 def parse_to_array_2(x):
     """Safely parse a JSON-style list string into a Python list."""
+    if isinstance(x, (list, tuple, np.ndarray)):
+        return list(x)
     if pd.isna(x):
         return []
-    if isinstance(x, list):
-        return x
     if isinstance(x, str):
         try:
             parsed = json.loads(x)
@@ -174,8 +183,9 @@ def parse_to_array_2(x):
             pass
     return []
 
-# This function is for the general json lists data that we need to aggregate into workable values.
-def aggregate(data):
+# Row-at-a-time version of aggregate(), kept as the reference the columnar one is checked against
+# (see test_cleaning_rules.py and benchmark.py --parity)
+def aggregate_rowwise(data):
 
     #People -------------------------------------------------------------------------
     # We want to split into three columns.
@@ -238,25 +248,152 @@ def aggregate(data):
     return data
 
 
-# Call this function in cleaner.py to run the actual cleaning
-def run_cleaning(file = "merged.csv"):
-    print("Beginning")
-    logging.info("Beginning Cleaning of merged.csv")
+# Vehicle use / person type groups for the has_* flags
+EMERGENCY_TERMS = ["POLICE", "FIRE", "AMBULANCE", "TOW TRUCK", "CTA", "STATE OWNED"]
+COMMERCIAL_TERMS = ["COMMERCIAL - SINGLE UNIT", "COMMERCIAL - MULTI-UNIT",
+                    "RIDESHARE SERVICE", "TAXI/FOR HIRE", "CONSTRUCTION/MAINTENANCE",
+                    "AGRICULTURE", "HOUSE TRAILER"]
+PERSONAL_TERMS = ["PERSONAL", "CAMPER/RV - SINGLE UNIT"]
+BICYCLE_TERMS = ["BICYCLE", "NON-MOTOR VEHICLE"]
+
+#Turns one list column (JSON text from the CSV hand-off, or native lists from parquet / arrow)
+#into an arrow array DuckDB can read without a Python call per row
+def _list_column(series):
+    try:
+        arr = pa.Array.from_pandas(series)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        arr = None
+    if arr is not None and (pa.types.is_string(arr.type) or pa.types.is_list(arr.type)
+                            or pa.types.is_large_list(arr.type)):
+        return arr
+    if arr is not None and arr.null_count == len(arr):
+        return pa.nulls(len(arr), pa.string())  # all missing (read_csv made it a float column)
+    #Mixed text / lists: fall back to the row-wise parser for this column only
+    parsed = series.apply(parse_to_array_2)
+    return pa.array([[None if v is None else str(v) for v in x] for x in parsed], type=pa.list_(pa.string()))
+
+#SQL for a list column as VARCHAR[]: missing, bad JSON and non-list JSON all become []
+def _as_text_list(col, arr):
+    if pa.types.is_string(arr.type):
+        return (f"CASE WHEN json_valid({col}) AND json_type({col}) = 'ARRAY' "
+                f"THEN from_json({col}, '[\"VARCHAR\"]') ELSE []::VARCHAR[] END")
+    return f"coalesce(list_transform({col}, e -> CAST(e AS VARCHAR)), []::VARCHAR[])"
+
+def _sql_terms(terms):
+    return "[" + ", ".join("'" + t.replace("'", "''") + "'" for t in terms) + "]"
+
+# Columnar aggregate(): the JSON lists are parsed, filtered and reduced inside DuckDB
+# in one pass instead of six pandas .apply passes. Same columns, order and values as
+# aggregate_rowwise for anything the transformer writes.
+def aggregate(data):
+
+    lists = pa.table({
+        "age": _list_column(data["ppl_age_list_json"]),
+        "vuse": _list_column(data["veh_vehicle_use_list_json"]),
+        "ptype": _list_column(data["ppl_person_type_list_json"]),
+    })
+    age = _as_text_list("age", lists["age"])
+    vuse = _as_text_list("vuse", lists["vuse"])
+    ptype = _as_text_list("ptype", lists["ptype"])
+
+    con = duckdb.connect()
+    try:
+        con.register("lists", lists)
+        out = con.execute(f"""
+            WITH parsed AS (
+                SELECT
+                    -- ages that read as numbers and fall in the deep-cleaning.md range
+                    list_filter(list_transform({age}, a -> TRY_CAST(a AS DOUBLE)),
+                                a -> a BETWEEN 10 AND 110) AS ages,
+                    {vuse} AS vuse,
+                    {ptype} AS ptype
+                FROM lists
+            )
+            SELECT
+                list_min(ages) AS age_min,
+                list_max(ages) AS age_max,
+                CASE WHEN len(ages) > 0 THEN list_sum(ages) / len(ages) END AS age_mean,
+                list_has_any(vuse, {_sql_terms(EMERGENCY_TERMS)})::BIGINT AS has_emergency,
+                list_has_any(vuse, {_sql_terms(COMMERCIAL_TERMS)})::BIGINT AS has_commercial,
+                list_has_any(vuse, {_sql_terms(PERSONAL_TERMS)})::BIGINT AS has_personal,
+                list_has_any(ptype, {_sql_terms(BICYCLE_TERMS)})::BIGINT AS has_bicycle
+            FROM parsed
+        """).df()
+    finally:
+        con.close()
+
+    out.index = data.index
+
+    #Same column order as the row-wise version: age stats, then vehicle flags, then bicycle
+    data = data.drop(columns=["ppl_age_list_json"])
+    for c in ["age_min", "age_max", "age_mean"]:
+        data[c] = out[c].astype("float64")
+
+    #Clip veh_count to 1..5
+    data["veh_count"] = data["veh_count"].clip(upper=5)
+    data["veh_count"] = data["veh_count"].clip(lower=1)
+
+    for c in ["has_emergency", "has_commercial", "has_personal"]:
+        data[c] = out[c]
+    data = data.drop(columns=["veh_vehicle_use_list_json"])
+
+    data["has_bicycle"] = out["has_bicycle"]
+    data = data.drop(columns=["ppl_person_type_list_json"])
+
+    return data
+
+
+# Native list columns (parquet / arrow hand-off) that survive cleaning are stored
+# in gold as the same JSON text the CSV hand-off carries
+def lists_to_json(data):
+    for col in data.columns:
+        if data[col].dtype != object:
+            continue
+        if not data[col].map(lambda x: isinstance(x, (list, tuple, np.ndarray))).any():
+            continue
+        data[col] = data[col].map(
+            lambda x: json.dumps(list(x), ensure_ascii=False) if isinstance(x, (list, tuple, np.ndarray)) else x
+        )
+    return data
+
+
+# Runs every cleaning step on an in-memory merged frame and returns the cleaned frame
+# (cleaner.py hands the result straight to the DuckDB writer)
+def clean_frame(merged):
+    with stage_timer("clean"):
+        merged = drop_garbage(merged)
 
-    merged = pd.read_csv(file)
+        merged = convert_light(merged)
 
-    merged = drop_garbage(merged)
+        merged = parse_date(merged)
 
-    merged = convert_light(merged)
+        merged = type_to_binary(merged)
 
-    merged = parse_date(merged)
+    with stage_timer("aggregate"):
+        merged = aggregate(merged)
+
+        merged = lists_to_json(merged)
+
+    return merged
+
+
+# Local run on a downloaded file: writes cleaned.csv into out_dir
+# fmt is the hand-off format from the clean message: csv, parquet or arrow
+def run_cleaning(file = "merged.csv", fmt = "csv", out_dir = "."):
+    print("Beginning")
+    logging.info(f"Beginning Cleaning of {file} ({fmt})")
 
-    merged = type_to_binary(merged)
+    with stage_timer("read"):
+        merged = read_frame(file, fmt)
 
-    merged = aggregate(merged)
+    merged = clean_frame(merged)
 
     #Once we complete all the above cleaning we will save the csv
-    merged.to_csv("cleaned.csv", index=False)
+    out_path = os.path.join(out_dir, "cleaned.csv")
+    with stage_timer("write_csv", "cleaned"):
+        merged.to_csv(out_path, index=False)
+    CLEANER_BYTES_WRITTEN_TOTAL.labels(dataset="cleaned").inc(os.path.getsize(out_path))
+    return out_path
 
 
 #This is just here so if I do feel like running just this file we can but I don't think I ever will
@@ -1,20 +1,185 @@
 # duckdb_writer.py
 import duckdb
 import pandas as pd
+import pyarrow as pa
 import os
 import logging
+import threading
+from contextlib import contextmanager
+
+from metrics import CLEANER_GOLD_ROWS_TOTAL
+
+# 64-bit fingerprint of the merged row, computed by the transformer
+ROW_HASH_COL = "row_hash"
+
+# The gold connection is closed when a job is done with it, so DuckDB's
+# exclusive file lock is released for readers (duckdb_exporter, streamlit)
+# and other replicas. GOLD_IDLE_CLOSE_S > 0 keeps it open that many idle
+# seconds instead, for a single-writer setup nobody reads while it streams.
+GOLD_IDLE_CLOSE_S = float(os.getenv("GOLD_IDLE_CLOSE_S", "0"))
+
+_CON = None
+_CON_PATH = None
+_CON_LOCK = threading.RLock()
+_CON_DEPTH = 0      # nested gold_connection blocks (write_gold wraps write_to_duckdb)
+_IDLE_TIMER = None
+
+
+def _close_idle():
+    global _CON, _CON_PATH
+    with _CON_LOCK:
+        if _CON_DEPTH:
+            return   # reopened by a job since the timer was started
+        if _CON is not None:
+            try:
+                _CON.close()
+            except duckdb.Error:
+                pass
+            logging.info(f"[duckdb_writer] closed connection to {_CON_PATH}")
+        _CON, _CON_PATH = None, None
+
+
+@contextmanager
+def gold_connection(db_path: str = "/data/gold/gold.duckdb"):
+    """The gold connection to db_path, held exclusively for the with-block (blocks nest)."""
+    global _CON, _CON_PATH, _IDLE_TIMER, _CON_DEPTH
+    with _CON_LOCK:
+        if _IDLE_TIMER is not None:
+            _IDLE_TIMER.cancel()
+            _IDLE_TIMER = None
+        if _CON is not None and _CON_PATH != db_path and not _CON_DEPTH:
+            _close_idle()
+        if _CON is None:
+            _CON = duckdb.connect(db_path)
+            _CON_PATH = db_path
+        _CON_DEPTH += 1
+        broken = False
+        try:
+            yield _CON
+        except duckdb.ConnectionException:
+            broken = True  # reopen on the next job
+            raise
+        finally:
+            _CON_DEPTH -= 1
+            if _CON is not None and not _CON_DEPTH:
+                if broken or GOLD_IDLE_CLOSE_S <= 0:
+                    _close_idle()
+                else:
+                    _IDLE_TIMER = threading.Timer(GOLD_IDLE_CLOSE_S, _close_idle)
+                    _IDLE_TIMER.daemon = True
+                    _IDLE_TIMER.start()
+
+def _gold_types(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give an in-memory cleaned frame the column types gold got when the
+    cleaner still round-tripped through cleaned.csv, so gold's schema
+    doesn't depend on the hand-off: datetimes as the text to_csv wrote,
+    categoricals as plain strings, all-empty columns as float, narrow ints
+    widened to int64.
+    """
+    out = {}
+    for c in frame.columns:
+        s = frame[c]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            valid = s.dropna()
+            if len(valid) and (valid == valid.dt.normalize()).all():
+                fmt = "%Y-%m-%d"
+            elif (valid.dt.microsecond != 0).any():
+                fmt = "%Y-%m-%d %H:%M:%S.%f"
+            else:
+                fmt = "%Y-%m-%d %H:%M:%S"
+            s = s.dt.strftime(fmt).astype(object).where(s.notna(), None)
+        elif (s.dtype == object or isinstance(s.dtype, pd.ArrowDtype)) and s.isna().all():
+            s = s.astype("float64")  # an all-empty CSV column reads back as float
+        elif isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype(object).where(s.notna(), None)
+        elif pd.api.types.is_integer_dtype(s) and not pd.api.types.is_extension_array_dtype(s):
+            s = s.astype("int64")
+        out[c] = s
+    return pd.DataFrame(out, index=frame.index)
+
+
+def _source_rows(source):
+    """Cleaned rows in a form the MERGE scans in place: an Arrow table / reader, or a DataFrame."""
+    if isinstance(source, (pa.Table, pa.RecordBatchReader)):
+        return source
+    if isinstance(source, pd.DataFrame):
+        df = _gold_types(source)
+        logging.info(f"Merging {len(df)} rows, {len(df.columns)} cols from the cleaned frame")
+    else:
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"{source} missing")
+        df = pd.read_csv(source)
+        logging.info(f"Read {len(df)} rows, {len(df.columns)} cols from {source}")
+    # read_frame leaves every hand-off's string columns Arrow-backed, so this
+    # wraps their buffers without copying; only numbers and the few columns
+    # cleaning rebuilt as Python objects are converted (benchmark.py --ingest)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        logging.warning(f"[duckdb_writer] registering the frame as-is, no Arrow conversion: {e}")
+        return df
+
 
-def write_to_duckdb(local_path: str, db_path: str = "/data/gold/gold.duckdb"):
-    if not os.path.exists(local_path):
-        raise FileNotFoundError(f"{local_path} missing")
+def _counted(reader: pa.RecordBatchReader, seen: list) -> pa.RecordBatchReader:
+    """Pass a reader's batches through unchanged, adding up their rows into seen[0]."""
+    def batches():
+        for batch in reader:
+            seen[0] += batch.num_rows
+            yield batch
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
 
-    df = pd.read_csv(local_path)
-    logging.info(f"Read {len(df)} rows, {len(df.columns)} cols from {local_path}")
 
-    con = duckdb.connect(db_path)
+def write_to_duckdb(source, db_path: str = "/data/gold/gold.duckdb"):
+    """
+    Upsert cleaned rows into gold. `source` is a pa.Table or
+    pa.RecordBatchReader (DuckDB scans the Arrow buffers in place), the
+    cleaned DataFrame, or a cleaned CSV path. Arrow input is taken with its
+    own types; DataFrames go through _gold_types first and are registered
+    as an Arrow table.
+    """
+    rows = _source_rows(source)
+    seen = [0]
+    schema = None
+    if isinstance(rows, pa.RecordBatchReader):
+        schema = rows.schema.empty_table()   # a reader can only be scanned once
+        rows = _counted(rows, seen)          # one pass: the MERGE consumes it
+        columns = rows.schema.names
+    else:
+        seen[0] = len(rows)
+        columns = rows.column_names if isinstance(rows, pa.Table) else list(rows.columns)
+
+    with gold_connection(db_path) as con:
+        con.register("source_rows", rows)
+        if schema is not None:
+            con.register("source_schema", schema)
+        try:
+            inserted, updated = _merge(con, "source_rows",
+                                       "source_schema" if schema is not None else "source_rows", columns)
+        finally:
+            con.unregister("source_rows")
+            if schema is not None:
+                con.unregister("source_schema")
+    unchanged = seen[0] - inserted - updated
+
+    CLEANER_GOLD_ROWS_TOTAL.labels(action="inserted").inc(inserted)
+    CLEANER_GOLD_ROWS_TOTAL.labels(action="updated").inc(updated)
+    CLEANER_GOLD_ROWS_TOTAL.labels(action="unchanged").inc(unchanged)
+    logging.info("[duckdb_writer] Rows: Inserted / Updated / Unchanged")
+    logging.info(f"[duckdb_writer]      {inserted} / {updated} / {unchanged}")
+    logging.info("MERGE upsert complete")
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
 
-    # create table if missing (schema from df)
-    con.execute("CREATE TABLE IF NOT EXISTS gold AS SELECT * FROM df WHERE FALSE;")
+
+def _merge(con, source: str, schema: str, columns: list):
+    """
+    MERGE the registered relation `source` into gold in one pass; returns
+    (inserted, updated) from the MERGE's own RETURNING rows. `schema` is a
+    relation with the same columns: the source itself, or an empty stand-in
+    when the source is a reader that can only be scanned once.
+    """
+    # create table if missing (schema from the source)
+    con.execute(f"CREATE TABLE IF NOT EXISTS gold AS SELECT * FROM {schema} WHERE FALSE;")
 
     # ensure unique index (needed for some upsert forms)
     # create index only if table was just created would be ideal; wrap in try-except to be safe
@@ -27,70 +192,32 @@ def write_to_duckdb(local_path: str, db_path: str = "/data/gold/gold.duckdb"):
     key_col = "crash_record_id"
 
 
-    all_cols = [c for c in df.columns]
+    all_cols = list(columns)
     update_cols = [c for c in all_cols if c != key_col]
 
-    # build "is distinct" condition
-    distinct_conditions = " OR ".join(
-        f"(target.{c} IS DISTINCT FROM source.{c})" for c in update_cols
-    )
+    if ROW_HASH_COL in all_cols:
+        # gold tables created before the fingerprint existed get the column (NULL -> one update each)
+        con.execute(f"ALTER TABLE gold ADD COLUMN IF NOT EXISTS {ROW_HASH_COL} BIGINT;")
+        # one comparison decides "changed" instead of one per column
+        distinct_conditions = f"(target.{ROW_HASH_COL} IS DISTINCT FROM source.{ROW_HASH_COL})"
+    else:
+        # build "is distinct" condition
+        distinct_conditions = " OR ".join(
+            f"(target.{c} IS DISTINCT FROM source.{c})" for c in update_cols
+        )
 
     set_clause = ", ".join(f"{c} = source.{c}" for c in update_cols)
 
-    
-    # Count total rows before
-    rows_before = con.execute("SELECT COUNT(*) FROM gold").fetchone()[0]
-
-    # Count rows that *will* be updated/inserted (pre-merge)
-    rows_to_update = con.execute(f"""
-        SELECT COUNT(*) FROM gold AS target
-        JOIN df AS source USING ({key_col})
-        WHERE {distinct_conditions};
-    """).fetchone()[0]
-
-    rows_to_insert = con.execute(f"""
-        SELECT COUNT(*) FROM df AS source
-        WHERE NOT EXISTS (
-            SELECT 1 FROM gold AS target WHERE target.{key_col} = source.{key_col}
-        );
-    """).fetchone()[0]
-
-    # Perform the merge (actual write)
-    con.execute(f"""
+    # Perform the merge (actual write); every written row reports its action,
+    # so unchanged rows are simply the ones that come back with none
+    actions = con.execute(f"""
         MERGE INTO gold AS target
-        USING df AS source
+        USING {source} AS source
         ON target.{key_col} = source.{key_col}
         WHEN MATCHED AND ({distinct_conditions}) THEN
             UPDATE SET {set_clause}
         WHEN NOT MATCHED THEN
-            INSERT *;
-    """)
-
-    # Count total rows after
-    rows_after = con.execute("SELECT COUNT(*) FROM gold").fetchone()[0]
-
-    # Print results
-    logging.info("[duckdb_writer] Rows: Before / After / Updated / Inserted")
-    logging.info(f"[duckdb_writer]      {rows_before} / {rows_after} / {rows_to_update} / {rows_to_insert}")
-    #print(f"[duckdb_writer] Total rows before merge: {rows_before}")
-    #print(f"[duckdb_writer] Updated {rows_to_update} existing rows")
-    #print(f"[duckdb_writer] Inserted {rows_to_insert} new rows")
-    #print(f"[duckdb_writer] Total rows after merge:  {rows_after}")
-    #print(f"[duckdb_writer] Net row change: {rows_after - rows_before}")
-
-    '''
-    merge_sql = f"""
-    MERGE INTO gold AS target
-    USING df AS source
-    ON target.{key_col} = source.{key_col}
-    WHEN MATCHED AND ({distinct_conditions}) THEN
-      UPDATE SET {set_clause}
-    WHEN NOT MATCHED THEN
-      INSERT *;
-    """
-
-    '''
-
-    #con.execute(merge_sql)
-    logging.info("MERGE upsert complete")
-    con.close()
\ No newline at end of file
+            INSERT BY NAME
+        RETURNING merge_action;
+    """).df()["merge_action"].astype(str).value_counts()
+    return int(actions.get("INSERT", 0)), int(actions.get("UPDATE", 0))
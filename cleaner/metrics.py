@@ -1,4 +1,7 @@
 # metrics.py
+import time
+from contextlib import contextmanager
+
 from prometheus_client import Counter, Gauge, Histogram
 
 # Count total messages processed, labeled by outcome
@@ -31,3 +34,53 @@ CLEANER_RUN_DURATION_SECONDS = Histogram(
     ["bucket"],  
     buckets=[0.5, 1, 2, 5, 10, 30, 60, 120, float("inf")]  
 )
+
+
+# Per-stage timing + I/O volume (same shape as the transformer's)
+CLEANER_STAGE_DURATION_SECONDS = Histogram(
+    "cleaner_stage_duration_seconds",
+    "Time spent in each clean stage",
+    ["stage", "dataset"],  # stage: download (stream + parse), clean, aggregate, gold_wait, merge, sanity; read / write_csv for local runs
+    buckets=[0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, float("inf")]
+)
+
+CLEANER_BYTES_READ_TOTAL = Counter(
+    "cleaner_bytes_read_total",
+    "Bytes downloaded from MinIO",
+    ["dataset"]
+)
+
+CLEANER_BYTES_WRITTEN_TOTAL = Counter(
+    "cleaner_bytes_written_total",
+    "Bytes written by the cleaner (cleaned file)",
+    ["dataset"]
+)
+
+CLEANER_OBJECTS_FETCHED_TOTAL = Counter(
+    "cleaner_objects_fetched_total",
+    "Objects downloaded from MinIO",
+    ["dataset"]
+)
+
+CLEANER_JOBS_IN_FLIGHT = Gauge(
+    "cleaner_jobs_in_flight",
+    "Clean jobs currently running in this container"
+)
+
+CLEANER_GOLD_ROWS_TOTAL = Counter(
+    "cleaner_gold_rows_total",
+    "Cleaned rows merged into gold, by what the MERGE did with them",
+    ["action"]  # inserted, updated, unchanged
+)
+
+
+@contextmanager
+def stage_timer(stage: str, dataset: str = "merged"):
+    """Observe the wall time of a block into cleaner_stage_duration_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        CLEANER_STAGE_DURATION_SECONDS.labels(stage=stage, dataset=dataset).observe(
+            time.perf_counter() - start
+        )
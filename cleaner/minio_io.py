@@ -1,11 +1,17 @@
 #minio_io.py
 
-#This script handles acquiring the merged.csv from minio
+#This script handles acquiring the merged file from minio
 
 import os
+import logging
 from minio import Minio
 from minio.error import S3Error
-import csv
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
 
 from metrics import MINIO_ROWS_READ_TOTAL
 
@@ -13,6 +19,20 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
 MINIO_ACCESS   = os.getenv("MINIO_USER")
 MINIO_SECRET   = os.getenv("MINIO_PASS")
 MINIO_SECURE   = os.getenv("MINIO_SSL", "false").lower() == "true"
+SPOOL_MAX_BYTES = int(os.getenv("CLEAN_SPOOL_MAX_MB", "64")) * 1024 * 1024   # bigger columnar objects go to disk
+
+# Formats the transformer can hand off (see "format" in the clean message)
+FORMAT_EXTENSIONS = {"csv": "csv", "parquet": "parquet", "arrow": "arrow"}
+
+def object_format(msg: dict) -> str:
+    """Format of the merged object; old messages have no "format" key and are CSV."""
+    fmt = (msg.get("format") or "").lower()
+    if not fmt:
+        ext = (msg.get("file") or "").rsplit(".", 1)[-1].lower()
+        fmt = ext if ext in FORMAT_EXTENSIONS else "csv"
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown merged file format: {fmt!r}")
+    return fmt
 
 def get_minio_client():
     """Initialize and return a MinIO client using environment variables."""
@@ -23,38 +43,100 @@ def get_minio_client():
         secure=MINIO_SECURE
     )
 
-def download_object(bucket: str, object_key: str, local_path: str):
-    """Download an object (e.g. merged.csv) from MinIO to a local path."""
+def read_object_frame(bucket: str, object_key: str, fmt: str = "csv", workdir: str = None):
+    """
+    Stream a merged object from MinIO straight into a DataFrame. Returns
+    (frame, bytes read); the byte count is the object's Content-Length and
+    the row count is just len(frame). Parquet / Arrow objects bigger than
+    CLEAN_SPOOL_MAX_MB are spooled to the job's `workdir` instead of memory.
+    """
     client = get_minio_client()
+    resp = None
     try:
-        client.fget_object(bucket, object_key, local_path)
-        print(f"[minio_io] Downloaded s3://{bucket}/{object_key} → {local_path}")
+        resp = client.get_object(bucket, object_key)
+        size = int(resp.headers.get("Content-Length") or 0)
+        if fmt == "csv":
+            # parsed as the body arrives
+            df = read_frame(resp, fmt)
+        elif workdir and size > SPOOL_MAX_BYTES:
+            path = os.path.join(workdir, f"merged.{FORMAT_EXTENSIONS[fmt]}")
+            with open(path, "wb") as f:
+                for chunk in resp.stream(1024 * 1024):
+                    f.write(chunk)
+            df = read_frame(path, fmt)
+        else:
+            # Parquet / Arrow IPC need random access (footer first): buffer the body
+            df = read_frame(pa.py_buffer(resp.read()), fmt)
+        logging.info(f"[minio_io] Read s3://{bucket}/{object_key} → {len(df)} rows")
+        return df, size
+    except S3Error as e:
+        logging.error(f"[minio_io] Failed to read s3://{bucket}/{object_key}: {e}")
+        raise
+    finally:
+        if resp is not None:
+            resp.close()
+            resp.release_conn()
 
-        # Count rows
-        row_count = _count_rows(local_path)
 
-        # Update Prometheus metric
-        #MINIO_ROWS_READ_TOTAL.labels(
-        #    bucket=bucket,
-        #    object=object_key
-        #).inc(row_count)# Count rows
+def _arrow_strings(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
 
-        return row_count
-    except S3Error as e:
-        print(f"[minio_io] Failed to download {object_key}: {e}")
-        raise
 
+# pandas' default missing-value markers, so the CSV hand-off's nulls read as they did with pd.read_csv
+CSV_NULL_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND",
+                   "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+# Arrow can't turn timestamp inference off; a format no value matches keeps
+# date-times as the text the transformer wrote, as pd.read_csv left them
+_NO_TIMESTAMPS = ["%Y%%never"]
 
-def _count_rows(file_path: str) -> int:
-    """Count number of rows in a CSV file."""
-    try:
-        count = 0
-        with open(file_path, newline="", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            for _ in reader:
-                count += 1
-        print(f"[minio_io] {file_path} → {count} rows")
-        return count
-    except Exception as e:
-        print(f"[minio_io] Failed to count rows: {e}")
-        return 0
\ No newline at end of file
+
+def _read_csv_table(source) -> pa.Table:
+    """The CSV hand-off parsed by Arrow (multi-threaded, no Python object per value), typed as pd.read_csv types it."""
+    table = pacsv.read_csv(source, convert_options=pacsv.ConvertOptions(
+        null_values=CSV_NULL_VALUES, strings_can_be_null=True, timestamp_parsers=_NO_TIMESTAMPS))
+    # plain dates / times are still recognised; back to their (ISO, so unchanged) text
+    for i, f in enumerate(table.schema):
+        if pa.types.is_date(f.type) or pa.types.is_time(f.type):
+            table = table.set_column(i, f.name, table.column(i).cast(pa.string()))
+    return table
+
+
+def read_frame(source, fmt: str = "csv") -> pd.DataFrame:
+    """
+    Load a merged file into pandas; `source` is a local path, a file-like
+    object (CSV) or an in-memory pa.Buffer (Parquet / Arrow IPC).
+    Every format is read into an Arrow table first and converted the same
+    way: string columns stay Arrow-backed (no Python str per value, and the
+    DuckDB writer hands them to the MERGE as Arrow), numbers become numpy.
+    Parquet / Arrow IPC carry the list aggregates natively as `*_list`
+    columns; they are renamed to the `*_list_json` names the CSV hand-off
+    uses so the cleaning rules see one set of column names.
+    """
+    if fmt == "csv":
+        table = _read_csv_table(source)
+    elif fmt == "parquet":
+        table = pq.read_table(pa.BufferReader(source) if isinstance(source, pa.Buffer) else source)
+    elif fmt == "arrow":
+        if isinstance(source, pa.Buffer):
+            table = ipc.open_file(source).read_all()
+        else:
+            with pa.memory_map(source) as f:
+                table = ipc.open_file(f).read_all()
+    else:
+        raise ValueError(f"Unknown merged file format: {fmt!r}")
+
+    # an all-empty column reads back as float, whatever the hand-off
+    for i, f in enumerate(table.schema):
+        if pa.types.is_null(f.type):
+            table = table.set_column(i, f.name, table.column(i).cast(pa.float64()))
+
+    list_cols = [
+        f.name for f in table.schema
+        if pa.types.is_list(f.type) or pa.types.is_large_list(f.type)
+    ]
+    # same layout as the transformer's CSV: scalar columns first, *_json lists last
+    order = [c for c in table.column_names if c not in list_cols] + list_cols
+    df = table.select(order).to_pandas(types_mapper=_arrow_strings)
+    return df.rename(columns={c: f"{c}_json" for c in list_cols})
@@ -8,34 +8,49 @@ import logging
 
 DUCKDB_FILE = os.getenv("DUCKDB_FILE", "/data/gold/gold.duckdb")
 
-def run_sanity_checks(duckdb_file=None):
-    """Run sanity checks on the DuckDB file and return a dict report."""
-    db_file = duckdb_file or DUCKDB_FILE
-    con = duckdb.connect(db_file)
+def run_sanity_checks(duckdb_file=None, con=None, keys=None):
+    """
+    Run sanity checks on the DuckDB file (or an open connection to it) and
+    return a dict report. `keys` (a frame/Arrow table with crash_record_id,
+    e.g. the rows just merged) limits the checks to those crashes instead of
+    scanning the whole gold table.
+    """
+    own = con is None
+    if own:
+        con = duckdb.connect(duckdb_file or DUCKDB_FILE)
 
-    tables = con.execute("SHOW TABLES").fetchall()
-    row_count = con.execute("SELECT COUNT(*) FROM gold").fetchone()[0]
-    sample_rows = con.execute("SELECT * FROM gold LIMIT 1").fetchdf().to_dict(orient="records")
+    scope = "gold"
+    if keys is not None:
+        con.register("sanity_keys", keys)
+        scope = "(SELECT g.* FROM gold AS g SEMI JOIN sanity_keys AS k USING (crash_record_id))"
 
     try:
-        summary = con.execute("""
-            SELECT crash_type, COUNT(*) AS cnt
-            FROM gold
-            GROUP BY crash_type
-        """).fetchdf().to_dict(orient="records")
-    except duckdb.Error:
-        summary = []
+        tables = con.execute("SHOW TABLES").fetchall()
+        row_count = con.execute(f"SELECT COUNT(*) FROM {scope}").fetchone()[0]
+        sample_rows = con.execute(f"SELECT * FROM {scope} LIMIT 1").fetchdf().to_dict(orient="records")
 
+        try:
+            summary = con.execute(f"""
+                SELECT crash_type, COUNT(*) AS cnt
+                FROM {scope}
+                GROUP BY crash_type
+            """).fetchdf().to_dict(orient="records")
+        except duckdb.Error:
+            summary = []
 
-    # Find duplicates
-    result = con.execute("""
-        SELECT crash_record_id, COUNT(*) AS cnt
-        FROM gold
-        GROUP BY crash_record_id
-        HAVING COUNT(*) > 1
-    """).fetchall()
 
-    con.close()
+        # Find duplicates
+        result = con.execute(f"""
+            SELECT crash_record_id, COUNT(*) AS cnt
+            FROM {scope}
+            GROUP BY crash_record_id
+            HAVING COUNT(*) > 1
+        """).fetchall()
+    finally:
+        if keys is not None:
+            con.unregister("sanity_keys")
+        if own:
+            con.close()
 
     dupes = ""
     if result:
@@ -47,6 +62,7 @@ def run_sanity_checks(duckdb_file=None):
         dupes = "[Sanity] No duplicate crash_record_id found in gold table."
 
     report = {
+        "scope": "merged keys" if keys is not None else "gold",
         "tables": tables,
         "row_count": row_count,
         "sample_rows": sample_rows,
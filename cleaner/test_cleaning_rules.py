@@ -0,0 +1,118 @@
+# cleaner/test_cleaning_rules.py
+# Columnar aggregate() / clean_frame() against the row-wise reference (python -m pytest -q).
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cleaning_rules as R
+import duckdb_writer as W
+from minio_io import read_frame
+
+DROPPED = ["veh_unit_no_list_json", "veh_make_list_json", "ppl_person_id_list_json", "ppl_sex_list_json",
+           "injuries_total", "veh_vehicle_year_list_json", "ppl_injury_classification_list_json",
+           "ppl_safety_equipment_list_json", "ppl_airbag_deployed_list_json"]
+
+# one row per case: (ages, vehicle uses, person types), as the CSV hand-off writes them
+CSV_LISTS = [
+    ("[25, 40, 61]", "[\"PERSONAL\", \"POLICE\"]", "[\"DRIVER\", \"PASSENGER\"]"),
+    (np.nan, np.nan, np.nan),
+    ("[]", "[]", "[]"),
+    ("not json", "bad[", "\"BICYCLE\""),
+    ("[null]", "[1, null, \"PERSONAL\"]", "[\"NON-MOTOR VEHICLE\", \"DRIVER\"]"),
+    ("[9, 10, 110, 111]", "[\"police\"]", "[\"BICYCLE\"]"),
+    ("[\"35\", \" 40 \", \"abc\", true]", "[\"TAXI/FOR HIRE\"]", "[\"PEDESTRIAN\"]"),
+]
+
+# the same shapes from the parquet / arrow hand-off: numpy arrays, None where missing
+NATIVE_LISTS = [
+    (np.array([25, 40, 61]), np.array(["PERSONAL", "POLICE"], dtype=object), np.array(["DRIVER"], dtype=object)),
+    (None, None, None),
+    (np.array([], dtype=np.int64), np.array([], dtype=object), np.array([], dtype=object)),
+    (np.array([9, 10, 110, 111]), np.array(["CTA", "FIRE"], dtype=object), np.array(["BICYCLE"], dtype=object)),
+    (np.array([5]), np.array(["COMMERCIAL - SINGLE UNIT"], dtype=object), None),
+]
+
+
+def _lists_frame(rows):
+    n = len(rows)
+    df = pd.DataFrame({
+        "crash_record_id": [f"id{i}" for i in range(n)],
+        "veh_count": [0, 1, 3, 5, 9, 2, 7][:n],
+        "ppl_age_list_json": [r[0] for r in rows],
+        "veh_vehicle_use_list_json": [r[1] for r in rows],
+        "ppl_person_type_list_json": [r[2] for r in rows],
+    })
+    # a gappy index, as type_to_binary leaves it after dropping unlabeled rows
+    df.index = df.index * 2
+    return df
+
+
+def _merged_frame(rows, native):
+    df = _lists_frame(rows).reset_index(drop=True)
+    n = len(df)
+    for c in DROPPED:
+        df[c] = "[]"
+    df["lighting_condition"] = ["DAYLIGHT", "DARKNESS", "UNKNOWN", "DUSK", None, "DAWN", "DARKNESS, LIGHTED ROAD"][:n]
+    df["crash_date"] = ["2024-03-02T14:05:00", "2023-12-31T23:59:00", "garbage", None,
+                        "2024-07-04T06:00:00", "2022-01-01T00:00:00", "2021-05-05T12:00:00"][:n]
+    # one row without a usable label, so clean_frame drops it and leaves a gap in the index
+    df["crash_type"] = ["INJURY AND / OR TOW DUE TO CRASH", "NO INJURY / DRIVE AWAY", "OTHER",
+                        "NO INJURY / DRIVE AWAY", "INJURY AND / OR TOW DUE TO CRASH",
+                        "NO INJURY / DRIVE AWAY", "INJURY AND / OR TOW DUE TO CRASH"][:n]
+    # a list column that survives cleaning, stored in gold as JSON text
+    df["veh_unit_type_list_json"] = ([np.array(["DRIVER", "PARKED"], dtype=object), None] * n)[:n] if native \
+        else (["[\"DRIVER\", \"PARKED\"]", np.nan] * n)[:n]
+    return df
+
+
+def _clean_rowwise(merged):
+    merged = R.drop_garbage(merged)
+    merged = R.convert_light(merged)
+    merged = R.parse_date(merged)
+    merged = R.type_to_binary(merged)
+    merged = R.aggregate_rowwise(merged)
+    return R.lists_to_json(merged)
+
+
+CASES = {"csv": (CSV_LISTS, False), "native": (NATIVE_LISTS, True)}
+
+
+@pytest.mark.parametrize("handoff", sorted(CASES))
+def test_aggregate_matches_rowwise(handoff):
+    df = _lists_frame(CASES[handoff][0])
+    expected = R.aggregate_rowwise(df.copy())
+    got = R.aggregate(df.copy())
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+
+def test_aggregate_mixed_text_and_lists_matches_rowwise():
+    # a column holding both JSON text and native lists takes aggregate's fallback parser
+    rows = [CSV_LISTS[0], NATIVE_LISTS[0], CSV_LISTS[1], NATIVE_LISTS[1], CSV_LISTS[3]]
+    df = _lists_frame(rows)
+    expected = R.aggregate_rowwise(df.copy())
+    got = R.aggregate(df.copy())
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+
+
+@pytest.mark.parametrize("handoff", sorted(CASES))
+def test_clean_frame_matches_rowwise(handoff):
+    rows, native = CASES[handoff]
+    merged = _merged_frame(rows, native)
+    expected = _clean_rowwise(merged.copy())
+    got = R.clean_frame(merged.copy())
+    pd.testing.assert_frame_equal(got, expected, check_exact=True)
+    assert len(got) == len(merged) - 1
+    assert got["veh_unit_type_list_json"].map(lambda x: isinstance(x, str) or pd.isna(x)).all()
+
+
+def test_csv_handoff_read_frame_matches_pd_read_csv():
+    # read_frame parses the CSV with Arrow; cleaning and gold's column types must not notice
+    text = _merged_frame(CSV_LISTS, native=False).to_csv(index=False).encode("utf-8")
+    arrow_backed = read_frame(io.BytesIO(text), "csv")
+    assert isinstance(arrow_backed["crash_type"].dtype, pd.ArrowDtype)
+    got = R.clean_frame(arrow_backed.copy())
+    pd.testing.assert_frame_equal(got, _clean_rowwise(arrow_backed.copy()), check_exact=True)
+    expected = W._source_rows(R.clean_frame(pd.read_csv(io.BytesIO(text))))
+    assert W._source_rows(got).equals(expected)
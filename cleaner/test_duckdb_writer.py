@@ -0,0 +1,81 @@
+# cleaner/test_duckdb_writer.py
+# Gold connection lifetime across clean jobs (python -m pytest -q).
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+import cleaner
+import duckdb_writer as W
+
+
+@pytest.fixture
+def gold_db(tmp_path, monkeypatch):
+    db = str(tmp_path / "gold.duckdb")
+    monkeypatch.setattr(cleaner, "GOLD_DB", db)
+    connects = []
+    connect = W.duckdb.connect
+
+    def counting(path, *args, **kwargs):
+        connects.append(path)
+        return connect(path, *args, **kwargs)
+
+    monkeypatch.setattr(W.duckdb, "connect", counting)
+    yield db, connects
+    W._close_idle()
+
+
+def _cleaned(ids, crash_type="NO INJURY / DRIVE AWAY"):
+    return pd.DataFrame({
+        "crash_record_id": ids,
+        "crash_type": [crash_type] * len(ids),
+        "row_hash": [hash((i, crash_type)) for i in ids],
+    })
+
+
+def _read_only_count(db):
+    # another process, as duckdb_exporter / streamlit are
+    code = f"import duckdb; print(duckdb.connect({db!r}, read_only=True).execute('SELECT count(*) FROM gold').fetchone()[0])"
+    return int(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+
+
+def test_each_job_uses_one_connection_and_releases_it(gold_db):
+    db, connects = gold_db
+    cleaner.write_gold(_cleaned(["a", "b"]))
+    assert W._CON is None
+    assert _read_only_count(db) == 2
+    cleaner.write_gold(_cleaned(["b", "c"], "INJURY AND / OR TOW DUE TO CRASH"))
+    assert connects == [db, db]   # merge and sanity checks share one per job
+    assert _read_only_count(db) == 3
+
+
+def test_opt_in_idle_close_reuses_one_connection(gold_db, monkeypatch):
+    db, connects = gold_db
+    monkeypatch.setattr(W, "GOLD_IDLE_CLOSE_S", 60)
+    cleaner.write_gold(_cleaned(["a", "b"]))
+    cleaner.write_gold(_cleaned(["b", "c"], "INJURY AND / OR TOW DUE TO CRASH"))
+    cleaner.write_gold(_cleaned(["d"]))
+    assert connects == [db]
+    with W.gold_connection(db) as con:
+        assert con.execute("SELECT count(*) FROM gold").fetchone()[0] == 4
+
+
+def test_idle_connection_is_closed_and_reopened(gold_db, monkeypatch):
+    db, connects = gold_db
+    monkeypatch.setattr(W, "GOLD_IDLE_CLOSE_S", 0.05)
+    cleaner.write_gold(_cleaned(["a"]))
+    time.sleep(0.2)
+    assert W._CON is None   # the file lock is released for readers
+    cleaner.write_gold(_cleaned(["b"]))
+    assert connects == [db, db]
+
+
+def test_sanity_checks_only_the_merged_keys(gold_db):
+    db, _ = gold_db
+    cleaner.write_gold(_cleaned(["a", "b", "c"]))
+    with W.gold_connection(db) as con:
+        report = cleaner.sanity.run_sanity_checks(db, con, keys=pd.DataFrame({"crash_record_id": ["b", "z"]}))
+    assert report["scope"] == "merged keys"
+    assert report["row_count"] == 1
@@ -2,11 +2,13 @@ from prometheus_client import Gauge, start_http_server
 import duckdb
 import os
 import time
+import random
 
 # --- CONFIG ---
 DUCKDB_FILE = "/data/gold/gold.duckdb"   # Update path if needed
 TABLE_NAME = "gold"                       # Change if your gold table has a different name
 SCRAPE_INTERVAL = 10                      # seconds
+OPEN_TRIES = 4                            # the cleaner holds the file lock while it merges
 
 # --- PROMETHEUS METRICS ---
 DUCKDB_FILE_SIZE_BYTES = Gauge(
@@ -28,13 +30,31 @@ def update_metrics():
         DUCKDB_FILE_SIZE_BYTES.set(0)
 
     # 2. Row count of gold table
-    try:
-        con = duckdb.connect(DUCKDB_FILE, read_only=True)
-        result = con.execute(f"SELECT COUNT(*) FROM {TABLE_NAME};").fetchone()
-        DUCKDB_GOLD_TABLE_ROWS.set(result[0])
-        con.close()
-    except Exception:
+    if not os.path.exists(DUCKDB_FILE):
         DUCKDB_GOLD_TABLE_ROWS.set(0)
+        return
+    delay = 0.25
+    for attempt in range(OPEN_TRIES):
+        try:
+            con = duckdb.connect(DUCKDB_FILE, read_only=True)
+            try:
+                result = con.execute(f"SELECT COUNT(*) FROM {TABLE_NAME};").fetchone()
+            finally:
+                con.close()
+            DUCKDB_GOLD_TABLE_ROWS.set(result[0])
+            return
+        except duckdb.CatalogException:
+            DUCKDB_GOLD_TABLE_ROWS.set(0)   # no gold table yet
+            return
+        except duckdb.IOException as e:
+            if "lock" not in str(e).lower():
+                break
+            time.sleep(delay + random.random() * delay)
+            delay *= 2
+        except Exception:
+            break
+    # still locked (or unreadable): keep the last value rather than reporting 0
+    print("gold.duckdb busy; row count not refreshed this scrape")
 
 def main():
     print("Starting DuckDB Exporter on port 9104...")
@@ -19,6 +19,7 @@ import (
 	"sync"
 	"time"
 
+	"github.com/klauspost/compress/zstd"
 	minio "github.com/minio/minio-go/v7"
 	"github.com/minio/minio-go/v7/pkg/credentials"
 	"github.com/prometheus/client_golang/prometheus"
@@ -187,6 +188,8 @@ type Env struct {
 	MinioSecret   string
 	MinioSSL      bool
 	RawBucket     string
+	PageQueue     string // per-page events for the transformer; empty = off
+	RawEncoding   string // json.gz | ndjson.gz | ndjson.zst
 }
 
 func getenv(k, def string) string {
@@ -208,9 +211,20 @@ func getEnv() Env {
 		MinioSecret:   getenv("MINIO_SECRET_KEY", "admin123"),
 		MinioSSL:      ssl,
 		RawBucket:     getenv("RAW_BUCKET", "raw-data"),
+		PageQueue:     getenv("PAGE_EVENTS_QUEUE", ""),
+		RawEncoding:   rawEncoding(getenv("RAW_ENCODING", "json.gz")),
 	}
 }
 
+func rawEncoding(s string) string {
+	switch s = strings.ToLower(strings.TrimPrefix(s, ".")); s {
+	case "json.gz", "ndjson.gz", "ndjson.zst":
+		return s
+	}
+	log.Printf("unknown RAW_ENCODING %q; using json.gz", s)
+	return "json.gz"
+}
+
 func newMinio(env Env) *minio.Client {
 	var cli *minio.Client
 	var err error
@@ -289,26 +303,59 @@ func httpGetJSON(env Env, fullURL string) ([]byte, error) {
 }
 
 // =============================
-// MinIO write (.json.gz) + metadata
+// MinIO write (raw pages) + metadata
 // =============================
 
-func putJSONGZ(cli *minio.Client, env Env, key string, raw []byte, meta map[string]string) error {
-	var buf bytes.Buffer
-	gz := gzip.NewWriter(&buf)
-	_, err := gz.Write(raw)
-	if err != nil {
-		return err
+// one encoder for all pages; EncodeAll is safe for concurrent use
+var zstdEncoder, _ = zstd.NewWriter(nil)
+
+// rawExt is the key suffix of a raw page in the configured RAW_ENCODING
+func (e Env) rawExt() string { return "." + e.RawEncoding }
+
+// putRawPage writes one page of records as RAW_ENCODING: json.gz (a gzipped
+// JSON array, the default), or one record per line compressed with gzip or
+// zstd. The transformer sniffs both the codec and the layout.
+func putRawPage(cli *minio.Client, env Env, key string, recs []map[string]any, meta map[string]string) (minio.UploadInfo, error) {
+	var payload []byte
+	contentType := "application/json"
+	if strings.HasPrefix(env.RawEncoding, "ndjson") {
+		var lines bytes.Buffer
+		enc := json.NewEncoder(&lines)
+		for _, r := range recs {
+			if err := enc.Encode(r); err != nil {
+				return minio.UploadInfo{}, err
+			}
+		}
+		payload, contentType = lines.Bytes(), "application/x-ndjson"
+	} else {
+		b, err := json.Marshal(recs)
+		if err != nil {
+			return minio.UploadInfo{}, err
+		}
+		payload = b
 	}
-	if err := gz.Close(); err != nil {
-		return err
+
+	var body []byte
+	encoding := "gzip"
+	if strings.HasSuffix(env.RawEncoding, ".zst") {
+		body, encoding = zstdEncoder.EncodeAll(payload, nil), "zstd"
+	} else {
+		var buf bytes.Buffer
+		gz := gzip.NewWriter(&buf)
+		if _, err := gz.Write(payload); err != nil {
+			return minio.UploadInfo{}, err
+		}
+		if err := gz.Close(); err != nil {
+			return minio.UploadInfo{}, err
+		}
+		body = buf.Bytes()
 	}
-	reader := bytes.NewReader(buf.Bytes())
-	_, err = cli.PutObject(context.Background(), env.RawBucket, key, reader, int64(reader.Len()), minio.PutObjectOptions{
-		ContentType:     "application/json",
-		ContentEncoding: "gzip",
+	reader := bytes.NewReader(body)
+	return cli.PutObject(context.Background(), env.RawBucket, key, reader, int64(reader.Len()), minio.PutObjectOptions{
+		ContentType:     contentType,
+		ContentEncoding: encoding,
 		UserMetadata:    meta,
 	})
-	return err
 }
 
 // =============================
@@ -474,30 +521,31 @@ func writePageMarker(cli *minio.Client, env Env, key string, pageMax time.Time,
 	return err
 }
 
-// ---------- Read marker's page_max (if present) ----------
-func readMarkerPageMax(cli *minio.Client, env Env, key string) time.Time {
+// ---------- Read marker's page_max and run_id (if present) ----------
+func readMarker(cli *minio.Client, env Env, key string) (time.Time, string) {
 	st, err := cli.StatObject(context.Background(), env.RawBucket, key, minio.StatObjectOptions{})
 	if err != nil {
-		return time.Time{}
+		return time.Time{}, ""
 	}
-	var val string
+	var val, runID string
 	for k, v := range st.UserMetadata {
 		if strings.EqualFold(k, "page_max") {
 			val = v
-			break
+		} else if strings.EqualFold(k, "run_id") {
+			runID = v
 		}
 	}
 	if val == "" {
-		return time.Time{}
+		return time.Time{}, runID
 	}
 	if t, e := time.Parse(time.RFC3339, val); e == nil {
-		return t
+		return t, runID
 	}
-	return time.Time{}
+	return time.Time{}, runID
 }
 
 // ---------- Main job processor ----------
-func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error) {
+func processJob(env Env, mcli *minio.Client, job Job, objs *runObjects, pages *pagePublisher) (string, bool, int, error) {
 
 	var totalRows int
 	totalRows = 0
@@ -525,15 +573,22 @@ func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error)
 		// PRE-FETCH SKIP: if this offset was already processed for this WHERE window, skip API
 		mk := markerKey(job, crashOff)
 		if objExists(mcli, env, mk) {
-			if t := readMarkerPageMax(mcli, env, mk); t.After(runMax) {
+			t, runID := readMarker(mcli, env, mk)
+			if t.After(runMax) {
 				runMax = t
 			}
+			// a redelivery of the same corr: the earlier attempt's pages are in
+			// its prefix but not in this run's object list
+			if corr != "" && runID == corr {
+				objs.skip()
+			}
 			log.Printf("offset=%d already done (marker: %s) — skipping", crashOff, mk)
 			crashOff += job.Primary.PageSz
 			continue
 		}
 
 		rows, crashIDs, raw, pageMax, err := fetchCrashesPage(env, job, crashOff)
+		pageStart := objs.count()
 
 		if err != nil {
 			return "", false, totalRows, fmt.Errorf("crashes page off=%d: %w", crashOff, err)
@@ -580,9 +635,8 @@ func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error)
 			if len(recs) == 0 {
 				continue
 			}
-			b, _ := json.Marshal(recs)
-			key := fmt.Sprintf("%s/%s/year=%04d/corr=%s/offset=%d_limit=%d.json.gz",
-				job.Storage.Prefix, job.Primary.Alias, y, corr, crashOff, job.Primary.PageSz)
+			key := fmt.Sprintf("%s/%s/year=%04d/corr=%s/offset=%d_limit=%d%s",
+				job.Storage.Prefix, job.Primary.Alias, y, corr, crashOff, job.Primary.PageSz, env.rawExt())
 			meta := map[string]string{
 				"run_id":    corr,
 				"entity":    job.Primary.Alias,
@@ -592,9 +646,11 @@ func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error)
 				meta["window_start"] = job.DateRange.Start
 				meta["window_end"] = job.DateRange.End
 			}
-			if err := putJSONGZ(mcli, env, key, b, meta); err != nil {
+			info, err := putRawPage(mcli, env, key, recs, meta)
+			if err != nil {
 				return "", false, totalRows, err
 			}
+			objs.add(job.Primary.Alias, key, y, len(recs), info)
 			wroteAny = true
 			log.Printf("saved: s3://%s/%s (year=%d, rows=%d)", env.RawBucket, key, y, len(recs))
 		}
@@ -620,12 +676,12 @@ func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error)
 			go func() {
 				defer wg.Done()
 				fetchEnrichBatches(env, mcli, job, corr, job.EnrichByAlias("vehicles"),
-					crashOff, batches, job.Batching.MaxWorkers.Vehicles, crashYearByID)
+					crashOff, batches, job.Batching.MaxWorkers.Vehicles, crashYearByID, objs)
 			}()
 			go func() {
 				defer wg.Done()
 				fetchEnrichBatches(env, mcli, job, corr, job.EnrichByAlias("people"),
-					crashOff, batches, job.Batching.MaxWorkers.People, crashYearByID)
+					crashOff, batches, job.Batching.MaxWorkers.People, crashYearByID, objs)
 			}()
 			wg.Wait()
 		}
@@ -635,6 +691,16 @@ func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error)
 			log.Printf("marker write failed (%s): %v", mk, err)
 		}
 
+		// Page-ready event: the transformer can pre-aggregate this page while we fetch the next
+		if pages != nil {
+			if err := pages.publish(PageEvent{
+				Type: "page", CorrID: corr, Page: crashOff,
+				Selects: job.selects(), Objects: objs.since(pageStart),
+			}); err != nil {
+				log.Printf("publish page event off=%d failed: %v", crashOff, err)
+			}
+		}
+
 		crashOff += job.Primary.PageSz
 	}
 
@@ -652,6 +718,22 @@ func processJob(env Env, mcli *minio.Client, job Job) (string, bool, int, error)
 	return corr, wroteAny, totalRows, nil
 }
 
+// selects mirrors the $select each fetch sends, keyed by dataset alias
+func (j Job) selects() map[string]string {
+	j.applyDefaults()
+	out := map[string]string{
+		j.Primary.Alias: ensureSelect(defaultStr(j.Primary.Select, "*"), j.JoinKey, "crash_date"),
+	}
+	for _, ds := range j.Enrich {
+		sel := ds.Select
+		if strings.TrimSpace(sel) == "" {
+			sel = fmt.Sprintf("%s,unit_no", j.JoinKey)
+		}
+		out[ds.Alias] = ensureSelect(sel, j.JoinKey)
+	}
+	return out
+}
+
 func (j *Job) EnrichByAlias(alias string) *DatasetSpec {
 	for i := range j.Enrich {
 		if j.Enrich[i].Alias == alias {
@@ -718,7 +800,7 @@ func fetchCrashesPage(env Env, job Job, offset int) (rows int, crashIDs []string
 }
 
 func fetchEnrichBatches(env Env, mcli *minio.Client, job Job, corr string, ds *DatasetSpec,
-	crashOffset int, batches [][]string, maxWorkers int, yearByID map[string]int) {
+	crashOffset int, batches [][]string, maxWorkers int, yearByID map[string]int, objs *runObjects) {
 	if ds == nil {
 		return
 	}
@@ -738,7 +820,7 @@ func fetchEnrichBatches(env Env, mcli *minio.Client, job Job, corr string, ds *D
 		go func() {
 			defer wg.Done()
 			for t := range tasks {
-				fetchOneBatchAllPages(env, mcli, job, corr, ds, crashOffset, t.idx, t.ids, yearByID)
+				fetchOneBatchAllPages(env, mcli, job, corr, ds, crashOffset, t.idx, t.ids, yearByID, objs)
 			}
 		}()
 	}
@@ -751,7 +833,7 @@ func fetchEnrichBatches(env Env, mcli *minio.Client, job Job, corr string, ds *D
 }
 
 func fetchOneBatchAllPages(env Env, mcli *minio.Client, job Job, corr string, ds *DatasetSpec,
-	crashOff, batchIdx int, ids []string, yearByID map[string]int) {
+	crashOff, batchIdx int, ids []string, yearByID map[string]int, objs *runObjects) {
 	// Build WHERE: crash_record_id in ('A','B',...)
 	vals := make([]string, 0, len(ids))
 	for _, id := range ids {
@@ -779,11 +861,13 @@ func fetchOneBatchAllPages(env Env, mcli *minio.Client, job Job, corr string, ds
 		raw, err := httpGetJSON(env, u)
 		if err != nil {
 			log.Printf("enrich %s batch=%d off=%d: %v", ds.Alias, batchIdx, off, err)
+			objs.fail()
 			return
 		}
 		var arr []map[string]any
 		if err := json.Unmarshal(raw, &arr); err != nil {
 			log.Printf("parse %s: %v", ds.Alias, err)
+			objs.fail()
 			return
 		}
 		rows := len(arr)
@@ -821,13 +905,12 @@ func fetchOneBatchAllPages(env Env, mcli *minio.Client, job Job, corr string, ds
 				continue
 			}
 
-			payload, _ := json.Marshal(recs)
 			key := fmt.Sprintf("%s/%s/year=%04d/corr=%s/crashes_offset=%d_batch=%d",
 				job.Storage.Prefix, ds.Alias, y, corr, crashOff, batchIdx)
 			if off > 0 {
 				key += fmt.Sprintf("_part=%d", off/limit)
 			}
-			key += ".json.gz"
+			key += env.rawExt()
 
 			meta := map[string]string{
 				"run_id":    corr,
@@ -839,9 +922,11 @@ func fetchOneBatchAllPages(env Env, mcli *minio.Client, job Job, corr string, ds
 				meta["window_end"] = job.DateRange.End
 			}
 
-			if err := putJSONGZ(mcli, env, key, payload, meta); err != nil {
+			if info, err := putRawPage(mcli, env, key, recs, meta); err != nil {
 				log.Printf("save %s: %v", key, err)
+				objs.fail()
 			} else {
+				objs.add(ds.Alias, key, y, len(recs), info)
 				log.Printf("saved: s3://%s/%s (year=%d, rows=%d)", env.RawBucket, key, y, len(recs))
 			}
 		}
@@ -859,17 +944,124 @@ func defaultStr(s, def string) string {
 // Per-run manifest
 // =============================
 
+// ManifestObject is one raw page written for the corr. The transformer reads
+// these instead of listing the whole dataset prefix.
+type ManifestObject struct {
+	Alias string `json:"alias"`
+	Key   string `json:"key"`
+	Year  int    `json:"year"`
+	Bytes int64  `json:"bytes"`
+	Rows  int    `json:"rows"`
+	ETag  string `json:"etag,omitempty"`
+}
+
 type Manifest struct {
-	Corr       string    `json:"corr"`
-	Mode       string    `json:"mode"`
-	Where      string    `json:"where"`
-	StartedAt  time.Time `json:"started_at"`
-	FinishedAt time.Time `json:"finished_at"`
+	Corr       string            `json:"corr"`
+	Mode       string            `json:"mode"`
+	Where      string            `json:"where"`
+	StartedAt  time.Time         `json:"started_at"`
+	FinishedAt time.Time         `json:"finished_at"`
+	Complete   bool              `json:"complete"` // false if any page failed to fetch or save
+	Selects    map[string]string `json:"selects"`  // alias -> $select actually sent
+	Objects    []ManifestObject  `json:"objects"`
+	// pages of this corr written by an earlier attempt that Objects may not
+	// list (no manifest to merge); the transformer lists the prefix instead
+	SkippedPages int `json:"skipped_pages,omitempty"`
+}
+
+// runObjects collects the pages written during one job (enrich workers add concurrently)
+type runObjects struct {
+	mu      sync.Mutex
+	objs    []ManifestObject
+	failed  int
+	skipped int
+}
+
+func (r *runObjects) add(alias, key string, year, rows int, info minio.UploadInfo) {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	r.objs = append(r.objs, ManifestObject{
+		Alias: alias, Key: key, Year: year, Bytes: info.Size, Rows: rows, ETag: info.ETag,
+	})
+}
+
+func (r *runObjects) fail() {
+	r.mu.Lock()
+	r.failed++
+	r.mu.Unlock()
+}
+
+// skip records a page whose marker shows this corr already wrote it
+func (r *runObjects) skip() {
+	r.mu.Lock()
+	r.skipped++
+	r.mu.Unlock()
+}
+
+func (r *runObjects) count() int {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	return len(r.objs)
+}
+
+// since returns the objects added after the first n, sorted by key
+func (r *runObjects) since(n int) []ManifestObject {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	out := append([]ManifestObject(nil), r.objs[n:]...)
+	sort.Slice(out, func(i, j int) bool { return out[i].Key < out[j].Key })
+	return out
+}
+
+// snapshot returns the objects sorted by key (same order as an S3 listing)
+func (r *runObjects) snapshot() ([]ManifestObject, bool, int) {
+	r.mu.Lock()
+	defer r.mu.Unlock()
+	out := append([]ManifestObject(nil), r.objs...)
+	sort.Slice(out, func(i, j int) bool { return out[i].Key < out[j].Key })
+	return out, r.failed == 0, r.skipped
+}
+
+func readManifest(cli *minio.Client, env Env, key string) (Manifest, bool) {
+	var m Manifest
+	obj, err := cli.GetObject(context.Background(), env.RawBucket, key, minio.GetObjectOptions{})
+	if err != nil {
+		return m, false
+	}
+	defer obj.Close()
+	b, err := io.ReadAll(obj)
+	if err != nil || json.Unmarshal(b, &m) != nil {
+		return m, false
+	}
+	return m, true
 }
 
+// writeManifest merges into an earlier attempt's manifest for the same corr
+// (a redelivery skips the pages that attempt wrote), so Objects keeps them.
 func writeManifest(cli *minio.Client, env Env, m Manifest) {
-	b, _ := json.MarshalIndent(m, "", "  ")
 	key := fmt.Sprintf("_runs/corr=%s/manifest.json", m.Corr)
+	if prev, ok := readManifest(cli, env, key); ok {
+		byKey := make(map[string]ManifestObject, len(prev.Objects)+len(m.Objects))
+		for _, o := range prev.Objects {
+			byKey[o.Key] = o
+		}
+		for _, o := range m.Objects {
+			byKey[o.Key] = o
+		}
+		merged := make([]ManifestObject, 0, len(byKey))
+		for _, o := range byKey {
+			merged = append(merged, o)
+		}
+		sort.Slice(merged, func(i, j int) bool { return merged[i].Key < merged[j].Key })
+		m.Objects = merged
+		if !prev.StartedAt.IsZero() {
+			m.StartedAt = prev.StartedAt
+		}
+		m.Complete = m.Complete && prev.Complete
+		// the earlier manifest lists every page this run skipped
+		m.SkippedPages = prev.SkippedPages
+	}
+	b, _ := json.MarshalIndent(m, "", "  ")
 	r := bytes.NewReader(b)
 	_, err := cli.PutObject(context.Background(), env.RawBucket, key, r, int64(r.Len()),
 		minio.PutObjectOptions{ContentType: "application/json"})
@@ -918,6 +1110,90 @@ func publishTransformJob(amqpURL string, job TransformJob) error {
 	)
 }
 
+// Page events
+
+// PageEvent announces one crash page and the enrichment objects fetched for
+// its crashes, as soon as they are all saved.
+type PageEvent struct {
+	Type    string            `json:"type"` // "page"
+	CorrID  string            `json:"corr_id"`
+	Page    int               `json:"page"` // crashes offset
+	Selects map[string]string `json:"selects"`
+	Objects []ManifestObject  `json:"objects"`
+}
+
+// pagePublisher keeps one AMQP channel open for the page events of a run,
+// redialing after a failure. The mutex serializes use of the channel.
+type pagePublisher struct {
+	mu    sync.Mutex
+	url   string
+	queue string
+	conn  *amqp.Connection
+	ch    *amqp.Channel
+}
+
+func newPagePublisher(url, queue string) *pagePublisher {
+	return &pagePublisher{url: url, queue: queue}
+}
+
+func (p *pagePublisher) channel() (*amqp.Channel, error) {
+	if p.ch != nil && !p.ch.IsClosed() {
+		return p.ch, nil
+	}
+	p.closeLocked()
+	conn, err := amqp.Dial(p.url)
+	if err != nil {
+		return nil, err
+	}
+	ch, err := conn.Channel()
+	if err != nil {
+		conn.Close()
+		return nil, err
+	}
+	if _, err := ch.QueueDeclare(p.queue, true, false, false, false, nil); err != nil {
+		conn.Close()
+		return nil, err
+	}
+	p.conn, p.ch = conn, ch
+	return ch, nil
+}
+
+func (p *pagePublisher) publish(ev PageEvent) error {
+	body, err := json.Marshal(ev)
+	if err != nil {
+		return err
+	}
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	for attempt := 1; ; attempt++ {
+		ch, err := p.channel()
+		if err == nil {
+			err = ch.Publish("", p.queue, false, false, amqp.Publishing{
+				ContentType:  "application/json",
+				DeliveryMode: amqp.Persistent,
+				Body:         body,
+			})
+		}
+		if err == nil || attempt == 2 {
+			return err
+		}
+		p.closeLocked()
+	}
+}
+
+func (p *pagePublisher) closeLocked() {
+	if p.conn != nil {
+		p.conn.Close()
+	}
+	p.conn, p.ch = nil, nil
+}
+
+func (p *pagePublisher) close() {
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	p.closeLocked()
+}
+
 // =============================
 // RabbitMQ consumer
 // =============================
@@ -965,6 +1241,12 @@ func main() {
 		log.Fatalf("consume: %v", err)
 	}
 
+	var pages *pagePublisher
+	if env.PageQueue != "" {
+		pages = newPagePublisher(env.RabbitURL, env.PageQueue)
+		defer pages.close()
+	}
+
 	log.Printf("Extractor up. Waiting for jobs on queue %q", qName)
 	for d := range msgs {
 		start := time.Now()
@@ -986,7 +1268,8 @@ func main() {
 			log.Printf("warning: no enrich datasets provided")
 		}
 
-		corr, wroteAny, rows, err := processJob(env, mcli, job)
+		objs := &runObjects{}
+		corr, wroteAny, rows, err := processJob(env, mcli, job, objs, pages)
 		if err != nil {
 			log.Printf("job failed: %v", err)
 		} else {
@@ -995,12 +1278,17 @@ func main() {
 
 			// Write manifest for lineage (even if no clean published)
 			if corr != "" {
+				written, complete, skipped := objs.snapshot()
 				writeManifest(mcli, env, Manifest{
-					Corr:       corr,
-					Mode:       job.Mode,
-					Where:      job.Primary.Where,
-					StartedAt:  start.UTC(),
-					FinishedAt: time.Now().UTC(),
+					Corr:         corr,
+					Mode:         job.Mode,
+					Where:        job.Primary.Where,
+					StartedAt:    start.UTC(),
+					FinishedAt:   time.Now().UTC(),
+					Complete:     complete,
+					Selects:      job.selects(),
+					Objects:      written,
+					SkippedPages: skipped,
 				})
 			}
 
@@ -0,0 +1,31 @@
+import streamlit as st
+from datetime import datetime
+
+from utils.silver import query_silver, SILVER_BUCKET, SILVER_ROOT
+
+st.title("🥈 Silver Layer")
+st.caption(f"Every crash the transformer has merged, one row per crash: s3://{SILVER_BUCKET}/{SILVER_ROOT}/year=YYYY/")
+
+# ---- A) PER-YEAR OVERVIEW ----
+st.header("📅 Crashes per Year")
+if st.button("Load overview"):
+    try:
+        st.dataframe(query_silver(
+            "SELECT year, COUNT(*) AS crashes, MIN(crash_date) AS first, MAX(crash_date) AS last "
+            "FROM silver_crashes GROUP BY year ORDER BY year"
+        ))
+    except Exception as e:
+        st.error(f"❌ Could not read silver: {e}")
+
+# ---- B) QUERY ----
+st.header("🔍 Query")
+this_year = datetime.now().year
+years = st.multiselect("Years (empty = all; fewer years read fewer files)",
+                       list(range(this_year, 2014, -1)), default=[this_year])
+sql = st.text_area("SQL over `silver_crashes`",
+                   "SELECT crash_date, crash_type, injuries_total\nFROM silver_crashes\nORDER BY crash_date DESC\nLIMIT 100")
+if st.button("Run query"):
+    try:
+        st.dataframe(query_silver(sql, years=years or None))
+    except Exception as e:
+        st.error(f"❌ Query failed: {e}")
@@ -1,13 +1,28 @@
 import duckdb
 import os
+import time
+import random
 import pandas as pd
 
 GOLD_PATH = os.getenv("GOLD_PATH", "/data/gold/gold.duckdb")
+GOLD_OPEN_TRIES = int(os.getenv("GOLD_OPEN_TRIES", "6"))
+
+def _connect_gold(read_only=True):
+    """Open gold, backing off while the cleaner holds DuckDB's file lock for a merge."""
+    delay = 0.25
+    for attempt in range(GOLD_OPEN_TRIES):
+        try:
+            return duckdb.connect(GOLD_PATH, read_only=read_only)
+        except duckdb.IOException as e:
+            if "lock" not in str(e).lower() or attempt == GOLD_OPEN_TRIES - 1:
+                raise
+            time.sleep(delay + random.random() * delay)
+            delay *= 2
 
 def get_gold_status():
     if not os.path.exists(GOLD_PATH):
         return {"exists": False, "tables": {}, "rows": 0}
-    con = duckdb.connect(GOLD_PATH, read_only=True)
+    con = _connect_gold()
     tables = con.execute("SHOW TABLES").fetchall()
     counts = {}
     total = 0
@@ -19,20 +34,29 @@ def get_gold_status():
     return {"exists": True, "tables": counts, "rows": total}
 
 def wipe_gold():
-    if os.path.exists(GOLD_PATH):
-        os.remove(GOLD_PATH)
-        return True
-    return False
+    # drop the tables under the writer lock rather than deleting the file
+    # out from under a cleaner that has it open
+    if not os.path.exists(GOLD_PATH):
+        return False
+    con = _connect_gold(read_only=False)
+    try:
+        for (t,) in con.execute("SHOW TABLES").fetchall():
+            con.execute(f'DROP TABLE IF EXISTS "{t}"')
+        con.execute("CHECKPOINT")
+    finally:
+        con.close()
+    return True
 
 def sample_gold(columns=None, limit=50):
     if not os.path.exists(GOLD_PATH):
         return pd.DataFrame()
-    con = duckdb.connect(GOLD_PATH, read_only=True)
+    con = _connect_gold()
     table = con.execute("SHOW TABLES").fetchone()
     if not table:
+        con.close()
         return pd.DataFrame()
     t = table[0]
     cols = "*" if not columns else ", ".join(columns)
     df = con.execute(f"SELECT {cols} FROM {t} LIMIT {limit}").df()
     con.close()
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,98 @@
+# silver.py
+
+# DuckDB access to the transformer's silver layer in MinIO:
+#   s3://<SILVER_BUCKET>/silver/crashes/year=YYYY/*.parquet
+# Files are read over httpfs with hive partitioning. Rows of the same crash
+# written by several corrs are deduplicated here (latest _ingested_at wins),
+# the same rule the transformer's compaction applies.
+#
+# Pushdown: filters on the view go into the row scan, so `year = ...` prunes
+# whole partitions and crash_date / other predicates are checked against the
+# parquet row-group stats. Only the rows that pass are then checked against
+# the latest _ingested_at of their crash; that lookup reads just (year,
+# crash_record_id, _ingested_at), and only in the years the row scan kept.
+# Unfiltered scans pay for the lookup over every row.
+#
+# httpfs is installed into the image at build time (see the dockerfile), so
+# the container only loads it and needs no network access to extensions.
+
+import os
+import sys
+import logging
+from typing import Iterable, Optional
+
+import duckdb
+
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
+MINIO_ACCESS   = os.getenv("MINIO_USER")
+MINIO_SECRET   = os.getenv("MINIO_PASS")
+MINIO_SECURE   = os.getenv("MINIO_SSL", "false").lower() == "true"
+SILVER_BUCKET  = os.getenv("SILVER_BUCKET") or os.getenv("XFORM_BUCKET", "transform-data")
+SILVER_ROOT    = "silver/crashes"
+
+
+def _quote(s: str) -> str:
+    return "'" + str(s).replace("'", "''") + "'"
+
+
+def configure_s3(con: duckdb.DuckDBPyConnection) -> None:
+    """Point DuckDB's httpfs at MinIO (path-style URLs)."""
+    con.execute("LOAD httpfs;")
+    con.execute(f"SET s3_endpoint = {_quote(MINIO_ENDPOINT)};")
+    con.execute(f"SET s3_access_key_id = {_quote(MINIO_ACCESS or '')};")
+    con.execute(f"SET s3_secret_access_key = {_quote(MINIO_SECRET or '')};")
+    con.execute(f"SET s3_use_ssl = {'true' if MINIO_SECURE else 'false'};")
+    con.execute("SET s3_url_style = 'path';")
+    con.execute("SET s3_region = 'us-east-1';")
+
+
+def silver_source(years: Optional[Iterable[int]] = None, base: Optional[str] = None) -> str:
+    """
+    read_parquet(...) over the silver files, deduplicated per crash.
+    `years` limits the glob to those partitions; `base` overrides the
+    s3://bucket/root location (e.g. a local copy).
+    """
+    base = (base or f"s3://{SILVER_BUCKET}/{SILVER_ROOT}").rstrip("/")
+    if years:
+        paths = [f"{base}/year={int(y):04d}/*.parquet" for y in years]
+    else:
+        paths = [f"{base}/year=*/*.parquet"]
+    files = "[" + ", ".join(_quote(p) for p in paths) + "]"
+    scan = f"read_parquet({files}, hive_partitioning = true, union_by_name = true)"
+    # a correlated lookup rather than a window (QUALIFY row_number() ...):
+    # a window stops every filter but year from reaching the scan
+    return f"""
+        SELECT r.* FROM {scan} AS r
+        WHERE r._ingested_at = (
+            SELECT max(l._ingested_at) FROM {scan} AS l
+            WHERE l.year = r.year AND l.crash_record_id = r.crash_record_id
+        )
+    """
+
+
+def connect_silver(con: Optional[duckdb.DuckDBPyConnection] = None,
+                   years: Optional[Iterable[int]] = None,
+                   base: Optional[str] = None) -> duckdb.DuckDBPyConnection:
+    """Return a connection with a `silver_crashes` view over the silver layer."""
+    con = con or duckdb.connect()
+    if not (base and not base.startswith("s3://")):
+        configure_s3(con)
+    con.execute(f"CREATE OR REPLACE TEMP VIEW silver_crashes AS {silver_source(years, base)}")
+    return con
+
+
+def query_silver(sql: str, years: Optional[Iterable[int]] = None):
+    """Run `sql` (which can reference silver_crashes) and return a pandas DataFrame."""
+    con = connect_silver(years=years)
+    try:
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+
+# python -m utils.silver "SELECT year, COUNT(*) FROM silver_crashes GROUP BY year ORDER BY year"
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='[%(filename)s] %(message)s')
+    sql = sys.argv[1] if len(sys.argv) > 1 else \
+        "SELECT year, COUNT(*) AS crashes FROM silver_crashes GROUP BY year ORDER BY year"
+    print(query_silver(sql).to_string(index=False))
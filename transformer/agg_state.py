@@ -0,0 +1,161 @@
+# agg_state.py
+# Persistent per-crash aggregate state for the vehicles / people roll-ups.
+#
+# Every corr is transformed on its own, so enrichment rows for a crash that
+# arrive in a later window would otherwise be aggregated from a partial set.
+# The store keeps one aggregate per crash_record_id (row count + sorted-unique
+# value lists) and folds each corr's partial into it: lists union, and the
+# count is the number of distinct vehicles / people (unit_no / person_id)
+# seen, never less than the largest single count. Streaming windows overlap,
+# so the same enrichment rows arrive again with every corr that re-fetches
+# the crash; folding is idempotent, so neither that nor a replayed corr
+# counts anything twice.
+#
+# A shard holds one row per id, so its size follows the number of crashes
+# in it, not the number of corrs that touched them. Each merge still reads
+# and rewrites the whole shard; raise AGG_STATE_SHARDS as the history grows.
+#
+# Single replica only: the read-modify-write of a shard is serialized by
+# in-process locks, so two transformer replicas merging into the same shard
+# can lose each other's updates. Run one replica (TRANSFORM_WORKERS threads
+# are fine) with AGG_STATE_ENABLED=true.
+import io
+import logging
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+import polars as pl
+from minio import Minio
+from minio.error import S3Error
+
+CORR_COL  = "_corr"      # in the store: the last corr that touched the id
+SHARD_COL = "_shard"
+
+# per-prefix field that identifies one enrichment row of a crash
+COUNT_KEYS = {"veh": "unit_no", "ppl": "person_id"}
+
+# one lock per shard object: concurrent jobs in this process must not
+# read-modify-write the same shard at once (replicas are not coordinated,
+# see the header)
+_SHARD_LOCKS: Dict[str, threading.Lock] = {}
+_SHARD_LOCKS_GUARD = threading.Lock()
+
+
+def _shard_lock(key: str) -> threading.Lock:
+    with _SHARD_LOCKS_GUARD:
+        return _SHARD_LOCKS.setdefault(key, threading.Lock())
+
+
+def combine_partials(partials: pl.DataFrame, id_col: str, prefix: str, distinct: bool = False) -> pl.DataFrame:
+    """
+    Merge partial aggregates per id: union + sort the lists. Counts add up for
+    disjoint partials (pages of one corr); with `distinct`, for partials that
+    may repeat rows (corrs over overlapping windows), the count is the number
+    of distinct COUNT_KEYS values, or the largest partial count if higher.
+    """
+    count_col = f"{prefix}_count"
+    key_col = f"{prefix}_{COUNT_KEYS.get(prefix, '')}_list"
+    list_cols = [c for c in partials.columns if c.startswith(f"{prefix}_") and c.endswith("_list")]
+    dtype = partials.schema[count_col]
+    if distinct and key_col in list_cols:
+        count = pl.max_horizontal(
+            pl.col(key_col).explode().drop_nulls().n_unique().cast(dtype),
+            pl.col(count_col).max(),
+        )
+    elif distinct:
+        count = pl.col(count_col).max()
+    else:
+        count = pl.col(count_col).sum().cast(dtype)
+    aggs = [count.alias(count_col)]
+    for c in list_cols:
+        aggs.append(pl.col(c).explode().drop_nulls().unique().sort().alias(c))
+    return partials.group_by(id_col, maintain_order=True).agg(aggs)
+
+
+class AggStateStore:
+    """
+    Aggregates in MinIO, hash-sharded by id, one row per id:
+        <root>/<prefix>/shard=NN.parquet  (id, _corr, <prefix>_count, <prefix>_*_list)
+    Only the shards holding this corr's ids are read and rewritten.
+    """
+
+    def __init__(self, cli: Minio, bucket: str, shards: int = 16, root: str = "_state/agg"):
+        self.cli = cli
+        self.bucket = bucket
+        self.shards = max(1, shards)
+        self.root = root
+
+    def _key(self, prefix: str, shard: int) -> str:
+        return f"{self.root}/{prefix}/shard={shard:02d}.parquet"
+
+    def _read(self, key: str) -> Optional[pl.DataFrame]:
+        resp = None
+        try:
+            resp = self.cli.get_object(self.bucket, key)
+            return pl.read_parquet(io.BytesIO(resp.read()))
+        except S3Error as e:
+            if e.code in {"NoSuchKey", "NoSuchObject"}:
+                return None
+            raise
+        finally:
+            if resp is not None:
+                resp.close()
+                resp.release_conn()
+
+    def _write(self, key: str, df: pl.DataFrame) -> None:
+        buf = io.BytesIO()
+        df.write_parquet(buf, compression="zstd")
+        buf.seek(0)
+        self.cli.put_object(
+            self.bucket, key, data=buf, length=buf.getbuffer().nbytes,
+            content_type="application/vnd.apache.parquet",
+        )
+
+    def _shard_of(self, ids: pl.Series) -> pl.Series:
+        # crc32 rather than polars' hash: shard placement must survive polars upgrades
+        return pl.Series(SHARD_COL, [zlib.crc32(i.encode("utf-8")) % self.shards for i in ids.to_list()],
+                         dtype=pl.UInt32)
+
+    def merge(self, partial: pl.DataFrame, id_col: str, prefix: str, corr: str) -> pl.DataFrame:
+        """
+        Fold `partial` (this corr's aggregates, one row per id) into the store
+        and return the complete aggregates for the same ids, in the same order.
+        """
+        if partial.is_empty():
+            return partial
+
+        # Null columns (field missing from the corr) are stored as empty-typed lists
+        partial = partial.with_columns([
+            pl.col(c).cast(pl.List(pl.Utf8))
+            for c, t in partial.schema.items()
+            if c.endswith("_list") and t == pl.Null
+        ])
+        mine = partial.with_columns(
+            pl.lit(corr, dtype=pl.Utf8).alias(CORR_COL),
+            self._shard_of(partial[id_col]),
+        )
+
+        touched: List[pl.DataFrame] = []
+        for (shard,), rows in mine.partition_by(SHARD_COL, as_dict=True).items():
+            key = self._key(prefix, shard)
+            rows = rows.drop(SHARD_COL)
+            with _shard_lock(f"{self.bucket}/{key}"):
+                state = self._read(key)
+                if state is not None and not state.is_empty():
+                    seen = state.join(rows.select(id_col), on=id_col, how="semi")
+                    others = state.join(rows.select(id_col), on=id_col, how="anti")
+                    rows = pl.concat([seen, rows], how="diagonal_relaxed")
+                else:
+                    others = None
+                # fold to one row per id (older stores may hold one per corr)
+                folded = combine_partials(rows.drop(CORR_COL), id_col, prefix, distinct=True) \
+                    .with_columns(pl.lit(corr, dtype=pl.Utf8).alias(CORR_COL))
+                updated = pl.concat([others, folded], how="diagonal_relaxed") if others is not None else folded
+                self._write(key, updated)
+            touched.append(folded.drop(CORR_COL))
+
+        combined = pl.concat(touched, how="diagonal_relaxed")
+        out = partial.select(id_col).join(combined, on=id_col, how="left", maintain_order="left")
+        logging.info(f"[agg_state] {prefix}: folded {partial.height} ids into {len(touched)} shard(s)")
+        return out.select(partial.columns)
@@ -0,0 +1,323 @@
+# transformer/benchmark.py
+# Throughput harness for the transformer: no MinIO or RabbitMQ needed.
+#
+#   python benchmark.py --years 2023 2024 --crashes-per-year 20000
+#   python benchmark.py --store /tmp/bench-minio --keep     # filesystem-backed, reusable
+#   python benchmark.py --codecs                            # decode throughput per raw encoding
+#
+# 1. generates Socrata-shaped raw pages in the extractor's layout
+#    (crash/<alias>/year=YYYY/corr=<id>/...json.gz) plus the run manifest,
+# 2. serves them from FakeMinio (in memory, or a directory with --store),
+# 3. times load_dataset, merge_crash_vehicles_people, make_csv_safe and
+#    write_csv, reporting rows/s and peak RSS.
+# --codecs instead writes the same pages once per raw encoding (see ENCODINGS)
+# and times read_page_frame over each set.
+import os
+import gzip
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import resource
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+import zstandard
+
+# transformer.py reads its config at import time
+os.environ.setdefault("MINIO_SSL", "false")
+os.environ.setdefault("RAW_BUCKET", "raw-data")
+os.environ.setdefault("XFORM_BUCKET", "transform-data")
+
+import transformer as T
+from fake_minio import FakeMinio
+
+
+# ---------------------------------
+# Synthetic Socrata pages
+# ---------------------------------
+# Same fields backfill.json asks Socrata for
+SELECTS = {
+    "crashes": "crash_record_id,crash_date,crash_type,injuries_total,trafficway_type,weather_condition,"
+               "lighting_condition,lane_cnt,roadway_surface_cond,road_defect,beat_of_occurrence",
+    "vehicles": "crash_record_id,unit_no,make,model,vehicle_year,maneuver,vehicle_defect,vehicle_use",
+    "people": "crash_record_id,person_id,person_type,age,sex,injury_classification,safety_equipment,airbag_deployed",
+}
+
+_CHOICES = {
+    "crash_type": ["INJURY AND / OR TOW DUE TO CRASH", "NO INJURY / DRIVE AWAY"],
+    "trafficway_type": ["NOT DIVIDED", "DIVIDED - W/MEDIAN (NOT RAISED)", "ONE-WAY", "PARKING LOT", "FOUR WAY"],
+    "weather_condition": ["CLEAR", "RAIN", "SNOW", "CLOUDY/OVERCAST", "UNKNOWN"],
+    "lighting_condition": ["DAYLIGHT", "DARKNESS, LIGHTED ROAD", "DARKNESS", "DUSK", "DAWN", "UNKNOWN"],
+    "roadway_surface_cond": ["DRY", "WET", "SNOW OR SLUSH", "ICE", "UNKNOWN"],
+    "road_defect": ["NO DEFECTS", "UNKNOWN", "RUT, HOLES", "WORN SURFACE"],
+    "make": ["TOYOTA", "FORD", "CHEVROLET", "NISSAN", "HONDA", "UNKNOWN", "HYUNDAI", "JEEP"],
+    "model": ["CAMRY", "F150", "MALIBU", "ALTIMA", "CIVIC", "UNKNOWN", "ELANTRA", "CHEROKEE"],
+    "maneuver": ["STRAIGHT AHEAD", "TURNING LEFT", "BACKING", "PARKED", "SLOW/STOP IN TRAFFIC"],
+    "vehicle_defect": ["NONE", "UNKNOWN", "BRAKES", "TIRES"],
+    "vehicle_use": ["PERSONAL", "NOT IN USE", "TAXI/FOR HIRE", "POLICE", "COMMERCIAL - SINGLE UNIT"],
+    "person_type": ["DRIVER", "PASSENGER", "PEDESTRIAN", "BICYCLE"],
+    "sex": ["M", "F", "X"],
+    "injury_classification": ["NO INDICATION OF INJURY", "NONINCAPACITATING INJURY", "REPORTED, NOT EVIDENT",
+                              "INCAPACITATING INJURY", "FATAL"],
+    "safety_equipment": ["SAFETY BELT USED", "USAGE UNKNOWN", "NONE PRESENT", "HELMET NOT USED"],
+    "airbag_deployed": ["DID NOT DEPLOY", "DEPLOYMENT UNKNOWN", "DEPLOYED, FRONT", "NOT APPLICABLE"],
+}
+
+
+# Raw page encodings the extractor can write (RAW_ENCODING), at its levels:
+# Go's gzip default is level 6, klauspost's zstd default is level 3
+_ZSTD = zstandard.ZstdCompressor(level=3)
+
+def _json_array(rows: List[Dict[str, Any]]) -> bytes:
+    return json.dumps(rows).encode("utf-8")
+
+def _ndjson(rows: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(r) + "\n" for r in rows).encode("utf-8")
+
+ENCODINGS = {
+    "json.gz":    lambda rows: gzip.compress(_json_array(rows), compresslevel=6),
+    "json.zst":   lambda rows: _ZSTD.compress(_json_array(rows)),
+    "ndjson":     _ndjson,
+    "ndjson.gz":  lambda rows: gzip.compress(_ndjson(rows), compresslevel=6),
+    "ndjson.zst": lambda rows: _ZSTD.compress(_ndjson(rows)),
+}
+
+
+def _crash_row(rng: random.Random, year: int, n: int) -> Dict[str, Any]:
+    ts = datetime(year, 1, 1) + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+    row = {
+        "crash_record_id": hashlib.sha1(f"{year}-{n}".encode()).hexdigest() * 3,   # 120 hex chars, like Socrata's
+        "crash_date": ts.strftime("%Y-%m-%dT%H:%M:%S.000"),
+        "injuries_total": str(rng.choice([0, 0, 0, 1, 2])),
+        "lane_cnt": str(rng.randint(1, 4)),
+        "beat_of_occurrence": str(rng.randint(111, 2535)),
+    }
+    for c in ("crash_type", "trafficway_type", "weather_condition", "lighting_condition",
+              "roadway_surface_cond", "road_defect"):
+        row[c] = rng.choice(_CHOICES[c])
+    return row
+
+
+def _vehicle_rows(rng: random.Random, crash_id: str, n: int) -> List[Dict[str, Any]]:
+    out = []
+    for unit in range(1, n + 1):
+        row = {"crash_record_id": crash_id, "unit_no": str(unit), "vehicle_year": str(rng.randint(1995, 2024))}
+        for c in ("make", "model", "maneuver", "vehicle_defect", "vehicle_use"):
+            row[c] = rng.choice(_CHOICES[c])
+        out.append(row)
+    return out
+
+
+def _people_rows(rng: random.Random, crash_id: str, n: int) -> List[Dict[str, Any]]:
+    out = []
+    for p in range(n):
+        row = {"crash_record_id": crash_id, "person_id": f"O{rng.randrange(10**7)}"}
+        if rng.random() > 0.1:   # Socrata omits null fields
+            row["age"] = str(rng.randint(1, 95))
+        for c in ("person_type", "sex", "injury_classification", "safety_equipment", "airbag_deployed"):
+            row[c] = rng.choice(_CHOICES[c])
+        out.append(row)
+    return out
+
+
+def generate_corr(
+    cli: FakeMinio,
+    bucket: str = "raw-data",
+    prefix: str = "crash",
+    corr: str = "bench",
+    years: List[int] = (2024,),
+    crashes_per_year: int = 10000,
+    page_size: int = 2000,
+    id_batch_size: int = 50,
+    enrich_page_size: int = 1000,
+    max_vehicles: int = 3,
+    max_people: int = 4,
+    seed: int = 489,
+    encoding: str = "json.gz",
+) -> Dict[str, int]:
+    """
+    Write one corr's raw pages the way the extractor does: a crashes page per
+    `page_size` rows, and for every `id_batch_size` crash ids one vehicles and
+    one people object (split into _part=N past `enrich_page_size` rows).
+    Pages are stored in `encoding` (an ENCODINGS key, also the key suffix).
+    Returns the row count per alias.
+    """
+    encode = ENCODINGS[encoding]
+    ext = "." + encoding
+    rng = random.Random(seed)
+    objects: List[Dict[str, Any]] = []
+    totals = {"crashes": 0, "vehicles": 0, "people": 0}
+
+    def put(alias: str, key: str, year: int, rows: List[Dict[str, Any]]):
+        data = encode(rows)
+        cli.put_bytes(bucket, key, data)
+        objects.append({"alias": alias, "key": key, "year": year, "bytes": len(data),
+                        "rows": len(rows), "etag": hashlib.md5(data).hexdigest()})
+        totals[alias] += len(rows)
+
+    for year in years:
+        for offset in range(0, crashes_per_year, page_size):
+            crashes = [_crash_row(rng, year, offset + i) for i in range(min(page_size, crashes_per_year - offset))]
+            put("crashes", f"{prefix}/crashes/year={year:04d}/corr={corr}/offset={offset}_limit={page_size}{ext}",
+                year, crashes)
+
+            for batch, start in enumerate(range(0, len(crashes), id_batch_size)):
+                ids = [c["crash_record_id"] for c in crashes[start:start + id_batch_size]]
+                for alias, make in (("vehicles", lambda i: _vehicle_rows(rng, i, rng.randint(1, max_vehicles))),
+                                    ("people", lambda i: _people_rows(rng, i, rng.randint(1, max_people)))):
+                    rows = [r for i in ids for r in make(i)]
+                    for part, p0 in enumerate(range(0, len(rows), enrich_page_size)):
+                        key = f"{prefix}/{alias}/year={year:04d}/corr={corr}/crashes_offset={offset}_batch={batch}"
+                        if part > 0:
+                            key += f"_part={part}"
+                        put(alias, key + ext, year, rows[p0:p0 + enrich_page_size])
+
+    manifest = {
+        "corr": corr,
+        "complete": True,
+        "selects": SELECTS,
+        "objects": sorted(objects, key=lambda o: o["key"]),
+    }
+    cli.put_bytes(bucket, f"_runs/corr={corr}/manifest.json", json.dumps(manifest).encode("utf-8"))
+    return totals
+
+
+# ---------------------------------
+# Timed runs
+# ---------------------------------
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux; it's a high-water mark, so stages only ever raise it
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _timed(results: List[Dict[str, Any]], stage: str, rows_of, fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    secs = time.perf_counter() - start
+    rows = rows_of(out)
+    results.append({
+        "stage": stage,
+        "seconds": round(secs, 4),
+        "rows": rows,
+        "rows_per_s": round(rows / secs) if secs > 0 else None,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    })
+    return out
+
+
+def run_benchmark(cli: FakeMinio, corr: str, raw_bucket: str = "raw-data",
+                  out_bucket: str = "transform-data", workers: int = T.FETCH_WORKERS) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    manifest = T.read_manifest(cli, raw_bucket, corr)
+
+    frames = {}
+    for alias in T.DATASET_ALIASES:
+        frames[alias] = _timed(results, f"load_dataset[{alias}]", lambda df: df.height,
+                               T.load_dataset, cli, raw_bucket, T.PREFIX, alias, corr,
+                               manifest=manifest, workers=workers)
+
+    merged = _timed(results, "merge_crash_vehicles_people", lambda df: df.height,
+                    T.merge_crash_vehicles_people, frames["crashes"], frames["vehicles"], frames["people"],
+                    "crash_record_id")
+    safe = _timed(results, "make_csv_safe", lambda df: df.height, T.make_csv_safe, merged)
+
+    cli.make_bucket(out_bucket)
+    _timed(results, "write_csv", lambda _: safe.height,
+           T.write_csv, cli, out_bucket, f"{T.PREFIX}/corr={corr}/merged.csv", safe)
+    return results
+
+
+def run_codec_benchmark(years: List[int], crashes_per_year: int, page_size: int,
+                        seed: int = 489, repeats: int = 3) -> List[Dict[str, Any]]:
+    """
+    Decode throughput of read_page_frame per raw encoding, on identical pages.
+    Single-threaded and with the page cache off, so it measures decoding alone;
+    the best of `repeats` passes is reported.
+    """
+    T.PAGE_CACHE = None
+    results = []
+    for encoding in ENCODINGS:
+        cli = FakeMinio()
+        totals = generate_corr(cli, corr="codec", years=years, crashes_per_year=crashes_per_year,
+                               page_size=page_size, seed=seed, encoding=encoding)
+        manifest = T.read_manifest(cli, "raw-data", "codec")
+        objs = manifest["objects"]
+        stored = sum(o["bytes"] for o in objs)
+        decoded = sum(len(T.read_object_payload(cli, "raw-data", o["key"])) for o in objs)
+        rows = sum(totals.values())
+
+        best = None
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            for o in objs:
+                T.read_page_frame(cli, "raw-data", o["key"], T.select_columns(manifest, o["alias"]), o["alias"])
+            secs = time.perf_counter() - start
+            best = secs if best is None else min(best, secs)
+        results.append({
+            "encoding": encoding,
+            "stored_mb": round(stored / 2**20, 2),
+            "ratio": round(decoded / stored, 1),
+            "seconds": round(best, 4),
+            "decoded_mb_per_s": round(decoded / 2**20 / best, 1),
+            "rows_per_s": round(rows / best),
+        })
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the transformer on synthetic Socrata pages")
+    ap.add_argument("--years", type=int, nargs="+", default=[2024])
+    ap.add_argument("--crashes-per-year", type=int, default=10000)
+    ap.add_argument("--page-size", type=int, default=2000, help="crashes per raw page")
+    ap.add_argument("--id-batch-size", type=int, default=50, help="crash ids per enrichment object")
+    ap.add_argument("--enrich-page-size", type=int, default=1000, help="rows per enrichment part")
+    ap.add_argument("--corr", default="bench")
+    ap.add_argument("--seed", type=int, default=489)
+    ap.add_argument("--store", help="directory to keep objects in (default: in memory)")
+    ap.add_argument("--keep", action="store_true", help="reuse/keep --store between runs")
+    ap.add_argument("--fetch-workers", type=int, default=T.FETCH_WORKERS)
+    ap.add_argument("--encoding", choices=list(ENCODINGS), default="json.gz", help="raw page encoding")
+    ap.add_argument("--codecs", action="store_true", help="compare decode throughput across encodings")
+    ap.add_argument("--json", action="store_true", help="print results as JSON")
+    args = ap.parse_args()
+
+    if args.codecs:
+        results = run_codec_benchmark(args.years, args.crashes_per_year, args.page_size, seed=args.seed)
+        if args.json:
+            print(json.dumps(results, indent=2))
+            return
+        print(f"{'encoding':<14}{'stored MB':>11}{'ratio':>8}{'seconds':>10}{'decoded MB/s':>14}{'rows/s':>12}")
+        for r in results:
+            print(f"{r['encoding']:<14}{r['stored_mb']:>11.2f}{r['ratio']:>8.1f}{r['seconds']:>10.3f}"
+                  f"{r['decoded_mb_per_s']:>14.1f}{r['rows_per_s']:>12}")
+        return
+
+    if args.store and not args.keep:
+        shutil.rmtree(args.store, ignore_errors=True)
+    cli = FakeMinio(args.store)
+
+    manifest_key = f"_runs/corr={args.corr}/manifest.json"
+    if args.keep and args.store and cli.bucket_exists("raw-data") and manifest_key in cli.keys("raw-data"):
+        print(f"[benchmark] reusing corr={args.corr} in {args.store}")
+    else:
+        start = time.perf_counter()
+        totals = generate_corr(cli, corr=args.corr, years=args.years, crashes_per_year=args.crashes_per_year,
+                               page_size=args.page_size, id_batch_size=args.id_batch_size,
+                               enrich_page_size=args.enrich_page_size, seed=args.seed,
+                               encoding=args.encoding)
+        print(f"[benchmark] generated {totals} in {time.perf_counter() - start:.1f}s")
+
+    results = run_benchmark(cli, args.corr, workers=args.fetch_workers)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'stage':<34}{'seconds':>10}{'rows':>10}{'rows/s':>12}{'peak RSS MB':>14}")
+    for r in results:
+        print(f"{r['stage']:<34}{r['seconds']:>10.3f}{r['rows']:>10}{r['rows_per_s'] or 0:>12}{r['peak_rss_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# claims.py
+# Cross-replica claims on a single object, for work exactly one transformer
+# may do at a time (combining a sharded corr, compacting a silver partition).
+#
+# A claim is a small JSON object written with a conditional put
+# (If-None-Match: *), so of several replicas racing for it exactly one
+# succeeds. A claim whose holder died is taken over after a timeout, again
+# conditionally (If-Match on the stale claim's ETag), so only one taker wins.
+#
+# minio-py's put_object turns If-* headers into user metadata, so the
+# conditional put goes through a presigned PUT URL (public client API) sent
+# with urllib3. The server must honour conditional writes: docker-compose
+# pins a MinIO release that does, and test_claims_integration.py checks a
+# live server.
+import io
+import os
+import json
+import time
+import uuid
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import certifi
+import urllib3
+from minio import Minio
+from minio.error import S3Error
+
+# what S3 / MinIO answer when a conditional write loses
+CONFLICT_STATUS = {409, 412}   # ConditionalRequestConflict, PreconditionFailed
+
+_HTTP = urllib3.PoolManager(
+    timeout=urllib3.Timeout(connect=30, read=60),
+    cert_reqs="CERT_REQUIRED",
+    ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+)
+
+
+def put_json(cli: Minio, bucket: str, key: str, doc: Dict[str, Any]) -> None:
+    body = json.dumps(doc, indent=2).encode("utf-8")
+    cli.put_object(bucket, key, data=io.BytesIO(body), length=len(body), content_type="application/json")
+
+
+def put_json_if(cli: Minio, bucket: str, key: str, doc: Dict[str, Any], condition: Dict[str, str]) -> bool:
+    """Conditional put; False when the condition no longer holds (someone else wrote first)."""
+    body = json.dumps(doc, indent=2).encode("utf-8")
+    url = cli.presigned_put_object(bucket, key, expires=timedelta(minutes=5))
+    # one attempt: a retried PUT that had landed would come back as a lost condition
+    resp = _HTTP.request("PUT", url, body=body, retries=False,
+                         headers={"Content-Type": "application/json", **condition})
+    if resp.status in CONFLICT_STATUS:
+        return False
+    if resp.status >= 300:
+        raise RuntimeError(f"conditional put s3://{bucket}/{key}: HTTP {resp.status} {resp.data[:200]!r}")
+    return True
+
+
+def get_json_etag(cli: Minio, bucket: str, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """The JSON document at key and its ETag; (None, None) if absent."""
+    resp = None
+    try:
+        resp = cli.get_object(bucket, key)
+        return json.loads(resp.read().decode("utf-8")), resp.headers.get("ETag")
+    except S3Error as e:
+        if e.code in {"NoSuchKey", "NoSuchObject"}:
+            return None, None
+        raise
+    finally:
+        if resp is not None:
+            resp.close()
+            resp.release_conn()
+
+
+def claim(cli: Minio, bucket: str, key: str, stale_after: float) -> Optional[str]:
+    """
+    Claim key for this caller; returns the claim's owner id, or None when
+    someone else holds it. Only a {"state": "claimed"} document older than
+    stale_after seconds is taken over; anything else at key (e.g. a final
+    record written over the claim) keeps it held.
+    """
+    owner = uuid.uuid4().hex
+    doc = {"state": "claimed", "owner": owner, "claimed_at": time.time()}
+    if put_json_if(cli, bucket, key, doc, {"If-None-Match": "*"}):
+        return owner
+    held, etag = get_json_etag(cli, bucket, key)
+    if held is None or held.get("state") != "claimed" or not etag:
+        return None
+    if time.time() - float(held.get("claimed_at", 0)) < stale_after:
+        return None
+    logging.warning(f"[claims] taking over a stale claim on s3://{bucket}/{key}")
+    return owner if put_json_if(cli, bucket, key, doc, {"If-Match": etag}) else None
+
+
+def release(cli: Minio, bucket: str, key: str, owner: str) -> None:
+    """Drop a claim, unless a takeover has replaced it since."""
+    held, _ = get_json_etag(cli, bucket, key)
+    if held is not None and held.get("owner") == owner:
+        cli.remove_object(bucket, key)
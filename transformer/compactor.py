@@ -0,0 +1,308 @@
+# transformer/compactor.py
+# Raw-layer compaction: rewrites a corr's thousands of small .json.gz pages
+# as a few large parquet objects per dataset and year, plus an index that the
+# transformer prefers over the extractor manifest.
+#
+#   crash/<alias>/year=YYYY/corr=<id>/compacted-NNNN.parquet
+#   _runs/corr=<id>/compacted.json
+#
+#   python compactor.py <corr> [<corr> ...] [--delete-raw] [--force]
+#   python compactor.py --consume        # queue consumer on COMPACT_QUEUE
+#
+# Pages are decoded exactly as the transformer decodes them (the manifest's
+# select fields as raw strings) and each output has the declared dtypes
+# pinned, as the transformer would, so a corr transforms to the same output
+# compacted or not and reads back without a cast. The index is
+# written last: until it exists readers keep using the original pages.
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import functools
+import logging
+import itertools
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pika
+import polars as pl
+from minio import Minio
+from prometheus_client import start_http_server
+
+import transformer as T
+from metrics import (
+    TRANSFORMER_COMPACTIONS_TOTAL,
+    TRANSFORMER_COMPACTED_OBJECTS_TOTAL,
+    TRANSFORMER_UPTIME_SECONDS,
+    stage_timer,
+)
+
+COMPACT_QUEUE         = os.getenv("COMPACT_QUEUE", "compact")
+COMPACT_FORWARD_QUEUE = os.getenv("COMPACT_FORWARD_QUEUE", "")   # e.g. "transform"; empty = don't forward
+COMPACT_TARGET_BYTES  = int(os.getenv("COMPACT_TARGET_MB", "256")) * 1024 * 1024   # decoded (in-memory) bytes per output
+COMPACT_DELETE_RAW    = os.getenv("COMPACT_DELETE_RAW", "false").lower() == "true"
+
+
+def _decoded_chunks(
+    pool: ThreadPoolExecutor,
+    read: Callable[[Dict[str, Any]], pl.DataFrame],
+    objs: List[Dict[str, Any]],
+    target_bytes: int,
+    window: int,
+) -> Iterator[Tuple[List[Dict[str, Any]], List[pl.DataFrame]]]:
+    """
+    Decode one year's pages (in key order) and cut them into runs of about
+    target_bytes decoded bytes, yielding (pages, non-empty frames) per run.
+    Sizes are the decoded frames' (gzip ratios vary too much to go by the
+    raw bytes), and at most `window` pages are decoded ahead, so memory
+    stays near one output's worth.
+    """
+    todo = iter(objs)
+    pending = deque((o, pool.submit(read, o)) for o in itertools.islice(todo, max(1, window)))
+    chunk: List[Dict[str, Any]] = []
+    frames: List[pl.DataFrame] = []
+    size = 0
+    try:
+        while pending:
+            o, fut = pending.popleft()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(read, nxt)))
+            df = fut.result()
+            chunk.append(o)
+            if df.height > 0:
+                frames.append(df)
+                size += df.estimated_size()
+            if size >= target_bytes:
+                yield chunk, frames
+                chunk, frames, size = [], [], 0
+        if chunk:
+            yield chunk, frames
+    finally:
+        for _, fut in pending:
+            fut.cancel()
+
+
+def _put_parquet(cli: Minio, bucket: str, key: str, df: pl.DataFrame) -> Dict[str, Any]:
+    buf = io.BytesIO()
+    df.write_parquet(buf, compression="zstd", statistics=True)
+    size = buf.getbuffer().nbytes
+    buf.seek(0)
+    res = cli.put_object(bucket, key, data=buf, length=size,
+                         content_type="application/vnd.apache.parquet")
+    return {"bytes": size, "etag": getattr(res, "etag", None)}
+
+
+def compact_corr(
+    cli: Minio,
+    bucket: str,
+    corr: str,
+    prefix: str = T.PREFIX,
+    target_bytes: int = COMPACT_TARGET_BYTES,
+    delete_raw: bool = COMPACT_DELETE_RAW,
+    force: bool = False,
+    workers: int = T.FETCH_WORKERS,
+) -> Dict[str, Any]:
+    """Compact one corr's raw pages; returns the index that was written (or already existed)."""
+    if not force:
+        existing = T.read_compacted_index(cli, bucket, corr)
+        if existing is not None:
+            logging.info(f"[compactor] corr={corr} already compacted; skipping")
+            TRANSFORMER_COMPACTIONS_TOTAL.labels(status="skipped").inc()
+            return existing
+
+    manifest = T.read_manifest(cli, bucket, corr, prefer_compacted=False)
+    T.check_manifest(manifest, corr)
+    # {} rather than None: list the raw prefixes instead of an older index
+    source_manifest = manifest if manifest is not None else {}
+
+    entries: List[Dict[str, Any]] = []
+    sources: List[str] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="compact") as pool:
+        for alias in T.DATASET_ALIASES:
+            columns = T.select_columns(manifest, alias)
+            objs = [
+                o for o in T._objects_for_corr(cli, bucket, prefix, alias, corr, source_manifest)
+                if not o["key"].endswith(".parquet")
+            ]
+            by_year: Dict[str, List[Dict[str, Any]]] = {}
+            for o in objs:
+                by_year.setdefault(T._partition_year(o["key"]), []).append(o)
+
+            # no etag: compaction reads each page once, keep it out of the page cache
+            read = lambda o: T.read_page_frame(cli, bucket, o["key"], columns, alias)
+            for year in sorted(by_year):
+                runs = _decoded_chunks(pool, read, by_year[year], target_bytes, window=2 * max(1, workers))
+                for n, (chunk, frames) in enumerate(runs):
+                    # no rechunk: write_parquet takes the pages' chunks as they are, no second copy
+                    df = pl.concat(frames, how="diagonal_relaxed", rechunk=False) if frames else pl.DataFrame()
+                    sources.extend(o["key"] for o in chunk)
+                    TRANSFORMER_COMPACTED_OBJECTS_TOTAL.labels(dataset=alias, kind="source").inc(len(chunk))
+                    if df.is_empty():
+                        continue
+                    with stage_timer("schema", alias):
+                        df = T.pin_schema(df, alias)
+                    part = f"year={year}/" if year else ""
+                    key = f"{prefix}/{alias}/{part}corr={corr}/compacted-{n:04d}.parquet"
+                    with stage_timer("compact_write", alias):
+                        put = _put_parquet(cli, bucket, key, df)
+                    TRANSFORMER_COMPACTED_OBJECTS_TOTAL.labels(dataset=alias, kind="compacted").inc()
+                    entries.append({"alias": alias, "key": key, "year": year, "rows": df.height,
+                                    "sources": len(chunk), **put})
+            logging.info(f"[compactor] corr={corr} {alias}: {len(objs)} pages -> "
+                         f"{sum(1 for e in entries if e['alias'] == alias)} objects")
+
+    # the index lists every page it compacted, skipped ones included
+    index = {k: v for k, v in (manifest or {}).items() if k not in ("objects", "skipped_pages")}
+    index.update({
+        "corr": corr,
+        "complete": (manifest or {}).get("complete", True),
+        "compacted_at": datetime.now(timezone.utc).isoformat(),
+        "source_objects": len(sources),
+        "objects": entries,
+    })
+    body = json.dumps(index, indent=2).encode("utf-8")
+    cli.put_object(bucket, f"_runs/corr={corr}/{T.COMPACTED_INDEX}", data=io.BytesIO(body),
+                   length=len(body), content_type="application/json")
+
+    if delete_raw:
+        # safe only now: the index points readers at the compacted objects
+        for key in sources:
+            cli.remove_object(bucket, key)
+        logging.info(f"[compactor] corr={corr}: removed {len(sources)} raw pages")
+
+    TRANSFORMER_COMPACTIONS_TOTAL.labels(status="success").inc()
+    logging.info(f"[compactor] corr={corr}: {len(sources)} pages -> {len(entries)} objects")
+    return index
+
+
+# ---------------------------------
+# RabbitMQ consumer
+# ---------------------------------
+def handle_compact_message(msg: dict, forward: Optional[T.JobPublisher] = None) -> None:
+    """Compact the message's corr, then hand the (transform) message on to COMPACT_FORWARD_QUEUE."""
+    mtype = msg.get("type", "")
+    if mtype not in ("compact", "transform"):
+        logging.info(f"[compactor] ignoring message type={mtype!r}")
+        return
+    corr = msg.get("corr_id")
+    if not corr:
+        raise ValueError("compact message without corr_id")
+    bucket = msg.get("raw_bucket") or T.RAW_BUCKET
+    compact_corr(T.minio_client(), bucket, corr, force=bool(msg.get("force", False)))
+    if forward is not None:
+        forward.publish({**msg, "type": "transform"})
+        logging.info(f"[compactor] forwarded corr={corr} -> queue={COMPACT_FORWARD_QUEUE}")
+
+
+def start_consumer():
+    from pika.exceptions import AMQPConnectionError, ProbableAccessDeniedError, ProbableAuthenticationError
+
+    params = pika.URLParameters(T.RABBIT_URL)
+    if not T.wait_for_port(params.host or "rabbitmq", params.port or 5672, tries=60, delay=1.0):
+        raise SystemExit("[compactor] RabbitMQ not reachable after waiting.")
+
+    conn = None
+    for i in range(1, 61):
+        try:
+            conn = pika.BlockingConnection(params)
+            break
+        except (AMQPConnectionError, ProbableAccessDeniedError, ProbableAuthenticationError):
+            time.sleep(1.5 + random.random())
+    if conn is None or not conn.is_open:
+        raise SystemExit("[compactor] Could not connect to RabbitMQ after multiple attempts.")
+
+    ch = conn.channel()
+    ch.queue_declare(queue=COMPACT_QUEUE, durable=True)
+    ch.basic_qos(prefetch_count=1)
+    forward = T.JobPublisher(T.RABBIT_URL, COMPACT_FORWARD_QUEUE) if COMPACT_FORWARD_QUEUE else None
+
+    # One compaction at a time on a worker thread; this (I/O) thread keeps the heartbeats going
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compact-job")
+
+    def settle(delivery_tag, ok: bool):
+        if not ch.is_open:
+            return
+        if ok:
+            ch.basic_ack(delivery_tag=delivery_tag)
+        else:
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=False)
+
+    def work(delivery_tag, body):
+        ok = True
+        try:
+            handle_compact_message(json.loads(body.decode("utf-8")), forward)
+        except Exception:
+            traceback.print_exc()
+            TRANSFORMER_COMPACTIONS_TOTAL.labels(status="failed").inc()
+            ok = False
+        conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, ok))
+
+    def on_msg(chx, method, props, body):
+        pool.submit(work, method.delivery_tag, body)
+
+    logging.info(f"[compactor] Up. Waiting for jobs on queue '{COMPACT_QUEUE}' "
+                 f"(forward={COMPACT_FORWARD_QUEUE or '-'})")
+    ch.basic_consume(queue=COMPACT_QUEUE, on_message_callback=on_msg)
+    try:
+        ch.start_consuming()
+    except KeyboardInterrupt:
+        try: ch.stop_consuming()
+        except Exception: pass
+        pool.shutdown(wait=True)
+        try: conn.process_data_events(time_limit=0)
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compact a corr's raw pages into large parquet objects")
+    ap.add_argument("corrs", nargs="*", help="corr ids to compact")
+    ap.add_argument("--consume", action="store_true", help=f"consume jobs from queue '{COMPACT_QUEUE}'")
+    ap.add_argument("--bucket", default=T.RAW_BUCKET)
+    ap.add_argument("--target-mb", type=int, default=COMPACT_TARGET_BYTES >> 20,
+                    help="decoded (in-memory) MiB per compacted object")
+    ap.add_argument("--delete-raw", action="store_true", default=COMPACT_DELETE_RAW,
+                    help="remove the original pages once the index is written")
+    ap.add_argument("--force", action="store_true", help="recompact corrs that already have an index")
+    args = ap.parse_args()
+
+    if args.consume:
+        metrics_port = int(os.getenv("METRICS_PORT", "8000"))
+        start_http_server(metrics_port)
+
+        def update_uptime():
+            start_time = time.time()
+            while True:
+                TRANSFORMER_UPTIME_SECONDS.set(time.time() - start_time)
+                time.sleep(5)
+
+        threading.Thread(target=update_uptime, daemon=True).start()
+        start_consumer()
+        return
+
+    if not args.corrs:
+        ap.error("give one or more corr ids, or --consume")
+    cli = T.minio_client()
+    failed = 0
+    for corr in args.corrs:
+        try:
+            compact_corr(cli, args.bucket, corr, target_bytes=args.target_mb * 1024 * 1024,
+                         delete_raw=args.delete_raw, force=args.force)
+        except Exception:
+            traceback.print_exc()
+            TRANSFORMER_COMPACTIONS_TOTAL.labels(status="failed").inc()
+            failed += 1
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
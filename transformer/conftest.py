@@ -0,0 +1,19 @@
+# transformer/conftest.py
+# Shared fixtures for the transformer tests (python -m pytest -q).
+import os
+
+import pytest
+
+import claims
+from fake_minio import FakeHTTP, FakeMinio
+
+# transformer.py reads these at import time (docker-compose passes them from .env)
+os.environ.setdefault("MINIO_SSL", "false")
+os.environ.setdefault("RAW_BUCKET", "raw-data")
+
+
+@pytest.fixture
+def minio(monkeypatch):
+    cli = FakeMinio()
+    monkeypatch.setattr(claims, "_HTTP", FakeHTTP(cli))
+    return cli
@@ -0,0 +1,169 @@
+# transformer/fake_minio.py
+# In-memory (or directory-backed) stand-in for the MinIO client, shared by
+# the tests (conftest.py) and benchmark.py: no MinIO server needed.
+import io
+import os
+import hashlib
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from minio.error import S3Error
+
+
+class _Object:
+    def __init__(self, name: str, size: int, etag: str):
+        self.object_name = name
+        self.size = size
+        self.etag = etag
+        self.is_dir = False
+        self.metadata = {}
+
+
+class _Response(io.BytesIO):
+    """Enough of urllib3's HTTPResponse for the transformer's readers."""
+
+    def __init__(self, data: bytes, etag: str):
+        super().__init__(data)
+        self.headers = {"ETag": f'"{etag}"', "Content-Length": str(len(data))}
+
+    def stream(self, amt: int = 65536) -> Iterator[bytes]:
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    """
+    The subset of minio.Minio the transformer uses. Objects live in
+    `objects` ((bucket, key) -> bytes), or with `root` in a directory tree
+    (one file per object key). Conditional puts (see FakeHTTP) honour
+    If-None-Match / If-Match.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self._buckets: Set[str] = set()
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    @staticmethod
+    def _missing(bucket: str, key: str) -> S3Error:
+        return S3Error(code="NoSuchKey", message="The specified key does not exist.",
+                       resource=f"/{bucket}/{key}", request_id="", host_id="", response=None,
+                       bucket_name=bucket, object_name=key)
+
+    def _exists(self, bucket: str, key: str) -> bool:
+        if self.root is None:
+            return (bucket, key) in self.objects
+        return os.path.isfile(self._path(bucket, key))
+
+    def _get(self, bucket: str, key: str) -> bytes:
+        if self.root is None:
+            try:
+                return self.objects[(bucket, key)]
+            except KeyError:
+                raise self._missing(bucket, key)
+        try:
+            with open(self._path(bucket, key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise self._missing(bucket, key)
+
+    def _etag(self, bucket: str, key: str) -> str:
+        return hashlib.md5(self._get(bucket, key)).hexdigest()
+
+    def keys(self, bucket: str) -> List[str]:
+        if self.root is None:
+            return sorted(k for b, k in self.objects if b == bucket)
+        base = os.path.join(self.root, bucket)
+        out = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                out.append(os.path.relpath(os.path.join(dirpath, name), base).replace(os.sep, "/"))
+        return sorted(out)
+
+    def bucket_exists(self, bucket: str) -> bool:
+        if self.root is None:
+            return bucket in self._buckets or any(b == bucket for b, _ in self.objects)
+        return os.path.isdir(os.path.join(self.root, bucket))
+
+    def make_bucket(self, bucket: str) -> None:
+        if self.root is None:
+            self._buckets.add(bucket)
+        else:
+            os.makedirs(os.path.join(self.root, bucket), exist_ok=True)
+
+    def put_bytes(self, bucket: str, key: str, data: bytes) -> None:
+        if self.root is None:
+            self.objects[(bucket, key)] = bytes(data)
+            return
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def put_object(self, bucket, key, data, length, content_type=None, part_size=0, **kwargs):
+        self.put_bytes(bucket, key, data.read() if length < 0 else data.read(length))
+
+    def fput_object(self, bucket, key, file_path, content_type=None, part_size=0, **kwargs):
+        with open(file_path, "rb") as f:
+            self.put_bytes(bucket, key, f.read())
+
+    def get_object(self, bucket, key, **kwargs) -> _Response:
+        data = self._get(bucket, key)
+        return _Response(data, hashlib.md5(data).hexdigest())
+
+    def fget_object(self, bucket, key, file_path, **kwargs) -> None:
+        data = self._get(bucket, key)
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+    def stat_object(self, bucket, key, **kwargs) -> _Object:
+        data = self._get(bucket, key)
+        return _Object(key, len(data), hashlib.md5(data).hexdigest())
+
+    def list_objects(self, bucket, prefix="", recursive=False, **kwargs):
+        for key in self.keys(bucket):
+            if key.startswith(prefix):
+                yield self.stat_object(bucket, key)
+
+    def remove_object(self, bucket, key, **kwargs) -> None:
+        if self.root is None:
+            self.objects.pop((bucket, key), None)
+            return
+        try:
+            os.remove(self._path(bucket, key))
+        except FileNotFoundError:
+            pass
+
+    def presigned_put_object(self, bucket, key, expires=None):
+        return f"http://fake/{bucket}/{key}?X-Amz-Signature=x"
+
+    def conditional_put(self, bucket, key, data, headers) -> int:
+        """What the server does with a PUT carrying If-None-Match / If-Match; returns the HTTP status."""
+        exists = self._exists(bucket, key)
+        if headers.get("If-None-Match") == "*" and exists:
+            return 412
+        if "If-Match" in headers and (not exists or headers["If-Match"].strip('"') != self._etag(bucket, key)):
+            return 412
+        self.put_bytes(bucket, key, data)
+        return 200
+
+
+class FakeHTTP:
+    """Stands in for claims' urllib3 pool: presigned PUTs land in the FakeMinio."""
+
+    def __init__(self, minio: FakeMinio):
+        self.minio = minio
+
+    def request(self, method, url, body=None, headers=None, **kw):
+        bucket, key = urlsplit(url).path.lstrip("/").split("/", 1)
+        status = self.minio.conditional_put(bucket, key, body, headers or {})
+        return type("Resp", (), {"status": status, "data": b""})()
@@ -1,5 +1,8 @@
 # metrics.py 
 # The transformer version
+import time
+from contextlib import contextmanager
+
 from prometheus_client import Counter, Gauge, Histogram
 
 TRANSFORMER_MESSAGES_TOTAL = Counter(
@@ -29,4 +32,132 @@ TRANSFORM_JOBS_TOTAL = Counter(
 "transform_jobs_total",
 "Total number of transform jobs processed",
 ["status"] # "success" or "failure"
-)
\ No newline at end of file
+)
+
+# Connection reuse (shared MinIO pool + long-lived AMQP publishers)
+TRANSFORMER_MINIO_POOL_CONNECTIONS = Gauge(
+    "transformer_minio_pool_connections",
+    "HTTP connections opened by the shared MinIO client pool",
+)
+
+TRANSFORMER_MINIO_POOL_REQUESTS = Gauge(
+    "transformer_minio_pool_requests",
+    "HTTP requests sent through the shared MinIO client pool",
+)
+
+TRANSFORMER_AMQP_CONNECTIONS_OPENED_TOTAL = Counter(
+    "transformer_amqp_connections_opened_total",
+    "AMQP connections opened by the job publishers, per target queue",
+    ["queue"]  # clean, transform (shard fan-out, compactor forward)
+)
+
+TRANSFORMER_CONNECTION_REUSE_TOTAL = Counter(
+    "transformer_connection_reuse_total",
+    "Operations served by an already-open connection",
+    ["client", "queue"]  # amqp, <target queue>
+)
+
+TRANSFORMER_PUBLISH_TOTAL = Counter(
+    "transformer_publish_total",
+    "Job messages published, per target queue and broker outcome",
+    ["queue", "result"]  # result: confirmed, nacked, failed
+)
+
+
+# Per-stage timing + I/O volume (same shape as the cleaner's)
+TRANSFORMER_STAGE_DURATION_SECONDS = Histogram(
+    "transformer_stage_duration_seconds",
+    "Time spent in each transform stage",
+    ["stage", "dataset"],  # stage: list, download, decode, concat, join, serialize, upload, ...
+    buckets=[0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, float("inf")]
+)
+
+TRANSFORMER_BYTES_READ_TOTAL = Counter(
+    "transformer_bytes_read_total",
+    "Bytes downloaded from MinIO (as stored, before decompression)",
+    ["dataset"]
+)
+
+TRANSFORMER_BYTES_WRITTEN_TOTAL = Counter(
+    "transformer_bytes_written_total",
+    "Bytes uploaded to MinIO",
+    ["dataset"]
+)
+
+TRANSFORMER_OBJECTS_FETCHED_TOTAL = Counter(
+    "transformer_objects_fetched_total",
+    "Objects downloaded from MinIO",
+    ["dataset"]
+)
+
+TRANSFORMER_SCHEMA_MISMATCHES_TOTAL = Counter(
+    "transformer_schema_mismatches_total",
+    "Raw values that didn't parse as their column's pinned dtype (loaded as null)",
+    ["dataset", "column"]
+)
+
+TRANSFORMER_BATCH_SIZE = Histogram(
+    "transformer_batch_size",
+    "Corrs transformed together in one coalesced run",
+    buckets=[1, 2, 4, 8, 16, 32, 64, float("inf")]
+)
+
+TRANSFORMER_PAGE_CACHE_REQUESTS_TOTAL = Counter(
+    "transformer_page_cache_requests_total",
+    "Decoded-page cache lookups",
+    ["result"]  # hit, miss
+)
+
+TRANSFORMER_PAGE_CACHE_BYTES_TOTAL = Counter(
+    "transformer_page_cache_bytes_total",
+    "Bytes moved through the decoded-page cache",
+    ["op"]  # read, write, evicted
+)
+
+TRANSFORMER_PAGE_CACHE_SIZE_BYTES = Gauge(
+    "transformer_page_cache_size_bytes",
+    "Current on-disk size of the decoded-page cache"
+)
+
+TRANSFORMER_COMPACTIONS_TOTAL = Counter(
+    "transformer_compactions_total",
+    "Raw-layer corr compactions",
+    ["status"]  # success, failed, skipped
+)
+
+TRANSFORMER_COMPACTED_OBJECTS_TOTAL = Counter(
+    "transformer_compacted_objects_total",
+    "Raw objects read (source) and written (compacted) by the compactor",
+    ["dataset", "kind"]
+)
+
+
+TRANSFORMER_PAGE_PARTIALS_TOTAL = Counter(
+    "transformer_page_partials_total",
+    "Per-page partials built from extractor events and consumed at final assembly",
+    ["result"]  # built, failed, used, rejected, inline
+)
+
+TRANSFORMER_SHARDS_TOTAL = Counter(
+    "transformer_shards_total",
+    "Year shards of large corrs: planned by the coordinator, transformed, combined",
+    ["result"]  # planned, done, redelivered, finalized, failed
+)
+
+TRANSFORMER_SILVER_WRITES_TOTAL = Counter(
+    "transformer_silver_writes_total",
+    "Silver-layer appends after a corr's hand-off (best effort)",
+    ["result"]  # ok, failed
+)
+
+
+@contextmanager
+def stage_timer(stage: str, dataset: str = "all"):
+    """Observe the wall time of a block into transformer_stage_duration_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        TRANSFORMER_STAGE_DURATION_SECONDS.labels(stage=stage, dataset=dataset).observe(
+            time.perf_counter() - start
+        )
@@ -0,0 +1,137 @@
+# page_cache.py
+# On-disk LRU cache of decoded raw pages.
+#
+# Entries are keyed by sha256(bucket / key / ETag / columns): a page only
+# changes when its object is rewritten (new ETag), so a hit never needs a
+# round trip to MinIO. Pages are stored as zstd Arrow IPC files, i.e. the
+# decoded columns rather than the gzipped JSON, so a retry or a replay skips
+# both the download and the JSON decode. File mtimes track recency; once the
+# directory passes its size cap the least recently used files are removed.
+import io
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import List, Optional
+
+import polars as pl
+
+from metrics import (
+    TRANSFORMER_PAGE_CACHE_REQUESTS_TOTAL,
+    TRANSFORMER_PAGE_CACHE_BYTES_TOTAL,
+    TRANSFORMER_PAGE_CACHE_SIZE_BYTES,
+)
+
+_SUFFIX = ".arrow"
+
+
+class PageCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+        TRANSFORMER_PAGE_CACHE_SIZE_BYTES.set(self._size)
+        logging.info(f"[page_cache] {root}: {self._size >> 20} MiB cached, cap {max_bytes >> 20} MiB")
+
+    @staticmethod
+    def cache_key(bucket: str, key: str, etag: str, columns: Optional[List[str]] = None) -> str:
+        cols = ",".join(columns) if columns else "*"
+        return hashlib.sha256(f"{bucket}/{key}/{etag}/{cols}".encode("utf-8")).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        # two-level fan-out keeps directories small
+        return os.path.join(self.root, digest[:2], digest + _SUFFIX)
+
+    def _entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def get(self, digest: str) -> Optional[pl.DataFrame]:
+        path = self._path(digest)
+        try:
+            # read into memory rather than mmap: eviction may unlink the file
+            with open(path, "rb") as f:
+                data = f.read()
+            size = len(data)
+            df = pl.read_ipc(io.BytesIO(data))
+            os.utime(path)  # mark as recently used
+        except OSError:
+            TRANSFORMER_PAGE_CACHE_REQUESTS_TOTAL.labels(result="miss").inc()
+            return None
+        except Exception as e:
+            # unreadable entry (torn write from a killed container): drop it
+            logging.warning(f"[page_cache] dropping unreadable entry {path}: {e}")
+            self._remove(path)
+            TRANSFORMER_PAGE_CACHE_REQUESTS_TOTAL.labels(result="miss").inc()
+            return None
+        TRANSFORMER_PAGE_CACHE_REQUESTS_TOTAL.labels(result="hit").inc()
+        TRANSFORMER_PAGE_CACHE_BYTES_TOTAL.labels(op="read").inc(size)
+        return df
+
+    def put(self, digest: str, df: pl.DataFrame) -> None:
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                df.write_ipc(f, compression="zstd")
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)  # readers never see a half-written entry
+        except Exception as e:
+            logging.warning(f"[page_cache] could not cache {digest}: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        TRANSFORMER_PAGE_CACHE_BYTES_TOTAL.labels(op="write").inc(size)
+        with self._lock:
+            self._size += size
+            TRANSFORMER_PAGE_CACHE_SIZE_BYTES.set(self._size)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return 0
+        with self._lock:
+            self._size -= size
+            TRANSFORMER_PAGE_CACHE_SIZE_BYTES.set(self._size)
+        return size
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache is at 90% of its cap."""
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            # resync with the disk: other replicas may share the directory
+            self._size = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            freed = 0
+            for path, size, _ in entries:
+                if self._size - freed <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                freed += size
+            self._size -= freed
+            TRANSFORMER_PAGE_CACHE_SIZE_BYTES.set(self._size)
+        if freed:
+            TRANSFORMER_PAGE_CACHE_BYTES_TOTAL.labels(op="evicted").inc(freed)
+            logging.info(f"[page_cache] evicted {freed >> 10} KiB")
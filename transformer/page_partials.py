@@ -0,0 +1,104 @@
+# page_partials.py
+# Per-page partial results for pipelined transforms.
+#
+# With PAGE_EVENTS_QUEUE set, the extractor announces each crash page (with
+# the vehicles / people objects fetched for its crashes) as soon as it is
+# saved, and the transformer pre-builds that page's share of the merge:
+#
+#   <root>/corr=<id>/page=<n>/crashes.parquet   crash rows, tagged with their load order
+#   <root>/corr=<id>/page=<n>/veh.parquet       per-crash vehicle aggregates (before agg state)
+#   <root>/corr=<id>/page=<n>/ppl.parquet       per-crash people aggregates (before agg state)
+#   <root>/corr=<id>/page=<n>/sources.json      raw keys the page covers; written last
+#
+# Aggregates combine across pages like agg_state partials (counts add up,
+# lists union), so the final transform only has to stitch these together.
+import io
+import json
+import logging
+from typing import Dict, List
+
+import polars as pl
+from minio import Minio
+from minio.error import S3Error
+
+PARTS = ("crashes", "veh", "ppl")
+_SOURCES = "sources.json"
+
+
+class PartialStore:
+    """Reads and writes the per-page partials of a corr under <bucket>/<root>/."""
+
+    def __init__(self, cli: Minio, bucket: str, root: str = "_partials"):
+        self.cli = cli
+        self.bucket = bucket
+        self.root = root.strip("/")
+
+    def _prefix(self, corr: str, page: str) -> str:
+        return f"{self.root}/corr={corr}/page={page}/"
+
+    def put(self, corr: str, page: str, frames: Dict[str, pl.DataFrame], sources: List[str]) -> None:
+        """Store one page's partials; the page only becomes visible once sources.json is written."""
+        prefix = self._prefix(corr, page)
+        for name in PARTS:
+            buf = io.BytesIO()
+            frames.get(name, pl.DataFrame()).write_parquet(buf, compression="zstd")
+            buf.seek(0)
+            self.cli.put_object(
+                self.bucket, f"{prefix}{name}.parquet", data=buf, length=buf.getbuffer().nbytes,
+                content_type="application/vnd.apache.parquet",
+            )
+        body = json.dumps({"sources": sorted(sources)}).encode("utf-8")
+        self.cli.put_object(self.bucket, f"{prefix}{_SOURCES}", data=io.BytesIO(body),
+                            length=len(body), content_type="application/json")
+
+    def has_pages(self, corr: str) -> bool:
+        base = f"{self.root}/corr={corr}/"
+        return any(o.object_name.endswith(f"/{_SOURCES}")
+                   for o in self.cli.list_objects(self.bucket, prefix=base, recursive=True))
+
+    def pages(self, corr: str) -> Dict[str, List[str]]:
+        """page -> raw keys it covers, for every completed page of the corr."""
+        out: Dict[str, List[str]] = {}
+        base = f"{self.root}/corr={corr}/"
+        for obj in self.cli.list_objects(self.bucket, prefix=base, recursive=True):
+            name = obj.object_name
+            if not name.endswith(f"/{_SOURCES}"):
+                continue
+            page = name[len(base):].split("/", 1)[0][len("page="):]
+            resp = self.cli.get_object(self.bucket, name)
+            try:
+                out[page] = json.loads(resp.read().decode("utf-8")).get("sources", [])
+            except json.JSONDecodeError:
+                logging.warning(f"[partials] unreadable s3://{self.bucket}/{name}; ignoring page")
+            finally:
+                resp.close()
+                resp.release_conn()
+        return out
+
+    def remove(self, corr: str) -> None:
+        """Drop every page of the corr once its merged output has been handed off."""
+        base = f"{self.root}/corr={corr}/"
+        removed = 0
+        for obj in self.cli.list_objects(self.bucket, prefix=base, recursive=True):
+            self.cli.remove_object(self.bucket, obj.object_name)
+            removed += 1
+        if removed:
+            logging.info(f"[partials] corr={corr}: removed {removed} partial objects")
+
+    def get(self, corr: str, page: str) -> Dict[str, pl.DataFrame]:
+        prefix = self._prefix(corr, page)
+        out = {}
+        for name in PARTS:
+            resp = None
+            try:
+                resp = self.cli.get_object(self.bucket, f"{prefix}{name}.parquet")
+                out[name] = pl.read_parquet(io.BytesIO(resp.read()))
+            except S3Error as e:
+                if e.code not in {"NoSuchKey", "NoSuchObject"}:
+                    raise
+                out[name] = pl.DataFrame()
+            finally:
+                if resp is not None:
+                    resp.close()
+                    resp.release_conn()
+        return out
@@ -0,0 +1,104 @@
+# shards.py
+# Bookkeeping for year-sharded transforms.
+#
+# With TRANSFORM_SHARD_YEARS=true a large multi-year corr is split by its
+# year= partitions into transform_shard messages, so several replicas work
+# on it at once. Everything a shard leaves behind lives in the job's xform
+# bucket:
+#
+#   <root>/corr=<id>/plan=<pid>/plan.json          years + job params; written by the coordinator
+#   <root>/corr=<id>/plan=<pid>/year=YYYY.parquet  the shard's merged rows (output-ready)
+#   <root>/corr=<id>/plan=<pid>/year=YYYY.json     done marker (rows, cols); written after the parquet
+#   <root>/corr=<id>/plan=<pid>/final.json         combine claim; then the combined output + clean job went out
+#
+# Whichever shard finds every year done claims final.json (claims.py: a
+# conditional put, taken over after a timeout if its holder died) and
+# combines the parts in year order; the others see the claim and stop.
+import io
+import logging
+from typing import Any, Dict, Optional
+
+import polars as pl
+from minio import Minio
+
+import claims
+
+_PLAN  = "plan.json"
+_FINAL = "final.json"
+
+
+class ShardStore:
+    """Reads and writes the shard plan, parts and markers of a corr under <bucket>/<root>/."""
+
+    def __init__(self, cli: Minio, bucket: str, root: str = "_shards"):
+        self.cli = cli
+        self.bucket = bucket
+        self.root = root.strip("/")
+
+    def _prefix(self, corr: str, plan_id: str) -> str:
+        return f"{self.root}/corr={corr}/plan={plan_id}/"
+
+    def part_key(self, corr: str, plan_id: str, year: str) -> str:
+        return f"{self._prefix(corr, plan_id)}year={year}.parquet"
+
+    def _put_json(self, key: str, doc: Dict[str, Any]) -> None:
+        claims.put_json(self.cli, self.bucket, key, doc)
+
+    def _get_json(self, key: str) -> Optional[Dict[str, Any]]:
+        return claims.get_json_etag(self.cli, self.bucket, key)[0]
+
+    def put_plan(self, corr: str, plan_id: str, plan: Dict[str, Any]) -> None:
+        self._put_json(f"{self._prefix(corr, plan_id)}{_PLAN}", plan)
+
+    def get_plan(self, corr: str, plan_id: str) -> Optional[Dict[str, Any]]:
+        return self._get_json(f"{self._prefix(corr, plan_id)}{_PLAN}")
+
+    def put_part(self, corr: str, plan_id: str, year: str, df: pl.DataFrame) -> Dict[str, Any]:
+        """Store a shard's rows, then its done marker; returns the marker."""
+        key = None
+        if not df.is_empty():
+            key = self.part_key(corr, plan_id, year)
+            buf = io.BytesIO()
+            df.write_parquet(buf, compression="zstd")
+            buf.seek(0)
+            self.cli.put_object(self.bucket, key, data=buf, length=buf.getbuffer().nbytes,
+                                content_type="application/vnd.apache.parquet")
+        done = {"year": year, "key": key, "rows": df.height, "cols": df.width}
+        self._put_json(f"{self._prefix(corr, plan_id)}year={year}.json", done)
+        return done
+
+    def done(self, corr: str, plan_id: str) -> Dict[str, Dict[str, Any]]:
+        """year -> done marker, for every finished shard of the plan."""
+        out: Dict[str, Dict[str, Any]] = {}
+        base = self._prefix(corr, plan_id)
+        for obj in self.cli.list_objects(self.bucket, prefix=base, recursive=True):
+            name = obj.object_name[len(base):]
+            if not (name.startswith("year=") and name.endswith(".json")):
+                continue
+            doc = self._get_json(obj.object_name)
+            if doc is not None:
+                out[doc.get("year", name[len("year="):-len(".json")])] = doc
+        return out
+
+    def fget_part(self, corr: str, plan_id: str, year: str, path: str) -> None:
+        self.cli.fget_object(self.bucket, self.part_key(corr, plan_id, year), path)
+
+    def claim_final(self, corr: str, plan_id: str, stale_after: float) -> bool:
+        """
+        Atomically claim the combine step; True for exactly one caller. A
+        claim older than stale_after seconds that never turned final (its
+        holder died) can be taken over.
+        """
+        key = f"{self._prefix(corr, plan_id)}{_FINAL}"
+        return claims.claim(self.cli, self.bucket, key, stale_after) is not None
+
+    def put_final(self, corr: str, plan_id: str, final: Dict[str, Any]) -> None:
+        self._put_json(f"{self._prefix(corr, plan_id)}{_FINAL}", {"state": "final", **final})
+
+    def remove_parts(self, corr: str, plan_id: str) -> None:
+        """Drop the shard parquets once combined; the small markers stay as a record."""
+        base = self._prefix(corr, plan_id)
+        for obj in self.cli.list_objects(self.bucket, prefix=base, recursive=True):
+            if obj.object_name.endswith(".parquet"):
+                self.cli.remove_object(self.bucket, obj.object_name)
+        logging.info(f"[shards] corr={corr} plan={plan_id}: removed shard parts")
@@ -0,0 +1,126 @@
+# silver.py
+# Cumulative, year-partitioned silver layer of merged crashes in MinIO.
+#
+#   <root>/year=YYYY/part-<corr>-<ts>.parquet     one file per corr, year and write
+#   <root>/year=YYYY/part-compact-<ts>.parquet    compacted partition
+#   <root>/year=YYYY/_compact.json                compaction claim (claims.py)
+#
+# Every row carries the time it was written (_ingested_at). A crash seen by
+# several corrs (or a corr written twice) is deduplicated on crash_record_id,
+# latest _ingested_at wins: at compaction time for the files, and at query
+# time for readers (see streamlit/utils/silver.py).
+#
+# Appends never overwrite a key, so a compaction only ever deletes files it
+# has read. One compaction per partition runs at a time across replicas: the
+# replica that wins the partition's claim compacts, the others skip it.
+import io
+import logging
+from datetime import datetime, timezone
+from typing import List
+
+import polars as pl
+from minio import Minio
+
+import claims
+
+INGESTED_COL = "_ingested_at"
+_CLAIM = "_compact.json"
+
+
+class SilverStore:
+    """Appends merged frames to <bucket>/<root>/year=YYYY/ and compacts small partitions."""
+
+    def __init__(self, cli: Minio, bucket: str, root: str = "silver/crashes",
+                 id_col: str = "crash_record_id", date_col: str = "crash_date", compact_files: int = 8,
+                 claim_timeout: float = 600):
+        self.cli = cli
+        self.bucket = bucket
+        self.root = root.strip("/")
+        self.id_col = id_col
+        self.date_col = date_col
+        self.compact_files = compact_files
+        self.claim_timeout = claim_timeout
+
+    def _prefix(self, year: str) -> str:
+        return f"{self.root}/year={year}/"
+
+    def _put(self, key: str, df: pl.DataFrame) -> None:
+        buf = io.BytesIO()
+        # crash_date-sorted row groups keep min/max stats tight for date predicates
+        df.write_parquet(buf, compression="zstd", statistics=True, row_group_size=64 * 1024)
+        buf.seek(0)
+        self.cli.put_object(
+            self.bucket, key, data=buf, length=buf.getbuffer().nbytes,
+            content_type="application/vnd.apache.parquet",
+        )
+
+    def _get(self, key: str) -> pl.DataFrame:
+        resp = self.cli.get_object(self.bucket, key)
+        try:
+            return pl.read_parquet(io.BytesIO(resp.read()))
+        finally:
+            resp.close()
+            resp.release_conn()
+
+    def append(self, merged: pl.DataFrame, corr: str) -> List[str]:
+        """Write this corr's rows into their year partitions; returns the keys written."""
+        if merged.is_empty() or self.id_col not in merged.columns or self.date_col not in merged.columns:
+            return []
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        ts = now.strftime("%Y%m%dT%H%M%S%f")
+        df = merged.with_columns(
+            pl.col(self.date_col).cast(pl.Utf8).str.slice(0, 4).alias("_year"),
+            pl.lit(now, dtype=pl.Datetime("us")).alias(INGESTED_COL),
+        )
+        written = []
+        for (year,), part in df.partition_by("_year", as_dict=True, maintain_order=True).items():
+            if not year or not year.isdigit():
+                logging.warning(f"[silver] {part.height} rows of corr={corr} have no crash year; skipped")
+                continue
+            key = f"{self._prefix(year)}part-{corr}-{ts}.parquet"
+            self._put(key, part.drop("_year").sort(self.date_col, maintain_order=True))
+            written.append(key)
+        return written
+
+    def compact(self, years: List[str]) -> None:
+        """Compact each partition that has reached compact_files files and isn't being compacted elsewhere."""
+        for year in years:
+            key = f"{self._prefix(year)}{_CLAIM}"
+            owner = claims.claim(self.cli, self.bucket, key, self.claim_timeout)
+            if owner is None:
+                logging.info(f"[silver] year={year} is being compacted by another replica; skipping")
+                continue
+            try:
+                self._maybe_compact(year)
+            finally:
+                claims.release(self.cli, self.bucket, key, owner)
+
+    def _maybe_compact(self, year: str) -> None:
+        # caller holds the partition's claim
+        objs = [
+            o for o in self.cli.list_objects(self.bucket, prefix=self._prefix(year), recursive=True)
+            if o.object_name.endswith(".parquet")
+        ]
+        if len(objs) < max(2, self.compact_files):
+            return
+
+        # oldest first, so "keep last" below is "latest wins" even on equal timestamps
+        objs.sort(key=lambda o: (getattr(o, "last_modified", None) is None,
+                                 getattr(o, "last_modified", None), o.object_name))
+        frames = [self._get(o.object_name) for o in objs]
+        merged = pl.concat(frames, how="diagonal_relaxed")
+        compacted = (
+            merged.sort(INGESTED_COL, maintain_order=True)
+            .unique(subset=[self.id_col], keep="last", maintain_order=True)
+            .sort(self.date_col, maintain_order=True)
+        )
+        ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        key = f"{self._prefix(year)}part-compact-{ts}.parquet"
+        self._put(key, compacted)
+        # the new file already holds every row, so a crash between these steps
+        # only leaves copies with the same _ingested_at; readers can't tell them
+        # apart, and the partition's next compaction folds them
+        for o in objs:
+            self.cli.remove_object(self.bucket, o.object_name)
+        logging.info(f"[silver] compacted year={year}: {len(objs)} files, {merged.height} -> {compacted.height} rows")
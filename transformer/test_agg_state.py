@@ -0,0 +1,58 @@
+# transformer/test_agg_state.py
+# Regression tests for the cross-corr aggregate state (python -m pytest -q).
+import io
+
+import polars as pl
+
+from agg_state import AggStateStore, combine_partials
+
+
+def _veh(crash: str, units):
+    return pl.DataFrame({
+        "crash_record_id": [crash],
+        "veh_count": pl.Series([len(units)], dtype=pl.UInt32),
+        "veh_unit_no_list": [sorted(units)],
+        "veh_make_list": [["FORD"]],
+    })
+
+
+def _ppl(crash: str, people):
+    return pl.DataFrame({
+        "crash_record_id": [crash],
+        "ppl_count": pl.Series([len(people)], dtype=pl.UInt32),
+        "ppl_person_id_list": [sorted(people)],
+    })
+
+
+def test_same_crash_in_overlapping_corrs_is_not_double_counted(minio):
+    store = AggStateStore(minio, "bucket", shards=4)
+    for corr in ("c1", "c2", "c3"):
+        veh = store.merge(_veh("X", ["1", "2"]), "crash_record_id", "veh", corr)
+        ppl = store.merge(_ppl("X", ["P1"]), "crash_record_id", "ppl", corr)
+        assert veh["veh_count"].to_list() == [2]
+        assert veh["veh_unit_no_list"].to_list() == [["1", "2"]]
+        assert ppl["ppl_count"].to_list() == [1]
+
+
+def test_rows_arriving_in_a_later_corr_are_added(minio):
+    store = AggStateStore(minio, "bucket", shards=4)
+    store.merge(_veh("X", ["1"]), "crash_record_id", "veh", "c1")
+    out = store.merge(_veh("X", ["1", "2"]), "crash_record_id", "veh", "c2")
+    assert out["veh_count"].to_list() == [2]
+    out = store.merge(_veh("X", ["3"]), "crash_record_id", "veh", "c3")
+    assert out["veh_count"].to_list() == [3]
+    assert out["veh_unit_no_list"].to_list() == [["1", "2", "3"]]
+
+
+def test_store_keeps_one_row_per_crash(minio):
+    store = AggStateStore(minio, "bucket", shards=1)
+    for corr in ("c1", "c2", "c3"):
+        store.merge(pl.concat([_veh("X", ["1"]), _veh("Y", ["1"])]), "crash_record_id", "veh", corr)
+    state = pl.read_parquet(io.BytesIO(minio.objects[("bucket", store._key("veh", 0))]))
+    assert sorted(state["crash_record_id"].to_list()) == ["X", "Y"]
+
+
+def test_page_partials_still_add_up():
+    parts = pl.concat([_veh("X", ["1"]), _veh("X", ["2"])])
+    out = combine_partials(parts, "crash_record_id", "veh")
+    assert out["veh_count"].to_list() == [2]
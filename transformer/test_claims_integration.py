@@ -0,0 +1,53 @@
+# transformer/test_claims_integration.py
+# Conditional-put claims against a live MinIO (skipped without one):
+#   MINIO_IT_ENDPOINT=localhost:9000 MINIO_USER=... MINIO_PASS=... python -m pytest -q test_claims_integration.py
+import os
+import time
+import uuid
+
+import pytest
+from minio import Minio
+
+import claims
+
+ENDPOINT = os.getenv("MINIO_IT_ENDPOINT")
+
+pytestmark = pytest.mark.skipif(not ENDPOINT, reason="MINIO_IT_ENDPOINT not set")
+
+
+@pytest.fixture
+def live():
+    cli = Minio(ENDPOINT, access_key=os.getenv("MINIO_USER"), secret_key=os.getenv("MINIO_PASS"),
+                secure=os.getenv("MINIO_SSL", "false").lower() == "true")
+    bucket = f"claims-it-{uuid.uuid4().hex[:8]}"
+    cli.make_bucket(bucket)
+    yield cli, bucket
+    for obj in cli.list_objects(bucket, recursive=True):
+        cli.remove_object(bucket, obj.object_name)
+    cli.remove_bucket(bucket)
+
+
+def test_server_honours_if_none_match(live):
+    cli, bucket = live
+    assert claims.put_json_if(cli, bucket, "k.json", {"n": 1}, {"If-None-Match": "*"})
+    assert not claims.put_json_if(cli, bucket, "k.json", {"n": 2}, {"If-None-Match": "*"})
+    assert claims.get_json_etag(cli, bucket, "k.json")[0] == {"n": 1}
+
+
+def test_server_honours_if_match(live):
+    cli, bucket = live
+    claims.put_json(cli, bucket, "k.json", {"n": 1})
+    _, etag = claims.get_json_etag(cli, bucket, "k.json")
+    assert claims.put_json_if(cli, bucket, "k.json", {"n": 2}, {"If-Match": etag})
+    assert not claims.put_json_if(cli, bucket, "k.json", {"n": 3}, {"If-Match": etag})
+
+
+def test_one_claim_wins_and_a_stale_one_is_taken_over_once(live):
+    cli, bucket = live
+    assert claims.claim(cli, bucket, "c.json", stale_after=60)
+    assert claims.claim(cli, bucket, "c.json", stale_after=60) is None
+    claims.put_json(cli, bucket, "c.json", {"state": "claimed", "owner": "dead", "claimed_at": time.time() - 120})
+    owner = claims.claim(cli, bucket, "c.json", stale_after=60)
+    assert owner and claims.claim(cli, bucket, "c.json", stale_after=60) is None
+    claims.release(cli, bucket, "c.json", owner)
+    assert claims.get_json_etag(cli, bucket, "c.json") == (None, None)
@@ -0,0 +1,27 @@
+# transformer/test_manifest.py
+# Which raw objects a corr's transform reads (python -m pytest -q).
+import transformer as T
+
+PAGES = [
+    "crash/crashes/year=2024/corr=c1/page-0000.json.gz",
+    "crash/crashes/year=2024/corr=c1/page-0001.json.gz",
+]
+
+
+def _seed(minio):
+    for k in PAGES:
+        minio.objects[("raw-data", k)] = b"[]"
+
+
+def test_manifest_objects_are_used_as_listed(minio):
+    _seed(minio)
+    manifest = {"corr": "c1", "complete": True, "objects": [{"alias": "crashes", "key": PAGES[1]}]}
+    assert T._keys_for_corr(minio, "raw-data", "crash", "crashes", "c1", manifest) == [PAGES[1]]
+
+
+def test_redelivery_that_skipped_pages_lists_the_prefix(minio):
+    _seed(minio)
+    # the redelivered run only wrote page 1; page 0 came from the crashed attempt
+    manifest = {"corr": "c1", "complete": True, "skipped_pages": 1,
+                "objects": [{"alias": "crashes", "key": PAGES[1]}]}
+    assert T._keys_for_corr(minio, "raw-data", "crash", "crashes", "c1", manifest) == PAGES
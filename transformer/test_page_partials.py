@@ -0,0 +1,44 @@
+# transformer/test_page_partials.py
+# Page partial lifecycle (python -m pytest -q).
+import polars as pl
+import pytest
+
+import transformer as T
+from page_partials import PartialStore
+
+
+def _page(store, corr, page):
+    store.put(corr, page, {"crashes": pl.DataFrame({"crash_record_id": ["X"]})}, [f"raw/{page}.json.gz"])
+
+
+def test_partials_are_removed_after_the_clean_job_is_published(minio, monkeypatch):
+    store = PartialStore(minio, "x")
+    _page(store, "c1", "0")
+    _page(store, "c1", "1")
+    _page(store, "c2", "0")
+    published = []
+    monkeypatch.setattr(T, "PAGE_EVENTS_QUEUE", "pages")
+    monkeypatch.setattr(T, "minio_client", lambda: minio)
+    monkeypatch.setattr(T.CLEAN_PUBLISHER, "publish", published.append)
+
+    T.publish_transform_result({"corr_id": "c1"}, ("x", "crash/corr=c1/merged.csv", "csv"))
+
+    assert len(published) == 1
+    assert not store.has_pages("c1")
+    assert store.pages("c2") == {"0": ["raw/0.json.gz"]}
+
+
+def test_partials_stay_when_the_publish_fails(minio, monkeypatch):
+    store = PartialStore(minio, "x")
+    _page(store, "c1", "0")
+
+    def fail(message):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(T, "PAGE_EVENTS_QUEUE", "pages")
+    monkeypatch.setattr(T, "minio_client", lambda: minio)
+    monkeypatch.setattr(T.CLEAN_PUBLISHER, "publish", fail)
+
+    with pytest.raises(ConnectionError):
+        T.publish_transform_result({"corr_id": "c1"}, ("x", "crash/corr=c1/merged.csv", "csv"))
+    assert store.has_pages("c1")
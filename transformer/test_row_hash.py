@@ -0,0 +1,33 @@
+# transformer/test_row_hash.py
+# row_hash is a stable digest of the row's values; dedupe compares full rows (python -m pytest -q).
+import polars as pl
+
+import transformer as T
+
+
+def _rows():
+    return pl.DataFrame({
+        "crash_record_id": ["a", "a", None, ""],
+        "lane_cnt": [2, 2, None, 0],
+        "veh_make_list": [["FORD", None], ["FORD", None], [], None],
+    })
+
+
+def test_row_hash_is_pinned():
+    # a changed value here re-touches every gold row on its next MERGE
+    got = T.add_row_hash(_rows())[T.ROW_HASH_COL].to_list()
+    assert got[:3] == [5800624867940125775, 5800624867940125775, 5116690111732812635]
+
+
+def test_row_hash_ignores_width_and_tells_null_from_empty():
+    df = _rows()
+    widened = df.with_columns(pl.col("lane_cnt").cast(pl.UInt32))
+    assert T.add_row_hash(widened)[T.ROW_HASH_COL].equals(T.add_row_hash(df)[T.ROW_HASH_COL])
+    assert T.add_row_hash(df)[T.ROW_HASH_COL].n_unique() == 3
+
+
+def test_basic_standardize_drops_only_exact_duplicates():
+    df = _rows().with_columns(pl.Series("crash_date", ["d1", "d1", "d1", "d2"]))
+    out = T.basic_standardize(df.rename({"crash_date": " Crash_Date "}))
+    assert out.height == 3
+    assert out.columns[-1] == "crash_date"
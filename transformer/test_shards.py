@@ -0,0 +1,59 @@
+# transformer/test_shards.py
+# The combine step of year-sharded transforms (python -m pytest -q).
+import json
+import time
+
+import polars as pl
+
+import transformer as T
+from shards import ShardStore
+
+
+def _plan(shards: ShardStore, years=("2023", "2024")):
+    plan = {"corr": "c1", "job_id": "j", "years": list(years), "raw_bucket": "raw-data",
+            "xform_bucket": "xform", "output_format": "parquet"}
+    shards.put_plan("c1", "p1", plan)
+    for y in years:
+        shards.put_part("c1", "p1", y, pl.DataFrame({"crash_record_id": [f"id{y}"], "year": [y]}))
+    return plan
+
+
+def test_only_one_claim_wins(minio):
+    shards = ShardStore(minio, "xform")
+    assert shards.claim_final("c1", "p1", stale_after=60)
+    assert not shards.claim_final("c1", "p1", stale_after=60)
+
+
+def test_stale_claim_is_taken_over_once(minio):
+    shards = ShardStore(minio, "xform")
+    key = ("xform", "_shards/corr=c1/plan=p1/final.json")
+    minio.objects[key] = json.dumps({"state": "claimed", "claimed_at": time.time() - 120}).encode()
+    assert shards.claim_final("c1", "p1", stale_after=60)
+    assert not shards.claim_final("c1", "p1", stale_after=60)
+    shards.put_final("c1", "p1", {"key": "k"})
+    assert not shards.claim_final("c1", "p1", stale_after=0)
+
+
+def test_racing_finalizers_publish_once_and_do_not_fail(minio, monkeypatch):
+    published = []
+    monkeypatch.setattr(T.CLEAN_PUBLISHER, "publish", published.append)
+    shards = ShardStore(minio, "xform")
+    plan = _plan(shards)
+
+    # both saw every year done; the first one combines and removes the parts
+    assert T.finalize_shards(minio, shards, plan, "p1")
+    assert not T.finalize_shards(minio, shards, plan, "p1")
+    assert len(published) == 1
+    assert not [k for _, k in minio.objects if k.startswith("_shards/") and k.endswith(".parquet")]
+
+
+def test_finalizer_after_stale_takeover_treats_missing_parts_as_done(minio, monkeypatch):
+    published = []
+    monkeypatch.setattr(T.CLEAN_PUBLISHER, "publish", published.append)
+    monkeypatch.setattr(T, "TRANSFORM_SHARD_CLAIM_TIMEOUT_S", 0)
+    shards = ShardStore(minio, "xform")
+    plan = _plan(shards)
+    shards.claim_final("c1", "p1", stale_after=60)   # a slow combiner holds the claim ...
+    shards.remove_parts("c1", "p1")                  # ... and a takeover already combined the parts
+    assert not T.finalize_shards(minio, shards, plan, "p1")
+    assert published == []
@@ -0,0 +1,93 @@
+# transformer/test_silver.py
+# Silver appends after the clean hand-off; one compaction per partition (python -m pytest -q).
+import glob
+import json
+import os
+import tempfile
+import time
+
+import polars as pl
+import pytest
+
+import transformer as T
+from silver import SilverStore
+
+
+def _merged(ids, year="2024"):
+    return pl.DataFrame({
+        "crash_record_id": ids,
+        "crash_date": [f"{year}-05-01T10:00:00"] * len(ids),
+        "veh_unit_no_list": [["1"]] * len(ids),
+    })
+
+
+def _silver_keys(minio, bucket="x"):
+    return sorted(k for b, k in minio.objects if b == bucket and k.startswith("silver/") and k.endswith(".parquet"))
+
+
+def _spilled():
+    return glob.glob(os.path.join(tempfile.gettempdir(), "silver-*.parquet"))
+
+
+@pytest.fixture
+def job(minio, monkeypatch):
+    monkeypatch.setattr(T, "minio_client", lambda: minio)
+    monkeypatch.setattr(T, "SILVER_ENABLED", True)
+    monkeypatch.setattr(T, "SILVER_BUCKET", None)
+    published = []
+    monkeypatch.setattr(T.CLEAN_PUBLISHER, "publish", lambda m: published.append((m, _silver_keys(minio))))
+    return published
+
+
+def test_silver_is_written_after_the_clean_job_is_published(minio, job):
+    spilled = _spilled()
+    T.write_merged(minio, "x", "crash/corr=c1/merged.csv", _merged(["a", "b"]), "csv",
+                   T.silver_store(minio, "x"), "c1")
+    assert _silver_keys(minio) == []
+    T.publish_transform_result({"corr_id": "c1"}, ("x", "crash/corr=c1/merged.csv", "csv"))
+    (message, silver_at_publish), = job
+    assert message["corr_id"] == "c1" and silver_at_publish == []
+    keys = _silver_keys(minio)
+    assert len(keys) == 1 and keys[0].startswith("silver/crashes/year=2024/part-c1-")
+    assert _spilled() == spilled
+
+
+def test_failed_publish_drops_the_held_silver_rows(minio, job, monkeypatch):
+    def fail(message):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(T.CLEAN_PUBLISHER, "publish", fail)
+    spilled = _spilled()
+    T.write_merged(minio, "x", "crash/corr=c1/merged.csv", _merged(["a"]), "csv",
+                   T.silver_store(minio, "x"), "c1")
+    with pytest.raises(ConnectionError):
+        T.publish_transform_result({"corr_id": "c1"}, ("x", "crash/corr=c1/merged.csv", "csv"))
+    assert _silver_keys(minio) == []
+    assert _spilled() == spilled
+
+
+def test_rewriting_a_corr_keeps_one_row_per_crash_after_compaction(minio):
+    store = SilverStore(minio, "x", compact_files=3)
+    for ids in (["a", "b"], ["a", "b"], ["b", "c"]):
+        store.append(_merged(ids), "c1")
+    store.compact(["2024"])
+    keys = _silver_keys(minio)
+    assert len(keys) == 1 and "part-compact-" in keys[0]
+    df = pl.read_parquet(minio.objects[("x", keys[0])])
+    assert sorted(df["crash_record_id"].to_list()) == ["a", "b", "c"]
+    assert ("x", "silver/crashes/year=2024/_compact.json") not in minio.objects
+
+
+def test_partition_claimed_by_another_replica_is_not_compacted(minio):
+    store = SilverStore(minio, "x", compact_files=2)
+    store.append(_merged(["a"]), "c1")
+    store.append(_merged(["b"]), "c2")
+    claim = {"state": "claimed", "owner": "other", "claimed_at": time.time()}
+    minio.objects[("x", "silver/crashes/year=2024/_compact.json")] = json.dumps(claim).encode()
+    store.compact(["2024"])
+    assert len(_silver_keys(minio)) == 2
+
+    # the other replica died holding it: taken over once the claim is stale
+    store.claim_timeout = 0
+    store.compact(["2024"])
+    assert len(_silver_keys(minio)) == 1
@@ -1,22 +1,40 @@
 # transformer/transformer.py
 import os
 import io
+import array
+import functools
+import hashlib
 import json
 import gzip
+import zlib
 import socket
+import sys
 import logging
 import time
 import random
+import tempfile
+import threading
 import traceback
-from typing import List, Dict, Any
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 
+import certifi
 import pika
+import urllib3
 from minio import Minio
 from minio.error import S3Error
 import polars as pl
+import zstandard
 
 from prometheus_client import Counter, Histogram, start_http_server
 
+from agg_state import AggStateStore, CORR_COL, combine_partials
+from silver import SilverStore
+from page_cache import PageCache
+from page_partials import PartialStore
+from shards import ShardStore
+
 
 # Prometheous Imports
 from metrics import (
@@ -24,7 +42,21 @@ from metrics import (
     TRANSFORMER_UPTIME_SECONDS,
     TRANSFORMER_ROWS_PROCESSED_TOTAL,
     TRANSFORM_RUN_DURATION_SECONDS,
-    TRANSFORM_JOBS_TOTAL
+    TRANSFORM_JOBS_TOTAL,
+    TRANSFORMER_MINIO_POOL_CONNECTIONS,
+    TRANSFORMER_MINIO_POOL_REQUESTS,
+    TRANSFORMER_AMQP_CONNECTIONS_OPENED_TOTAL,
+    TRANSFORMER_CONNECTION_REUSE_TOTAL,
+    TRANSFORMER_PUBLISH_TOTAL,
+    TRANSFORMER_BYTES_READ_TOTAL,
+    TRANSFORMER_BYTES_WRITTEN_TOTAL,
+    TRANSFORMER_OBJECTS_FETCHED_TOTAL,
+    TRANSFORMER_SCHEMA_MISMATCHES_TOTAL,
+    TRANSFORMER_BATCH_SIZE,
+    TRANSFORMER_PAGE_PARTIALS_TOTAL,
+    TRANSFORMER_SHARDS_TOTAL,
+    TRANSFORMER_SILVER_WRITES_TOTAL,
+    stage_timer,
 )
 
 
@@ -47,16 +79,122 @@ MINIO_SECURE     = os.getenv("MINIO_SSL").lower() == "true"
 RAW_BUCKET       = os.getenv("RAW_BUCKET")
 XFORM_BUCKET_ENV = os.getenv("XFORM_BUCKET")                 
 PREFIX           = "crash"      
+FETCH_WORKERS    = int(os.getenv("FETCH_WORKERS", "8"))   # concurrent raw-page GETs per job
+DATASET_ALIASES  = ("crashes", "vehicles", "people")
+REQUIRE_COMPLETE = os.getenv("REQUIRE_COMPLETE_CORR", "false").lower() == "true"
+READ_CHUNK_BYTES = 1 << 20
+OUTPUT_FORMAT    = os.getenv("OUTPUT_FORMAT", "csv").lower()   # csv | parquet | arrow
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE_MB", "16")) * 1024 * 1024
+SPOOL_MAX_BYTES  = int(os.getenv("SPOOL_MAX_MB", "64")) * 1024 * 1024
+TRANSFORM_WORKERS  = int(os.getenv("TRANSFORM_WORKERS", "1"))    # jobs in flight per container
+TRANSFORM_PREFETCH = int(os.getenv("TRANSFORM_PREFETCH", str(TRANSFORM_WORKERS)))
+AGG_STATE_ENABLED = os.getenv("AGG_STATE_ENABLED", "false").lower() == "true"   # single replica only (agg_state.py)
+AGG_STATE_SHARDS  = int(os.getenv("AGG_STATE_SHARDS", "16"))
+MEMORY_BUDGET_BYTES = int(os.getenv("TRANSFORM_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024   # 0 = never partition
+RAW_EXPANSION    = 10   # rough in-memory size of a decoded page per compressed byte
+TRANSFORM_BATCH_MAX     = int(os.getenv("TRANSFORM_BATCH_MAX", "1"))      # corrs coalesced per run (1 = off)
+TRANSFORM_BATCH_WAIT_MS = int(os.getenv("TRANSFORM_BATCH_WAIT_MS", "500"))  # max wait to fill a batch
+SILVER_ENABLED   = os.getenv("SILVER_ENABLED", "true").lower() == "true"
+SILVER_BUCKET    = os.getenv("SILVER_BUCKET")              # default: the job's xform bucket
+SILVER_COMPACT_FILES = int(os.getenv("SILVER_COMPACT_FILES", "8"))   # compact a year once it has this many files
+SILVER_COMPACT_CLAIM_TIMEOUT_S = float(os.getenv("SILVER_COMPACT_CLAIM_TIMEOUT_S", "600"))  # take over a dead compactor's claim
+PAGE_CACHE_DIR   = os.getenv("PAGE_CACHE_DIR", "")         # empty = no local page cache
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+PAGE_EVENTS_QUEUE = os.getenv("PAGE_EVENTS_QUEUE", "")     # extractor page-ready events; empty = off
+TRANSFORM_SHARD_YEARS = os.getenv("TRANSFORM_SHARD_YEARS", "false").lower() == "true"   # split big corrs by year
+TRANSFORM_SHARD_MIN_BYTES = int(os.getenv("TRANSFORM_SHARD_MIN_MB", "64")) * 1024 * 1024   # raw bytes worth sharding
+TRANSFORM_SHARD_CLAIM_TIMEOUT_S = float(os.getenv("TRANSFORM_SHARD_CLAIM_TIMEOUT_S", "1800"))  # then a dead combiner's claim is taken over
+MINIO_POOL_SIZE  = int(os.getenv("MINIO_POOL_SIZE", str(max(10, 2 * FETCH_WORKERS * TRANSFORM_WORKERS))))
+
+# format -> (file extension, content type)
+OUTPUT_FORMATS = {
+    "csv":     ("csv",     "text/csv; charset=utf-8"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow":   ("arrow",   "application/vnd.apache.arrow.file"),
+}
+
+# Declared dtypes of the raw Socrata fields. Socrata sends every value as a
+# JSON string, which polars' JSON readers won't parse into a number, so JSON
+# pages decode as Utf8 and these columns are cast once per load; compacted
+# parquet already carries them (compactor.py pins each object it writes).
+# Anything not listed (ids, dates, categories, beats) stays Utf8.
+DATASET_SCHEMAS: Dict[str, Dict[str, pl.DataType]] = {
+    "crashes": {
+        "lane_cnt": pl.Int64,
+        "posted_speed_limit": pl.Int64,
+        "num_units": pl.Int64,
+        "injuries_total": pl.Int64,
+        "injuries_fatal": pl.Int64,
+        "injuries_incapacitating": pl.Int64,
+        "injuries_non_incapacitating": pl.Int64,
+        "injuries_reported_not_evident": pl.Int64,
+        "injuries_no_indication": pl.Int64,
+        "injuries_unknown": pl.Int64,
+        "crash_hour": pl.Int64,
+        "crash_day_of_week": pl.Int64,
+        "crash_month": pl.Int64,
+        "street_no": pl.Int64,
+        "latitude": pl.Float64,
+        "longitude": pl.Float64,
+    },
+    "vehicles": {
+        "unit_no": pl.Int64,
+        "vehicle_year": pl.Int64,
+        "num_passengers": pl.Int64,
+        "occupant_cnt": pl.Int64,
+    },
+    "people": {
+        "age": pl.Int64,
+    },
+}
 # ---------------------------------
 # MinIO client
 # ---------------------------------
+_MINIO_LOCK   = threading.Lock()
+_MINIO_HTTP: Optional[urllib3.PoolManager] = None
+_MINIO_CLIENT: Optional[Minio] = None
+
 def minio_client() -> Minio:
-    return Minio(
-        MINIO_ENDPOINT,
-        access_key=MINIO_ACCESS,
-        secret_key=MINIO_SECRET,
-        secure=MINIO_SECURE,
-    )
+    """
+    Process-wide MinIO client. Its urllib3 pool (MINIO_POOL_SIZE connections
+    per host) keeps connections alive across pages and jobs; Minio is
+    thread-safe, so fetch workers share it.
+    """
+    global _MINIO_HTTP, _MINIO_CLIENT
+    with _MINIO_LOCK:
+        if _MINIO_CLIENT is None:
+            # same settings as minio's default client, with a bigger pool
+            _MINIO_HTTP = urllib3.PoolManager(
+                timeout=urllib3.Timeout(connect=300, read=300),
+                maxsize=MINIO_POOL_SIZE,
+                cert_reqs="CERT_REQUIRED",
+                ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+                retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+            )
+            _MINIO_CLIENT = Minio(
+                MINIO_ENDPOINT,
+                access_key=MINIO_ACCESS,
+                secret_key=MINIO_SECRET,
+                secure=MINIO_SECURE,
+                http_client=_MINIO_HTTP,
+            )
+        return _MINIO_CLIENT
+
+PAGE_CACHE: Optional[PageCache] = PageCache(PAGE_CACHE_DIR, PAGE_CACHE_MAX_BYTES) if PAGE_CACHE_DIR else None
+
+def _minio_pool_stat(attr: str) -> int:
+    """Sum a urllib3 pool counter (num_connections / num_requests) over every host pool."""
+    http = _MINIO_HTTP
+    if http is None:
+        return 0
+    total = 0
+    for k in http.pools.keys():
+        pool = http.pools.get(k)
+        total += getattr(pool, attr, 0) if pool is not None else 0
+    return total
+
+TRANSFORMER_MINIO_POOL_CONNECTIONS.set_function(lambda: _minio_pool_stat("num_connections"))
+TRANSFORMER_MINIO_POOL_REQUESTS.set_function(lambda: _minio_pool_stat("num_requests"))
 
 # ---------------------------------
 # Object helpers
@@ -69,17 +207,89 @@ def list_objects_recursive(cli: Minio, bucket: str, prefix: str) -> List[str]:
         out.append(obj.object_name)
     return out
 
-def read_json_gz_array(cli: Minio, bucket: str, key: str) -> List[Dict[str, Any]]:
+GZIP_MAGIC    = b"\x1f\x8b"
+ZSTD_MAGIC    = b"\x28\xb5\x2f\xfd"
+PARQUET_MAGIC = b"PAR1"
+CODEC_ERRORS  = (zlib.error, zstandard.ZstdError)
+RAW_SUFFIXES  = (".json.gz", ".json", ".json.zst", ".ndjson", ".ndjson.gz", ".ndjson.zst")
+NDJSON_BLOCK_BYTES = 8 * READ_CHUNK_BYTES   # NDJSON is parsed in blocks of whole lines this big
+NDJSON_SMALL_BYTES = 4 * READ_CHUNK_BYTES   # below this, parse as a JSON array (less per-call overhead)
+
+# codec name -> factory for a streaming decompressor (decompress / flush / eof / unused_data)
+_DECOMPRESSORS = {
+    "gzip": lambda: zlib.decompressobj(16 + zlib.MAX_WBITS),
+    "zstd": lambda: zstandard.ZstdDecompressor().decompressobj(),
+}
+
+def sniff_codec(head: bytes) -> str:
+    """gzip | zstd | plain, from an object's first bytes (the key's extension isn't trusted)."""
+    if head[:2] == GZIP_MAGIC:
+        return "gzip"
+    if head[:4] == ZSTD_MAGIC:
+        return "zstd"
+    return "plain"
+
+def sniff_format(head: bytes) -> str:
+    """
+    Layout of a decoded page from its first bytes: parquet, array (JSON
+    array), ndjson (one record per line), envelope (legacy {"data": [...]})
+    or empty. `head` must run past the first newline to tell NDJSON apart.
     """
-    Download an object and return it as a JSON array.
-    Handles both gzipped (.json.gz) and plain JSON content.
+    if head[:4] == PARQUET_MAGIC:
+        return "parquet"
+    body = head.lstrip()
+    if not body:
+        return "empty"
+    if body[:1] == b"[":
+        return "array"
+    try:
+        first = json.loads(body.split(b"\n", 1)[0])
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return "envelope"   # multi-line document
+    if isinstance(first, dict) and not isinstance(first.get("data"), list):
+        return "ndjson"
+    return "envelope"
+
+def iter_object_chunks(cli: Minio, bucket: str, key: str, dataset: str = "other") -> Iterator[bytes]:
+    """
+    Stream an object out of MinIO as decoded chunks. The codec is sniffed
+    (gzip, zstd or uncompressed) and inflated chunk by chunk as it arrives,
+    so the compressed body is never held next to the decompressed one.
     """
     resp = None
-    data = b""
+    nbytes = [0]
     try:
         resp = cli.get_object(bucket, key)
-        data = resp.read()
+        head = resp.read(4)
+
+        def body():
+            nbytes[0] += len(head)
+            yield head
+            for chunk in resp.stream(READ_CHUNK_BYTES):
+                nbytes[0] += len(chunk)
+                yield chunk
+
+        new = _DECOMPRESSORS.get(sniff_codec(head))
+        if new is None:
+            for chunk in body():
+                if chunk:
+                    yield chunk
+        else:
+            d = new()
+            for chunk in body():
+                while chunk:
+                    out = d.decompress(chunk)
+                    if out:
+                        yield out
+                    # concatenated gzip members / zstd frames: start a fresh decoder on the leftovers
+                    chunk = d.unused_data if d.eof else b""
+                    if chunk:
+                        yield d.flush()
+                        d = new()
+            yield d.flush()
+        TRANSFORMER_OBJECTS_FETCHED_TOTAL.labels(dataset=dataset).inc()
     finally:
+        TRANSFORMER_BYTES_READ_TOTAL.labels(dataset=dataset).inc(nbytes[0])
         try:
             if resp is not None:
                 resp.close()
@@ -87,14 +297,21 @@ def read_json_gz_array(cli: Minio, bucket: str, key: str) -> List[Dict[str, Any]
         except Exception:
             pass
 
-    # GZIP magic header: 1F 8B
-    if len(data) >= 2 and data[:2] == b"\x1f\x8b":
-        try:
-            payload = gzip.decompress(data)
-        except OSError:
-            payload = data
-    else:
-        payload = data
+def read_object_payload(cli: Minio, bucket: str, key: str, dataset: str = "other") -> bytes:
+    """Download an object and return its whole decoded payload (see iter_object_chunks)."""
+    with stage_timer("download", dataset):
+        return b"".join(iter_object_chunks(cli, bucket, key, dataset))
+
+def read_json_gz_array(cli: Minio, bucket: str, key: str) -> List[Dict[str, Any]]:
+    """
+    Download an object and return it as a list of records.
+    Handles gzip, zstd and plain content holding a JSON array, NDJSON or
+    a {"data": [...]} envelope.
+    """
+    try:
+        payload = read_object_payload(cli, bucket, key)
+    except CODEC_ERRORS:
+        return []
 
     try:
         text = payload.decode("utf-8")
@@ -102,6 +319,8 @@ def read_json_gz_array(cli: Minio, bucket: str, key: str) -> List[Dict[str, Any]
         text = payload.decode("utf-8", errors="replace")
 
     try:
+        if sniff_format(payload) == "ndjson":
+            return [json.loads(line) for line in text.splitlines() if line.strip()]
         arr = json.loads(text)
     except json.JSONDecodeError:
         return []
@@ -112,55 +331,565 @@ def read_json_gz_array(cli: Minio, bucket: str, key: str) -> List[Dict[str, Any]
         return arr["data"]
     return []
 
+def read_page_frame(
+    cli: Minio,
+    bucket: str,
+    key: str,
+    columns: Optional[List[str]] = None,
+    dataset: str = "other",
+    etag: Optional[str] = None,
+) -> pl.DataFrame:
+    """
+    Decode one raw page straight into a polars DataFrame (no per-row dicts).
+    With `columns`, only those fields are kept (Socrata sends every value as
+    a string, so they decode as Utf8); without, the dtypes are inferred.
+    Declared dtypes (DATASET_SCHEMAS) are applied per dataset by pin_schema.
+    NDJSON pages are parsed block by block while they download; other
+    layouts are parsed once the whole payload is in.
+    With an `etag`, decoded pages go through the local PAGE_CACHE.
+    """
+    digest = PageCache.cache_key(bucket, key, etag, columns) if (PAGE_CACHE is not None and etag) else None
+    if digest is not None:
+        with stage_timer("cache_read", dataset):
+            cached = PAGE_CACHE.get(digest)
+        if cached is not None:
+            return cached
+
+    chunks = iter_object_chunks(cli, bucket, key, dataset)
+    try:
+        with stage_timer("download", dataset):
+            head = _peek_records(chunks)
+        if sniff_format(head) == "ndjson":
+            # download and decode overlap here; the time lands in "decode"
+            with stage_timer("decode", dataset):
+                df = _decode_ndjson_stream(head, chunks, columns, bucket, key)
+        else:
+            with stage_timer("download", dataset):
+                payload = head + b"".join(chunks)
+            with stage_timer("decode", dataset):
+                df = _decode_page(payload, columns, bucket, key)
+    except CODEC_ERRORS as e:
+        logging.warning(f"Skipping corrupt page s3://{bucket}/{key}: {e}")
+        return pl.DataFrame()
+    finally:
+        chunks.close()
+
+    if digest is not None:
+        with stage_timer("cache_write", dataset):
+            PAGE_CACHE.put(digest, df)
+    return df
+
+def _peek_records(chunks: Iterator[bytes]) -> bytes:
+    """Decoded bytes up to the first line break after the first record starts (or the end)."""
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        body = buf.lstrip()
+        if body[:1] and (body[:1] != b"{" or b"\n" in body):
+            break
+    return buf
+
+def _read_json_frame(payload: bytes, schema: Optional[Dict[str, pl.DataType]], ndjson: bool) -> pl.DataFrame:
+    if ndjson and len(payload) < NDJSON_SMALL_BYTES:
+        # read_ndjson's parallel parse only pays off on large blocks; raw newlines
+        # only ever separate records, so small ones are cheaper re-wrapped as an array
+        try:
+            return _read_json_frame(b"[" + payload.strip().replace(b"\n", b",") + b"]", schema, ndjson=False)
+        except Exception:
+            pass   # e.g. blank lines: let the NDJSON reader have it
+    read = pl.read_ndjson if ndjson else pl.read_json
+    if schema:
+        return read(io.BytesIO(payload), schema=schema)
+    # no select list: Socrata leaves null fields out of a record, so every record is scanned for columns
+    return read(io.BytesIO(payload), infer_schema_length=None)
+
+def _decode_ndjson_stream(
+    head: bytes, chunks: Iterator[bytes], columns: Optional[List[str]], bucket: str, key: str,
+) -> pl.DataFrame:
+    schema = {c: pl.Utf8 for c in columns} if columns else None
+    frames: List[pl.DataFrame] = []
+    buf = bytearray(head)
+    try:
+        for chunk in chunks:
+            buf += chunk
+            if len(buf) < NDJSON_BLOCK_BYTES:
+                continue
+            cut = buf.rfind(b"\n") + 1
+            if cut:
+                frames.append(_read_json_frame(bytes(buf[:cut]), schema, ndjson=True))
+                del buf[:cut]
+        if bytes(buf).strip():
+            frames.append(_read_json_frame(bytes(buf), schema, ndjson=True))
+    except CODEC_ERRORS:
+        raise
+    except Exception as e:
+        logging.warning(f"Skipping undecodable page s3://{bucket}/{key}: {e}")
+        return pl.DataFrame()
+    if not frames:
+        return pl.DataFrame(schema=schema)
+    return frames[0] if len(frames) == 1 else pl.concat(frames, how="diagonal_relaxed", rechunk=True)
+
+def _decode_page(payload: bytes, columns: Optional[List[str]], bucket: str, key: str) -> pl.DataFrame:
+    schema = {c: pl.Utf8 for c in columns} if columns else None
+    fmt = sniff_format(payload)
+    if fmt == "empty":
+        return pl.DataFrame(schema=schema)
+
+    if fmt == "parquet":
+        # compacted raw object (compactor.py): already columnar, declared
+        # columns already pinned, so they're read as stored
+        present = set(pl.read_parquet_schema(io.BytesIO(payload)))
+        df = pl.read_parquet(io.BytesIO(payload), columns=[c for c in schema if c in present] if schema else None)
+        if schema:
+            df = df.select([
+                pl.col(c) if c in present else pl.lit(None, dtype=pl.Utf8).alias(c)
+                for c in schema
+            ])
+        return df
+
+    if fmt in ("array", "ndjson"):
+        try:
+            return _read_json_frame(payload, schema, ndjson=fmt == "ndjson")
+        except Exception as e:
+            logging.warning(f"Skipping undecodable page s3://{bucket}/{key}: {e}")
+            return pl.DataFrame()
+
+    # legacy {"data": [...]} envelope
+    try:
+        doc = json.loads(payload)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        doc = None
+    rows = doc.get("data") if isinstance(doc, dict) and isinstance(doc.get("data"), list) else []
+    if not rows:
+        return pl.DataFrame(schema=schema)
+    df = pl.DataFrame(rows, infer_schema_length=None)
+    if schema:
+        df = df.select([
+            pl.col(c).cast(pl.Utf8) if c in df.columns else pl.lit(None, dtype=pl.Utf8).alias(c)
+            for c in schema
+        ])
+    return df
+
+def select_columns(manifest: Optional[Dict[str, Any]], dataset_alias: str) -> Optional[List[str]]:
+    """Fields the extractor asked Socrata for (manifest `selects`); None means keep everything."""
+    sel = ((manifest or {}).get("selects") or {}).get(dataset_alias)
+    if not sel or sel.strip() == "*":
+        return None
+    cols = []
+    for c in sel.split(","):
+        c = c.strip().lower()
+        if c and c not in cols:
+            cols.append(c)
+    return cols
+
+COMPACTED_INDEX = "compacted.json"   # written next to manifest.json by compactor.py
+
+def read_manifest(cli: Minio, bucket: str, corr: str, prefer_compacted: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Read the extractor's run manifest (_runs/corr=<id>/manifest.json).
+    Returns None when the corr has no manifest (older extractor runs).
+    When compactor.py has compacted the corr, its object list replaces the
+    extractor's (pass prefer_compacted=False for the original pages).
+    """
+    if prefer_compacted:
+        index = read_compacted_index(cli, bucket, corr)
+        if index is not None:
+            return index
+    return _read_json_object(cli, bucket, f"_runs/corr={corr}/manifest.json")
+
+def read_compacted_index(cli: Minio, bucket: str, corr: str) -> Optional[Dict[str, Any]]:
+    """
+    The compactor's index (_runs/corr=<id>/compacted.json): the manifest's
+    fields with `objects` listing the compacted parquet objects. None if absent.
+    """
+    return _read_json_object(cli, bucket, f"_runs/corr={corr}/{COMPACTED_INDEX}")
+
+def _read_json_object(cli: Minio, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+    resp = None
+    try:
+        resp = cli.get_object(bucket, key)
+        return json.loads(resp.read().decode("utf-8"))
+    except S3Error as e:
+        if e.code in {"NoSuchKey", "NoSuchObject"}:
+            return None
+        raise
+    except json.JSONDecodeError:
+        logging.warning(f"Unreadable JSON s3://{bucket}/{key}; ignoring it")
+        return None
+    finally:
+        if resp is not None:
+            resp.close()
+            resp.release_conn()
+
+def write_frame(
+    cli: Minio,
+    bucket: str,
+    key: str,
+    df: pl.DataFrame,
+    fmt: str = "csv",
+    dataset: str = "merged",
+) -> None:
+    """
+    Serialize `df` once into a spooled temp file (memory, spilling to disk past
+    SPOOL_MAX_MB) and stream it to MinIO as a multipart upload.
+    csv expects make_csv_safe output; parquet/arrow keep native list columns.
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"write_frame: unknown output format {fmt!r}")
+    _, content_type = OUTPUT_FORMATS[fmt]
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as f:
+        with stage_timer("serialize", dataset):
+            if fmt == "parquet":
+                df.write_parquet(f, compression="zstd")
+            elif fmt == "arrow":
+                # oldest compat level: plain (not view) strings, readable by any pyarrow
+                df.write_ipc(f, compression="zstd", compat_level=pl.CompatLevel.oldest())
+            else:
+                df.write_csv(f)
+        size = f.tell()
+        f.seek(0)
+        with stage_timer("upload", dataset):
+            cli.put_object(
+                bucket,
+                key,
+                data=f,
+                length=-1,
+                part_size=UPLOAD_PART_SIZE,
+                content_type=content_type,
+            )
+        TRANSFORMER_BYTES_WRITTEN_TOTAL.labels(dataset=dataset).inc(size)
 
 def write_csv(cli: Minio, bucket: str, key: str, df: pl.DataFrame) -> None:
-    buf = io.BytesIO()
-    df.write_csv(buf)
-    data = buf.getvalue()
-    cli.put_object(
-        bucket,
-        key,
-        data=io.BytesIO(data),
-        length=len(data),
-        content_type="text/csv; charset=utf-8",
-    )
+    write_frame(cli, bucket, key, df, "csv")
+
+def write_parts(
+    cli: Minio,
+    bucket: str,
+    key: str,
+    parts: List[str],
+    fmt: str = "csv",
+    dataset: str = "merged",
+) -> None:
+    """
+    Stream local parquet parts (one per partition, in order) into a single
+    output object without collecting them: the streaming engine sinks them
+    to a temp file, which is then uploaded in parts.
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"write_parts: unknown output format {fmt!r}")
+    ext, content_type = OUTPUT_FORMATS[fmt]
+
+    lf = pl.concat([pl.scan_parquet(p) for p in parts], how="diagonal_relaxed")
+    with tempfile.TemporaryDirectory(prefix="xform-out-") as tmp:
+        path = os.path.join(tmp, f"out.{ext}")
+        with stage_timer("serialize", dataset):
+            if fmt == "parquet":
+                lf.sink_parquet(path, compression="zstd")
+            elif fmt == "arrow":
+                lf.sink_ipc(path, compression="zstd", compat_level=pl.CompatLevel.oldest())
+            else:
+                lf.sink_csv(path)
+        with stage_timer("upload", dataset):
+            cli.fput_object(bucket, key, path, content_type=content_type, part_size=UPLOAD_PART_SIZE)
+        TRANSFORMER_BYTES_WRITTEN_TOTAL.labels(dataset=dataset).inc(os.path.getsize(path))
 # ---------------------------------
 # Load & merge
 # ---------------------------------
-def _keys_for_corr(cli: Minio, bucket: str, prefix: str, dataset_alias: str, corr: str) -> List[str]:
-    """Extractor writes year partitions; filter corr across them."""
+def _objects_for_corr(
+    cli: Minio,
+    bucket: str,
+    prefix: str,
+    dataset_alias: str,
+    corr: str,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Raw objects of one dataset for a corr, as {key, bytes, rows, etag} dicts.
+    Uses the manifest's object list when it has one, so the cost is the size
+    of this run; otherwise uses the compacted index if the corr has one, and
+    failing that lists the dataset prefix and filters on the corr. A manifest
+    with skipped_pages (a redelivery that skipped pages an earlier attempt
+    wrote) doesn't list every page, so that case lists too.
+    """
+    if manifest is None:
+        manifest = read_compacted_index(cli, bucket, corr)
+    if manifest and manifest.get("objects") is not None and not manifest.get("skipped_pages"):
+        objs = [
+            {"key": o["key"], "bytes": o.get("bytes"), "rows": o.get("rows"), "etag": o.get("etag")}
+            for o in manifest["objects"]
+            if o.get("alias") == dataset_alias
+        ]
+        return sorted(objs, key=lambda o: o["key"])
+
+    # Extractor writes year partitions; filter corr across them.
     base = f"{prefix}/{dataset_alias}/"
-    keys = list_objects_recursive(cli, bucket, base)
     needle = f"/corr={corr}/"
-    return [k for k in keys if (k.endswith(".json.gz") or k.endswith(".json")) and needle in k]
+    out = []
+    for obj in cli.list_objects(bucket, prefix=base, recursive=True):
+        k = obj.object_name
+        if getattr(obj, "is_dir", False) or needle not in k:
+            continue
+        if k.endswith(RAW_SUFFIXES):
+            out.append({"key": k, "bytes": obj.size, "rows": None, "etag": obj.etag})
+    return out
+
+def _keys_for_corr(
+    cli: Minio,
+    bucket: str,
+    prefix: str,
+    dataset_alias: str,
+    corr: str,
+    manifest: Optional[Dict[str, Any]] = None,
+) -> List[str]:
+    return [o["key"] for o in _objects_for_corr(cli, bucket, prefix, dataset_alias, corr, manifest)]
+
+def _partition_year(key: str) -> str:
+    for seg in key.split("/"):
+        if seg.startswith("year="):
+            return seg[len("year="):]
+    return ""
+
+def plan_partitions(
+    objs_by_alias: Dict[str, List[Dict[str, Any]]],
+    budget: int = MEMORY_BUDGET_BYTES,
+) -> Optional[List[Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Split a corr's objects into year= partitions when loading it whole would
+    blow the memory budget; None means the corr fits and runs eagerly.
+    The extractor files enrichment rows under their crash's year, so every
+    partition joins on its own.
+    """
+    raw = sum(o.get("bytes") or 0 for objs in objs_by_alias.values() for o in objs)
+    if budget <= 0 or raw * RAW_EXPANSION <= budget:
+        return None
+    years = sorted({_partition_year(o["key"]) for objs in objs_by_alias.values() for o in objs})
+    if len(years) < 2:
+        return None
+    logging.info(f"~{raw * RAW_EXPANSION >> 20} MiB estimated > budget {budget >> 20} MiB; "
+                 f"transforming {len(years)} year partitions one at a time")
+    return [
+        {a: [o for o in objs if _partition_year(o["key"]) == y] for a, objs in objs_by_alias.items()}
+        for y in years
+    ]
+
+def check_manifest(manifest: Optional[Dict[str, Any]], corr: str) -> None:
+    """Log (or refuse, with REQUIRE_COMPLETE_CORR=true) corrs the extractor didn't finish cleanly."""
+    if manifest is None:
+        logging.warning(f"No manifest for corr={corr}; listing raw prefixes instead")
+        return
+    if manifest.get("objects") is None:
+        logging.warning(f"Manifest for corr={corr} has no object list; listing raw prefixes instead")
+        return
+    if manifest.get("skipped_pages"):
+        logging.warning(f"Manifest for corr={corr} skipped {manifest['skipped_pages']} pages "
+                        f"an earlier attempt wrote; listing raw prefixes instead")
+    if not manifest.get("complete", False):
+        if REQUIRE_COMPLETE:
+            raise ValueError(f"corr={corr} is incomplete (extractor reported failed pages)")
+        logging.warning(f"corr={corr} is incomplete (extractor reported failed pages); transforming what exists")
+
+SOURCE_COL = "_src"   # raw object key a row was loaded from (page partials)
+ROW_COL    = "_row"   # position within the partial, to restore load order
+
+def load_datasets(
+    cli: Minio,
+    raw_bucket: str,
+    prefix: str,
+    aliases: Iterable[str],
+    corr: str,
+    workers: int = FETCH_WORKERS,
+    manifest: Optional[Dict[str, Any]] = None,
+    objects: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> Dict[str, pl.DataFrame]:
+    """
+    Fetch + decode the raw pages of several datasets for one corr at once.
+    All pages share one bounded worker pool and decode straight into
+    columnar frames (only the manifest's select fields are kept); pages are
+    stitched back in per-alias key order so the result matches a serial load.
+    `objects` (alias -> _objects_for_corr entries) skips the listing step;
+    entries carrying a "corr" key tag their rows with it in CORR_COL, and
+    entries with "tag_source" set tag theirs with the object key in SOURCE_COL.
+    """
+    aliases = list(aliases)
+    objs_by_alias = {}
+    for a in aliases:
+        if objects is not None:
+            objs_by_alias[a] = objects.get(a, [])
+            continue
+        with stage_timer("list", a):
+            objs_by_alias[a] = _objects_for_corr(cli, raw_bucket, prefix, a, corr, manifest)
+    keys_by_alias = {a: [o["key"] for o in objs] for a, objs in objs_by_alias.items()}
+    columns_by_alias = {a: select_columns(manifest, a) for a in aliases}
+    pages: Dict[str, List[Optional[pl.DataFrame]]] = {
+        a: [None for _ in keys] for a, keys in keys_by_alias.items()
+    }
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fetch") as pool:
+        futures = {
+            pool.submit(read_page_frame, cli, raw_bucket, o["key"], columns_by_alias[a], a, o.get("etag")): (a, i)
+            for a, objs in objs_by_alias.items()
+            for i, o in enumerate(objs)
+        }
+        try:
+            for fut in as_completed(futures):
+                a, i = futures[fut]
+                page = fut.result()
+                o = objs_by_alias[a][i]
+                if o.get("corr") is not None and page.height > 0:
+                    page = page.with_columns(pl.lit(o["corr"], dtype=pl.Utf8).alias(CORR_COL))
+                if o.get("tag_source") and page.height > 0:
+                    page = page.with_columns(pl.lit(o["key"], dtype=pl.Utf8).alias(SOURCE_COL))
+                pages[a][i] = page
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
+
+    out: Dict[str, pl.DataFrame] = {}
+    for a in aliases:
+        frames = [f for f in pages[a] if f is not None and f.height > 0]
+        with stage_timer("concat", a):
+            df = pl.concat(frames, how="diagonal_relaxed", rechunk=True) if frames else pl.DataFrame()
+        pages[a] = []  # let the per-page frames go as soon as they're stitched
+        with stage_timer("schema", a):
+            df = pin_schema(df, a)
+        logging.info(f"Loaded {a}: {len(keys_by_alias[a])} objects, {df.height} rows")
+        expected = [o["rows"] for o in objs_by_alias[a]]
+        if expected and None not in expected and sum(expected) != df.height:
+            logging.warning(f"{a}: manifest lists {sum(expected)} rows but {df.height} were decoded")
+        out[a] = df
+    return out
 
-def load_dataset(cli: Minio, raw_bucket: str, prefix: str, dataset_alias: str, corr: str) -> pl.DataFrame:
-    keys = _keys_for_corr(cli, raw_bucket, prefix, dataset_alias, corr)
-    rows_all: List[Dict[str, Any]] = []
-    for k in keys:
-        rows = read_json_gz_array(cli, raw_bucket, k)
-        if rows:
-            rows_all.extend(rows)
-    return pl.DataFrame(rows_all) if rows_all else pl.DataFrame()
+def pin_schema(df: pl.DataFrame, dataset_alias: str) -> pl.DataFrame:
+    """
+    Cast the declared columns of a freshly decoded dataset to their pinned
+    dtypes; columns that already have them (compacted parquet) are left
+    alone. Values that don't parse become null and are counted per column
+    in transformer_schema_mismatches_total.
+    """
+    declared = DATASET_SCHEMAS.get(dataset_alias, {})
+    todo = {c: t for c, t in declared.items() if c in df.columns and df.schema[c] != t}
+    if df.is_empty() or not todo:
+        return df
+    cast = {c: pl.col(c).cast(t, strict=False) for c, t in todo.items()}
+    bad = df.select([
+        (pl.col(c).is_not_null() & expr.is_null()).sum().alias(c) for c, expr in cast.items()
+    ]).row(0, named=True)
+    for c, n in bad.items():
+        if n:
+            TRANSFORMER_SCHEMA_MISMATCHES_TOTAL.labels(dataset=dataset_alias, column=c).inc(n)
+            logging.warning(f"{dataset_alias}.{c}: {n} value(s) are not {todo[c]}; loaded as null")
+    return df.with_columns([expr.alias(c) for c, expr in cast.items()])
+
+def load_dataset(
+    cli: Minio,
+    raw_bucket: str,
+    prefix: str,
+    dataset_alias: str,
+    corr: str,
+    manifest: Optional[Dict[str, Any]] = None,
+    workers: int = FETCH_WORKERS,
+) -> pl.DataFrame:
+    return load_datasets(cli, raw_bucket, prefix, [dataset_alias], corr,
+                         workers=workers, manifest=manifest)[dataset_alias]
+
+# 64-bit content fingerprint carried into gold; the cleaner's MERGE compares it
+# instead of every column. It's blake2b over a canonical text of the row (see
+# _row_text), so it only changes when a value does: not with the polars
+# version, the machine, or a column's integer width.
+ROW_HASH_COL  = "row_hash"
+
+def _field_text(e: pl.Expr, dtype: pl.DataType) -> pl.Expr:
+    """One value as "<bytes>:<text>", or "~" for null (so null, "" and [] all differ)."""
+    if isinstance(dtype, (pl.List, pl.Array)):
+        # elements encoded the same way, so no element text can fake a boundary
+        text = e.list.eval(_field_text(pl.element(), dtype.inner)).list.join("")
+    elif dtype.is_temporal():
+        text = e.to_physical().cast(pl.Utf8)
+    else:
+        text = e.cast(pl.Utf8)
+    return pl.concat_str([text.str.len_bytes().cast(pl.Utf8), pl.lit(":"), text]).fill_null("~")
+
+def _row_text(df: pl.DataFrame, columns: List[str]) -> pl.Series:
+    """The given columns of each row as one canonical string (floats by their exact bits)."""
+    exprs = []
+    for c in columns:
+        dtype = df.schema[c]
+        if dtype == pl.Null:
+            exprs.append(pl.lit("~"))
+            continue
+        if dtype.is_float():
+            # float formatting can change between versions; the IEEE bits can't
+            bits = array.array("q", array.array("d", df[c].cast(pl.Float64).fill_null(0.0).to_list()).tobytes())
+            bits = pl.Series(c, bits, dtype=pl.Int64)
+            exprs.append(_field_text(pl.when(pl.col(c).is_null()).then(None).otherwise(pl.lit(bits)), pl.Int64))
+            continue
+        exprs.append(_field_text(pl.col(c), dtype))
+    return df.select(pl.concat_str(exprs).alias("_row_text")).to_series()
+
+def row_hashes(df: pl.DataFrame, columns: List[str]) -> pl.Series:
+    """blake2b-64 of each row's canonical text, as Int64 so it survives CSV and DuckDB BIGINT."""
+    digests = array.array("q", b"".join(
+        [hashlib.blake2b(t, digest_size=8).digest() for t in _row_text(df, columns).cast(pl.Binary).to_list()]
+    ))
+    if sys.byteorder == "big":
+        digests.byteswap()   # read as little-endian everywhere
+    return pl.Series(ROW_HASH_COL, digests, dtype=pl.Int64)
+
+def add_row_hash(df: pl.DataFrame) -> pl.DataFrame:
+    if df.is_empty():
+        return df
+    cols = [c for c in df.columns if c != ROW_HASH_COL]
+    return df.with_columns(row_hashes(df, cols))
 
 def basic_standardize(df: pl.DataFrame) -> pl.DataFrame:
     if df.is_empty():
         return df
     df = df.rename({c: c.strip().lower() for c in df.columns})
+    # exact-duplicate rows, compared in full
     return df.unique(maintain_order=True)
 
 def aggregate_many_to_one(
     df: pl.DataFrame,
     id_col: str,
     prefix: str,
-    include: List[str]
+    include: List[str],
+    state: Optional[AggStateStore] = None,
+    corr: Optional[str] = None,
+    batch_col: Optional[str] = None,
 ) -> pl.DataFrame:
+    """
+    One row per id: `<prefix>_count` plus a sorted-unique `<prefix>_<c>_list`
+    per included column. With a `state` store, this corr's aggregates are
+    recorded and merged with what earlier corrs saw for the same ids.
+    With `batch_col` (rows of several corrs), the key is (batch_col, id) and
+    each corr is merged into the state under its own name.
+    """
     if df.is_empty():
         return df
 
+    keys = [batch_col, id_col] if batch_col else [id_col]
+    aggs = _agg_exprs(df.columns, prefix, include)
+    with stage_timer("aggregate", prefix):
+        agg = df.group_by(keys, maintain_order=True).agg(aggs)
+    if state is not None and batch_col:
+        with stage_timer("agg_state", prefix):
+            agg = pl.concat([
+                state.merge(part.drop(batch_col), id_col, prefix, c)
+                .with_columns(pl.lit(c, dtype=pl.Utf8).alias(batch_col))
+                .select(agg.columns)
+                for (c,), part in agg.partition_by(batch_col, as_dict=True, maintain_order=True).items()
+            ], how="diagonal_relaxed")
+    elif state is not None and corr:
+        with stage_timer("agg_state", prefix):
+            agg = state.merge(agg, id_col, prefix, corr)
+    return agg
+
+def _agg_exprs(columns: List[str], prefix: str, include: List[str]) -> List[pl.Expr]:
     aggs = [pl.len().alias(f"{prefix}_count")]
     for c in include:
-        if c in df.columns:
+        if c in columns:
             aggs.append(
                 pl.col(c)
                 .drop_nulls()
@@ -173,58 +902,269 @@ def aggregate_many_to_one(
         else:
             # ensure predictable header even if column missing
             aggs.append(pl.lit(None).alias(f"{prefix}_{c}_list"))
+    return aggs
 
-    return df.group_by(id_col, maintain_order=True).agg(aggs)
+VEH_FIELDS = ["unit_no","make","model","vehicle_year","maneuver","vehicle_defect","vehicle_use"]
+PPL_FIELDS = ["person_id","person_type","age","sex","injury_classification","safety_equipment","airbag_deployed"]
 
 def merge_crash_vehicles_people(
     crashes: pl.DataFrame,
     vehicles: pl.DataFrame,
     people: pl.DataFrame,
-    id_col: str
+    id_col: str,
+    state: Optional[AggStateStore] = None,
+    corr: Optional[str] = None,
+    batch_col: Optional[str] = None,
 ) -> pl.DataFrame:
-    crashes = basic_standardize(crashes)
-    vehicles = basic_standardize(vehicles)
-    people   = basic_standardize(people)
-
+    """
+    Crashes left-joined with per-crash vehicle / people aggregates.
+    `batch_col` merges several corrs at once, keyed on (batch_col, id).
+    """
     id_lower = id_col.lower()
-
-    def _ensure_id(df: pl.DataFrame) -> pl.DataFrame:
-        if df.is_empty() or id_lower in df.columns:
-            return df
-        for c in df.columns:
-            if c.lower() == id_lower:
-                return df.rename({c: id_lower})
-        return df
-
-    crashes  = _ensure_id(crashes)
-    vehicles = _ensure_id(vehicles)
-    people   = _ensure_id(people)
+    crashes  = _ensure_id(basic_standardize(crashes), id_lower)
+    vehicles = _ensure_id(basic_standardize(vehicles), id_lower)
+    people   = _ensure_id(basic_standardize(people), id_lower)
 
     if not crashes.is_empty() and id_lower not in crashes.columns:
         # nothing to join on; return standardized crashes
         return crashes
 
-    veh_fields = ["unit_no","make","model","vehicle_year","maneuver","vehicle_defect","vehicle_use"]
-    ppl_fields = ["person_id","person_type","age","sex","injury_classification","safety_equipment","airbag_deployed"]
+    keys = [batch_col, id_lower] if batch_col else [id_lower]
 
-    veh_agg = aggregate_many_to_one(vehicles, id_lower, prefix="veh", include=veh_fields) \
+    veh_agg = aggregate_many_to_one(vehicles, id_lower, prefix="veh", include=VEH_FIELDS,
+                                    state=state, corr=corr, batch_col=batch_col) \
         if (not vehicles.is_empty() and id_lower in vehicles.columns) else pl.DataFrame()
 
-    ppl_agg = aggregate_many_to_one(people, id_lower, prefix="ppl", include=ppl_fields) \
+    ppl_agg = aggregate_many_to_one(people, id_lower, prefix="ppl", include=PPL_FIELDS,
+                                    state=state, corr=corr, batch_col=batch_col) \
         if (not people.is_empty() and id_lower in people.columns) else pl.DataFrame()
 
 
-    out = crashes
-    if not veh_agg.is_empty():
-        out = out.join(veh_agg, on=id_lower, how="left")
-    if not ppl_agg.is_empty():
-        out = out.join(ppl_agg, on=id_lower, how="left")
+    return _join_aggregates(crashes, veh_agg, ppl_agg, keys)
+
+def _ensure_id(df: pl.DataFrame, id_lower: str) -> pl.DataFrame:
+    if df.is_empty() or id_lower in df.columns:
+        return df
+    for c in df.columns:
+        if c.lower() == id_lower:
+            return df.rename({c: id_lower})
+    return df
+
+def _join_aggregates(crashes: pl.DataFrame, veh_agg: pl.DataFrame, ppl_agg: pl.DataFrame,
+                     keys: List[str]) -> pl.DataFrame:
+    with stage_timer("join"):
+        out = crashes
+        if not veh_agg.is_empty():
+            out = out.join(veh_agg, on=keys, how="left")
+        if not ppl_agg.is_empty():
+            out = out.join(ppl_agg, on=keys, how="left")
+
+        return out.unique(subset=keys, keep="first", maintain_order=True)
+
+def _standardize_lazy(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """basic_standardize for a LazyFrame (the id column is lower-cased with the rest)."""
+    names = [c.strip().lower() for c in lf.collect_schema().names()]
+    lf = lf.rename(dict(zip(lf.collect_schema().names(), names)))
+    return lf.unique(maintain_order=True)
+
+def merge_partition_lazy(
+    crashes: pl.DataFrame,
+    vehicles: pl.DataFrame,
+    people: pl.DataFrame,
+    id_col: str,
+    state: Optional[AggStateStore] = None,
+    corr: Optional[str] = None,
+) -> pl.DataFrame:
+    """
+    merge_crash_vehicles_people for one year= partition, as a single lazy plan
+    run on the streaming engine. Without a state store, enrichment rows are
+    semi-joined to this partition's crash ids before they're aggregated.
+    """
+    id_lower = id_col.lower()
+    out = _standardize_lazy(crashes.lazy())
+    if id_lower not in out.collect_schema().names():
+        return out.collect(engine="streaming")
+    ids = out.select(id_lower)
 
-    return out.unique(subset=[id_lower], keep="first", maintain_order=True)
+    for df, prefix, include in ((vehicles, "veh", VEH_FIELDS), (people, "ppl", PPL_FIELDS)):
+        if df.is_empty():
+            continue
+        lf = _standardize_lazy(df.lazy())
+        names = lf.collect_schema().names()
+        if id_lower not in names:
+            continue
+        if state is None:
+            # rows for crashes outside this partition can't join; drop them before grouping
+            lf = lf.join(ids, on=id_lower, how="semi")
+        agg = lf.group_by(id_lower, maintain_order=True).agg(_agg_exprs(names, prefix, include))
+        if state is not None and corr:
+            # the state store needs every row of the corr, so this side is materialized
+            with stage_timer("aggregate", prefix):
+                partial = agg.collect(engine="streaming")
+            with stage_timer("agg_state", prefix):
+                agg = state.merge(partial, id_lower, prefix, corr).lazy()
+        out = out.join(agg, on=id_lower, how="left", maintain_order="left")
+
+    with stage_timer("join"):
+        return out.unique(subset=[id_lower], keep="first", maintain_order=True).collect(engine="streaming")
+
+# ---------------------------------
+# Page partials (pipelined with the extractor)
+# ---------------------------------
+def build_page_partial(
+    cli: Minio,
+    raw_bucket: str,
+    corr: str,
+    objects: List[Dict[str, Any]],
+    manifest: Optional[Dict[str, Any]] = None,
+    id_col: str = "crash_record_id",
+) -> Dict[str, pl.DataFrame]:
+    """
+    One extractor page's share of merge_crash_vehicles_people: its crash rows
+    (tagged with object key and position, so stitching restores load order)
+    and per-crash vehicle / people aggregates, before agg state. Partials
+    combine to the single-pass result for any split of a corr's objects,
+    except that an enrichment row repeated in two partials counts twice.
+    """
+    id_lower = id_col.lower()
+    by_alias = {
+        a: sorted(({**o, "tag_source": a == "crashes"} for o in objects if o.get("alias") == a),
+                  key=lambda o: o["key"])
+        for a in DATASET_ALIASES
+    }
+    frames = load_datasets(cli, raw_bucket, PREFIX, DATASET_ALIASES, corr,
+                           manifest=manifest, objects=by_alias)
+
+    crashes = frames["crashes"]
+    if not crashes.is_empty():
+        crashes = crashes.rename({c: c.strip().lower() for c in crashes.columns})
+        crashes = _ensure_id(crashes, id_lower).with_row_index(ROW_COL)
+    out = {"crashes": crashes}
+    for alias, prefix, include in (("vehicles", "veh", VEH_FIELDS), ("people", "ppl", PPL_FIELDS)):
+        df = _ensure_id(basic_standardize(frames[alias]), id_lower)
+        if df.is_empty() or id_lower not in df.columns:
+            out[prefix] = pl.DataFrame()
+            continue
+        with stage_timer("aggregate", prefix):
+            out[prefix] = df.group_by(id_lower, maintain_order=True).agg(_agg_exprs(df.columns, prefix, include))
+    return out
+
+def _combine_aggregates(parts: List[pl.DataFrame], id_col: str, prefix: str) -> pl.DataFrame:
+    frames = [p for p in parts if not p.is_empty()]
+    if not frames:
+        return pl.DataFrame()
+    df = pl.concat(frames, how="diagonal_relaxed")
+    null_cols = [c for c, t in df.schema.items() if t == pl.Null]
+    df = df.with_columns([pl.col(c).cast(pl.List(pl.Utf8)) for c in null_cols])
+    with stage_timer("aggregate", prefix):
+        out = combine_partials(df, id_col, prefix)
+    # fields no page had stay untyped nulls, as in a single-pass aggregate
+    return out.with_columns([pl.lit(None).alias(c) for c in null_cols])
+
+def assemble_partials(
+    cli: Minio,
+    raw_bucket: str,
+    corr: str,
+    manifest: Optional[Dict[str, Any]],
+    store: PartialStore,
+    pages: Dict[str, List[str]],
+    state: Optional[AggStateStore] = None,
+    objects: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    id_col: str = "crash_record_id",
+) -> pl.DataFrame:
+    """
+    merge_crash_vehicles_people from pre-built page partials. Objects of the
+    corr that no usable partial covers (event still queued, lost, or built
+    from a different object list) are built here, so the result doesn't
+    depend on how far the page consumer got. `objects` is the corr's
+    alias -> _objects_for_corr listing, when the caller already has it.
+    """
+    id_lower = id_col.lower()
+    wanted: Dict[str, Dict[str, Any]] = {}
+    for a in DATASET_ALIASES:
+        objs = objects[a] if objects is not None else _objects_for_corr(cli, raw_bucket, PREFIX, a, corr, manifest)
+        for o in objs:
+            wanted[o["key"]] = {**o, "alias": a}
+
+    covered: set = set()
+    parts: List[Dict[str, pl.DataFrame]] = []
+    for page in sorted(pages, key=lambda p: (len(p), p)):
+        srcs = set(pages[page])
+        if not srcs <= wanted.keys() or srcs & covered:
+            logging.warning(f"page partial {page} of corr={corr} doesn't match its object list; rebuilding")
+            TRANSFORMER_PAGE_PARTIALS_TOTAL.labels(result="rejected").inc()
+            continue
+        covered |= srcs
+        with stage_timer("partial_read"):
+            parts.append(store.get(corr, page))
+    TRANSFORMER_PAGE_PARTIALS_TOTAL.labels(result="used").inc(len(parts))
+
+    rest = [o for k, o in wanted.items() if k not in covered]
+    if rest:
+        logging.info(f"corr={corr}: {len(rest)} of {len(wanted)} objects not pre-built; loading them now")
+        TRANSFORMER_PAGE_PARTIALS_TOTAL.labels(result="inline").inc()
+        parts.append(build_page_partial(cli, raw_bucket, corr, rest, manifest, id_col))
+
+    frames = [p["crashes"] for p in parts if not p["crashes"].is_empty()]
+    with stage_timer("concat", "crashes"):
+        crashes = pl.concat(frames, how="diagonal_relaxed") if frames else pl.DataFrame()
+    if crashes.is_empty() or id_lower not in crashes.columns:
+        return crashes.drop([c for c in (SOURCE_COL, ROW_COL) if c in crashes.columns])
+    crashes = crashes.sort([SOURCE_COL, ROW_COL], maintain_order=True).drop([SOURCE_COL, ROW_COL])
+
+    aggs = []
+    for prefix in ("veh", "ppl"):
+        agg = _combine_aggregates([p[prefix] for p in parts], id_lower, prefix)
+        if state is not None and not agg.is_empty():
+            with stage_timer("agg_state", prefix):
+                agg = state.merge(agg, id_lower, prefix, corr)
+        aggs.append(agg)
+    return _join_aggregates(crashes, aggs[0], aggs[1], [id_lower])
+
+def handle_page_event(msg: dict) -> None:
+    """Pre-build the partials of one extractor page (a "page" message on PAGE_EVENTS_QUEUE)."""
+    corr, raw_bucket, out_bucket, _ = _job_params(msg)
+    page = str(msg.get("page", ""))
+    objects = msg.get("objects") or []
+    cli = minio_client()
+    _ensure_bucket(cli, out_bucket)
+    with stage_timer("page_partial"):
+        frames = build_page_partial(cli, raw_bucket, corr, objects, {"selects": msg.get("selects")})
+        PartialStore(cli, out_bucket).put(corr, page, frames, [o["key"] for o in objects])
+    TRANSFORMER_PAGE_PARTIALS_TOTAL.labels(result="built").inc()
+    logging.info(f"Pre-built page {page} of corr={corr} ({len(objects)} objects, "
+                 f"{frames['crashes'].height} crashes)")
 
 # ---------------------------------
 # CSV safety (for nested/array/struct cols)
 # ---------------------------------
+# json.dumps(..., ensure_ascii=False) escapes exactly these characters
+_JSON_ESCAPE_FROM = ["\\", '"'] + [chr(i) for i in range(0x20)]
+_JSON_ESCAPE_TO = ["\\\\", '\\"'] + [
+    {"\b": "\\b", "\t": "\\t", "\n": "\\n", "\f": "\\f", "\r": "\\r"}.get(chr(i), f"\\u{i:04x}")
+    for i in range(0x20)
+]
+_JSON_SCALAR_LIST_INNER = (pl.Boolean, pl.Int8, pl.Int16, pl.Int32, pl.Int64,
+                           pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64)
+
+def _list_to_json_expr(name: str, inner: pl.DataType) -> Optional[pl.Expr]:
+    """
+    Native List -> JSON text, byte-identical to json.dumps(ensure_ascii=False).
+    Covers lists of strings, ints and bools; returns None for anything else.
+    """
+    if inner in (pl.Utf8, pl.String):
+        elem = pl.concat_str([
+            pl.lit('"'),
+            pl.element().str.replace_many(_JSON_ESCAPE_FROM, _JSON_ESCAPE_TO),
+            pl.lit('"'),
+        ])
+    elif inner in _JSON_SCALAR_LIST_INNER:
+        elem = pl.element().cast(pl.Utf8)
+    else:
+        return None
+    body = pl.col(name).list.eval(elem.fill_null(pl.lit("null"))).list.join(", ")
+    return pl.concat_str([pl.lit("["), body, pl.lit("]")]).alias(f"{name}_json")
+
 def make_csv_safe(df: pl.DataFrame) -> pl.DataFrame:
     if df.is_empty():
         return df
@@ -255,7 +1195,12 @@ def make_csv_safe(df: pl.DataFrame) -> pl.DataFrame:
 
     fixes, drop_cols = [], []
     for name, dtype in df.schema.items():
-        if isinstance(dtype, (pl.List, pl.Struct)) or dtype.__class__.__name__ == "Array":
+        native = _list_to_json_expr(name, dtype.inner) if isinstance(dtype, pl.List) else None
+        if native is not None:
+            fixes.append(native)
+            drop_cols.append(name)
+        elif isinstance(dtype, (pl.List, pl.Struct)) or dtype.__class__.__name__ == "Array":
+            # structs / nested lists / floats keep the per-row Python path
             fixes.append(
                 pl.col(name).map_elements(
                     lambda x: json.dumps(_jsonable(x), ensure_ascii=False),
@@ -270,45 +1215,208 @@ def make_csv_safe(df: pl.DataFrame) -> pl.DataFrame:
     return out.drop(drop_cols) if drop_cols else out
 
 # ---------------------------------
-# Transform runner (writes CSV)
+# Transform runner (writes CSV / Parquet / Arrow IPC)
 # ---------------------------------
-def run_transform_job(msg: dict):
-
-    start_time = time.time()
-
+def _job_params(msg: dict):
+    """(corr, raw_bucket, out_bucket, out_format) of a transform message."""
     corr       = msg.get("corr_id")
     raw_bucket = msg.get("raw_bucket", RAW_BUCKET)
     # prefer xform_bucket; fallback to clean_bucket; finally env
     out_bucket = msg.get("xform_bucket") or msg.get("clean_bucket") or XFORM_BUCKET_ENV
-    prefix = PREFIX
+    out_format = (msg.get("output_format") or OUTPUT_FORMAT).lower()
     if not corr or not out_bucket:
         raise ValueError("run_transform_job: missing corr_id or (xform_bucket|clean_bucket|XFORM_BUCKET)")
+    if out_format not in OUTPUT_FORMATS:
+        raise ValueError(f"run_transform_job: unknown output_format {out_format!r}")
+    return corr, raw_bucket, out_bucket, out_format
 
-    cli = minio_client()
-
-    # Ensure target bucket exists
+def _ensure_bucket(cli: Minio, bucket: str) -> None:
     try:
-        if not cli.bucket_exists(out_bucket):
-            cli.make_bucket(out_bucket)
+        if not cli.bucket_exists(bucket):
+            cli.make_bucket(bucket)
     except S3Error as e:
         if e.code not in {"BucketAlreadyOwnedByYou", "BucketAlreadyExists"}:
             raise
 
-    # Load raw pages (partitioned by year; filter by corr)
-    crashes_df  = load_dataset(cli, raw_bucket, prefix, "crashes",  corr)
-    vehicles_df = load_dataset(cli, raw_bucket, prefix, "vehicles", corr)
-    people_df   = load_dataset(cli, raw_bucket, prefix, "people",   corr)
+def silver_store(cli: Minio, out_bucket: str) -> Optional[SilverStore]:
+    if not SILVER_ENABLED:
+        return None
+    return SilverStore(cli, SILVER_BUCKET or out_bucket, compact_files=SILVER_COMPACT_FILES,
+                       claim_timeout=SILVER_COMPACT_CLAIM_TIMEOUT_S)
 
-    merged = merge_crash_vehicles_people(
-        crashes=crashes_df,
-        vehicles=vehicles_df,
-        people=people_df,
+def to_silver(silver: Optional[SilverStore], merged: pl.DataFrame, corr: str) -> List[str]:
+    """
+    Add a corr's merged rows to silver and compact the year partitions it
+    touched. Best effort: a failure is logged and counted, never raised.
+    Callers run it only once the corr's clean job is out (see defer_silver).
+    """
+    if silver is None or merged.is_empty():
+        return []
+    try:
+        with stage_timer("silver"):
+            written = silver.append(merged, corr)
+    except Exception:
+        logging.exception(f"corr={corr}: silver append failed; the merged output is unaffected")
+        TRANSFORMER_SILVER_WRITES_TOTAL.labels(result="failed").inc()
+        return []
+    TRANSFORMER_SILVER_WRITES_TOTAL.labels(result="ok").inc()
+    years = sorted({_partition_year(k) for k in written})
+    try:
+        with stage_timer("silver_compact"):
+            silver.compact(years)
+    except Exception:
+        logging.exception(f"corr={corr}: silver compaction failed; the next append retries it")
+        TRANSFORMER_SILVER_WRITES_TOTAL.labels(result="compact_failed").inc()
+    return years
+
+# Silver is fed after the clean hand-off: write_merged spills the corr's
+# native rows to local parquet, and publish_transform_result appends them
+# once the clean job is published (or drops them if the job failed).
+_SILVER_PENDING: Dict[str, List[str]] = {}   # corr -> spilled parquet paths
+_SILVER_PENDING_LOCK = threading.Lock()
+
+def defer_silver(silver: Optional[SilverStore], merged: pl.DataFrame, corr: str) -> None:
+    if silver is None or merged.is_empty():
+        return
+    fd, path = tempfile.mkstemp(prefix="silver-", suffix=".parquet")
+    os.close(fd)
+    merged.write_parquet(path)
+    with _SILVER_PENDING_LOCK:
+        _SILVER_PENDING.setdefault(corr, []).append(path)
+
+def _take_silver(corr: str) -> List[str]:
+    with _SILVER_PENDING_LOCK:
+        return _SILVER_PENDING.pop(corr, [])
+
+def flush_silver(cli: Minio, out_bucket: str, corr: str) -> None:
+    """Append what defer_silver held back for the corr; its clean job is out."""
+    paths = _take_silver(corr)
+    try:
+        silver = silver_store(cli, out_bucket)
+        for path in paths:
+            to_silver(silver, pl.read_parquet(path), corr)
+    finally:
+        for path in paths:
+            os.remove(path)
+
+def discard_silver(corr: Optional[str]) -> None:
+    """The corr's job failed before its hand-off; its redelivery writes silver again."""
+    for path in _take_silver(corr) if corr else []:
+        os.remove(path)
+
+def output_ready(df: pl.DataFrame, fmt: str) -> pl.DataFrame:
+    if fmt != "csv" or df.is_empty():
+        return df
+    with stage_timer("csv_safe"):
+        return make_csv_safe(df)
+
+def write_merged(
+    cli: Minio,
+    bucket: str,
+    key: str,
+    merged: pl.DataFrame,
+    fmt: str,
+    silver: Optional[SilverStore] = None,
+    corr: Optional[str] = None,
+):
+    """Fingerprint + serialize one corr's merged frame, holding its silver rows for after the hand-off; returns (rows, cols)."""
+    merged = add_row_hash(merged)
+    write_frame(cli, bucket, key, output_ready(merged, fmt), fmt)
+    defer_silver(silver, merged, corr)
+    return merged.height, merged.width
+
+def transform_partition(
+    cli: Minio,
+    raw_bucket: str,
+    corr: str,
+    manifest: Optional[Dict[str, Any]],
+    objs: Dict[str, List[Dict[str, Any]]],
+    state: Optional[AggStateStore] = None,
+) -> pl.DataFrame:
+    """Merge one year partition of a corr into fingerprinted rows (see output_ready for the hand-off)."""
+    frames = load_datasets(cli, raw_bucket, PREFIX, DATASET_ALIASES, corr,
+                           manifest=manifest, objects=objs)
+    part = merge_partition_lazy(
+        crashes=frames.pop("crashes"),
+        vehicles=frames.pop("vehicles"),
+        people=frames.pop("people"),
         id_col="crash_record_id",
+        state=state,
+        corr=corr,
     )
+    return add_row_hash(part)
+
+def run_transform_job(msg: dict):
+
+    start_time = time.time()
+
+    corr, raw_bucket, out_bucket, out_format = _job_params(msg)
+    prefix = PREFIX
+
+    cli = minio_client()
 
-    out_key = f"{prefix}/corr={corr}/merged.csv"
-    write_csv(cli, out_bucket, out_key, make_csv_safe(merged))
-    logging.info(f"Wrote s3://{out_bucket}/{out_key} (rows={merged.height}, cols={merged.width})")
+    # Ensure target bucket exists
+    _ensure_bucket(cli, out_bucket)
+
+    # Resolve the corr's pages from the extractor manifest (falls back to listing)
+    with stage_timer("manifest"):
+        manifest = read_manifest(cli, raw_bucket, corr)
+    check_manifest(manifest, corr)
+
+    objs_by_alias = {}
+    for a in DATASET_ALIASES:
+        with stage_timer("list", a):
+            objs_by_alias[a] = _objects_for_corr(cli, raw_bucket, prefix, a, corr, manifest)
+    state = AggStateStore(cli, out_bucket, shards=AGG_STATE_SHARDS) if AGG_STATE_ENABLED else None
+    silver = silver_store(cli, out_bucket)
+
+    ext, _ = OUTPUT_FORMATS[out_format]
+    out_key = f"{prefix}/corr={corr}/merged.{ext}"
+    partials = PartialStore(cli, out_bucket) if PAGE_EVENTS_QUEUE else None
+    pages = partials.pages(corr) if partials is not None else {}
+    partitions = None if pages else plan_partitions(objs_by_alias)
+
+    if pages:
+        # The page consumer pre-built this corr while it was being extracted
+        merged = assemble_partials(cli, raw_bucket, corr, manifest, partials, pages,
+                                   state=state, objects=objs_by_alias)
+        rows, cols = write_merged(cli, out_bucket, out_key, merged, out_format, silver, corr)
+    elif partitions is None:
+        # Load raw pages (partitioned by year; filter by corr) for all datasets concurrently
+        frames = load_datasets(cli, raw_bucket, prefix, DATASET_ALIASES, corr,
+                               manifest=manifest, objects=objs_by_alias)
+
+        merged = merge_crash_vehicles_people(
+            crashes=frames["crashes"],
+            vehicles=frames["vehicles"],
+            people=frames["people"],
+            id_col="crash_record_id",
+            state=state,
+            corr=corr,
+        )
+        rows, cols = write_merged(cli, out_bucket, out_key, merged, out_format, silver, corr)
+    else:
+        # Memory-bounded: one year at a time, each merged result spilled to a local parquet part
+        rows, cols = 0, 0
+        with tempfile.TemporaryDirectory(prefix="xform-parts-") as tmp:
+            parts = []
+            for i, objs in enumerate(partitions):
+                part = transform_partition(cli, raw_bucket, corr, manifest, objs, state)
+                if part.is_empty():
+                    continue
+                rows, cols = rows + part.height, max(cols, part.width)
+                path = os.path.join(tmp, f"part-{i:04d}.parquet")
+                output_ready(part, out_format).write_parquet(path)
+                parts.append(path)
+                # silver keeps native types; a csv part has its lists serialized
+                defer_silver(silver, part, corr)
+                del part
+
+            if parts:
+                write_parts(cli, out_bucket, out_key, parts, out_format)
+            else:
+                write_frame(cli, out_bucket, out_key, pl.DataFrame(), out_format)
+    logging.info(f"Wrote s3://{out_bucket}/{out_key} (rows={rows}, cols={cols})")
 
     # Update some promethus metrics
     TRANSFORM_JOBS_TOTAL.labels(status="success").inc()
@@ -317,50 +1425,353 @@ def run_transform_job(msg: dict):
 
     TRANSFORM_RUN_DURATION_SECONDS.observe(duration)
 
-    TRANSFORMER_ROWS_PROCESSED_TOTAL.inc(merged.height)
+    TRANSFORMER_ROWS_PROCESSED_TOTAL.inc(rows)
+
+    return out_bucket, out_key, out_format
+
+def run_transform_batch(msgs: List[dict]) -> List[Any]:
+    """
+    Transform several queued corrs in one pass: their pages share one fetch
+    pool, one decode per dataset and one aggregate/join keyed on (corr, id);
+    each corr still gets its own merged object. Corrs over the memory budget,
+    or whose select lists differ, run separately. Returns one entry per
+    message: the (out_bucket, out_key, out_format) result, or the exception.
+    """
+    results: List[Any] = [None] * len(msgs)
+    if len(msgs) == 1:
+        try:
+            results[0] = run_transform_job(msgs[0])
+        except Exception as e:
+            results[0] = e
+        return results
+
+    cli = minio_client()
+    # (raw_bucket, out_bucket, out_format, selects) -> corr -> {"idx", "manifest", "objects"}
+    groups: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+    seen: Dict[tuple, tuple] = {}   # (corr, raw_bucket, out_bucket, out_format) -> group key
+    for i, msg in enumerate(msgs):
+        try:
+            corr, raw_bucket, out_bucket, out_format = _job_params(msg)
+            target = (corr, raw_bucket, out_bucket, out_format)
+            if target in seen:
+                # same corr queued twice: transform once, answer both
+                groups[seen[target]][corr]["idx"].append(i)
+                continue
+
+            with stage_timer("manifest"):
+                manifest = read_manifest(cli, raw_bucket, corr)
+            check_manifest(manifest, corr)
+            objs_by_alias = {}
+            for a in DATASET_ALIASES:
+                with stage_timer("list", a):
+                    objs_by_alias[a] = _objects_for_corr(cli, raw_bucket, PREFIX, a, corr, manifest)
+            pre_built = bool(PAGE_EVENTS_QUEUE) and PartialStore(cli, out_bucket).has_pages(corr)
+            if pre_built or plan_partitions(objs_by_alias) is not None:
+                results[i] = run_transform_job(msg)
+                continue
+
+            key = (raw_bucket, out_bucket, out_format,
+                   json.dumps((manifest or {}).get("selects"), sort_keys=True))
+            groups.setdefault(key, {})[corr] = {"idx": [i], "manifest": manifest, "objects": objs_by_alias}
+            seen[target] = key
+        except Exception as e:
+            results[i] = e
+
+    for (raw_bucket, out_bucket, out_format, _), corrs in groups.items():
+        try:
+            for corr, res in _transform_corrs(cli, raw_bucket, out_bucket, out_format, corrs).items():
+                for i in corrs[corr]["idx"]:
+                    results[i] = res
+        except Exception:
+            # one bad corr shouldn't fail its neighbours: redo the group one message at a time
+            logging.exception(f"Batch of {len(corrs)} corrs failed; retrying them one by one")
+            for job in corrs.values():
+                for i in job["idx"]:
+                    try:
+                        results[i] = run_transform_job(msgs[i])
+                    except Exception as e:
+                        results[i] = e
+    return results
+
+def _transform_corrs(
+    cli: Minio,
+    raw_bucket: str,
+    out_bucket: str,
+    out_format: str,
+    corrs: Dict[str, Dict[str, Any]],
+) -> Dict[str, tuple]:
+    start_time = time.time()
+    _ensure_bucket(cli, out_bucket)
+
+    objects = {
+        a: [dict(o, corr=corr) for corr, job in corrs.items() for o in job["objects"][a]]
+        for a in DATASET_ALIASES
+    }
+    manifest = next(iter(corrs.values()))["manifest"]   # the group shares one select list
+    frames = load_datasets(cli, raw_bucket, PREFIX, DATASET_ALIASES, ",".join(corrs),
+                           manifest=manifest, objects=objects)
 
-    return out_bucket, out_key
+    merged = merge_crash_vehicles_people(
+        crashes=frames["crashes"],
+        vehicles=frames["vehicles"],
+        people=frames["people"],
+        id_col="crash_record_id",
+        state=AggStateStore(cli, out_bucket, shards=AGG_STATE_SHARDS) if AGG_STATE_ENABLED else None,
+        batch_col=CORR_COL,
+    )
+    by_corr = merged.partition_by(CORR_COL, as_dict=True, maintain_order=True) \
+        if CORR_COL in merged.columns else {}
+
+    ext, _ = OUTPUT_FORMATS[out_format]
+    silver = silver_store(cli, out_bucket)
+    out: Dict[str, tuple] = {}
+    for corr in corrs:
+        part = by_corr.get((corr,))
+        part = part.drop(CORR_COL) if part is not None else pl.DataFrame()
+        out_key = f"{PREFIX}/corr={corr}/merged.{ext}"
+        rows, cols = write_merged(cli, out_bucket, out_key, part, out_format, silver, corr)
+        logging.info(f"Wrote s3://{out_bucket}/{out_key} (rows={rows}, cols={cols}, batch={len(corrs)})")
+        TRANSFORM_JOBS_TOTAL.labels(status="success").inc()
+        TRANSFORMER_ROWS_PROCESSED_TOTAL.inc(rows)
+        out[corr] = (out_bucket, out_key, out_format)
+
+    TRANSFORM_RUN_DURATION_SECONDS.observe(time.time() - start_time)
+    TRANSFORMER_BATCH_SIZE.observe(len(corrs))
+    return out
 
 # ---------------------------------
-# Publish clean job
+# Publish jobs
 # ---------------------------------
 
-def publish_clean_job(job_id: str, bucket: str, file: str, corr_id: str):
+class JobPublisher:
     """
-    Publishes a clean job to RabbitMQ for the cleaner service to consume.
+    Long-lived publisher for one queue (clean jobs, transform shards, the
+    compactor's forwards): one BlockingConnection and one confirm-mode
+    channel reused across jobs, reopened after a failure.
+    BlockingConnection isn't thread-safe, so every call holds the lock.
+    Connections and publish outcomes are counted per queue.
     """
-    try:
-        # Use same connection pattern as your transformer
-        params = pika.URLParameters(RABBIT_URL)
-        connection = pika.BlockingConnection(params)
-        channel = connection.channel()
-        channel.queue_declare(queue=CLEAN_QUEUE, durable=True)
-
-        message = {
-            "type": "clean",        # helps the cleaner filter
-            "job_id": job_id,
-            "bucket": bucket,       # e.g. your XFORM_BUCKET_ENV
-            "file": file,           # e.g. "prefix/corr=abcd1234/merged.csv"
-            "corr_id": corr_id
-        }
 
-        channel.basic_publish(
-            exchange="",
-            routing_key=CLEAN_QUEUE,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
+    def __init__(self, url: str, queue: str):
+        self._url = url
+        self._queue = queue
+        self._conn = None
+        self._ch = None
+        self._lock = threading.Lock()
+
+    def _channel(self):
+        if self._ch is not None and self._ch.is_open and self._conn.is_open:
+            TRANSFORMER_CONNECTION_REUSE_TOTAL.labels(client="amqp", queue=self._queue).inc()
+            return self._ch
+        self._close()
+        self._conn = pika.BlockingConnection(pika.URLParameters(self._url))
+        self._ch = self._conn.channel()
+        self._ch.queue_declare(queue=self._queue, durable=True)
+        self._ch.confirm_delivery()
+        TRANSFORMER_AMQP_CONNECTIONS_OPENED_TOTAL.labels(queue=self._queue).inc()
+        return self._ch
+
+    def _close(self):
+        try:
+            if self._conn is not None and self._conn.is_open:
+                self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+        self._ch = None
+
+    def publish(self, message: dict, attempts: int = 2) -> None:
+        """Publish persistently and wait for the broker's confirm; retry once on a dropped connection."""
+        body = json.dumps(message)
+        with self._lock:
+            for attempt in range(1, attempts + 1):
+                try:
+                    self._channel().basic_publish(
+                        exchange="",
+                        routing_key=self._queue,
+                        body=body,
+                        properties=pika.BasicProperties(delivery_mode=2),
+                        mandatory=True,
+                    )
+                    TRANSFORMER_PUBLISH_TOTAL.labels(queue=self._queue, result="confirmed").inc()
+                    return
+                except (pika.exceptions.UnroutableError, pika.exceptions.NackError):
+                    TRANSFORMER_PUBLISH_TOTAL.labels(queue=self._queue, result="nacked").inc()
+                    raise
+                except pika.exceptions.AMQPError:
+                    self._close()
+                    if attempt == attempts:
+                        TRANSFORMER_PUBLISH_TOTAL.labels(queue=self._queue, result="failed").inc()
+                        raise
+                    logging.info("Publisher connection dropped; reconnecting")
+
+    def keepalive(self) -> None:
+        """Service heartbeats on an idle connection so the broker doesn't drop it between jobs."""
+        with self._lock:
+            if self._conn is None or not self._conn.is_open:
+                return
+            try:
+                self._conn.process_data_events(time_limit=0)
+            except pika.exceptions.AMQPError:
+                self._close()
 
-        logging.info(f"✅ Published clean job: {message}")
+    def close(self) -> None:
+        with self._lock:
+            self._close()
 
+CLEAN_PUBLISHER = JobPublisher(RABBIT_URL, CLEAN_QUEUE)
+
+def publish_clean_job(job_id: str, bucket: str, file: str, corr_id: str, fmt: str = "csv"):
+    """
+    Publishes a clean job to RabbitMQ for the cleaner service to consume.
+    """
+    message = {
+        "type": "clean",        # helps the cleaner filter
+        "job_id": job_id,
+        "bucket": bucket,       # e.g. your XFORM_BUCKET_ENV
+        "file": file,           # e.g. "prefix/corr=abcd1234/merged.csv"
+        "corr_id": corr_id,
+        "format": fmt           # csv | parquet | arrow (cleaner defaults to csv)
+    }
+    try:
+        CLEAN_PUBLISHER.publish(message)
+        logging.info(f"✅ Published clean job: {message}")
     except Exception as e:
         logging.error(f"Failed to publish clean job: {e}")
         raise
-    finally:
-        try:
-            connection.close()
-        except Exception:
-            pass
+
+
+# ---------------------------------
+# Year shards
+# ---------------------------------
+SHARD_PUBLISHER = JobPublisher(RABBIT_URL, TRANSFORM_QUEUE)
+
+def coordinate_shards(msg: dict) -> bool:
+    """
+    Split a big multi-year corr into one transform_shard message per year=
+    partition, so idle replicas pick them up in parallel. Returns False
+    (run the corr as usual) when sharding is off or doesn't apply.
+    """
+    if not TRANSFORM_SHARD_YEARS:
+        return False
+    corr, raw_bucket, out_bucket, out_format = _job_params(msg)
+    if AGG_STATE_ENABLED:
+        # shards of one corr would read-modify-write the same state shards from several replicas
+        logging.info(f"corr={corr}: not sharding while AGG_STATE_ENABLED=true")
+        return False
+
+    cli = minio_client()
+    _ensure_bucket(cli, out_bucket)
+    if PAGE_EVENTS_QUEUE and PartialStore(cli, out_bucket).has_pages(corr):
+        return False   # already pre-built page by page; assembly is cheap
+    with stage_timer("manifest"):
+        manifest = read_manifest(cli, raw_bucket, corr)
+    check_manifest(manifest, corr)
+
+    keys = [o for a in DATASET_ALIASES for o in _objects_for_corr(cli, raw_bucket, PREFIX, a, corr, manifest)]
+    years = sorted({_partition_year(o["key"]) for o in keys})
+    raw = sum(o.get("bytes") or 0 for o in keys)
+    if len(years) < 2 or "" in years or raw < TRANSFORM_SHARD_MIN_BYTES:
+        return False
+
+    plan_id = uuid.uuid4().hex[:12]
+    shard = {**msg, "type": "transform_shard", "plan_id": plan_id, "raw_bucket": raw_bucket,
+             "xform_bucket": out_bucket, "output_format": out_format}
+    ShardStore(cli, out_bucket).put_plan(corr, plan_id, {
+        "corr": corr, "job_id": msg.get("job_id"), "years": years, "raw_bytes": raw,
+        "raw_bucket": raw_bucket, "xform_bucket": out_bucket, "output_format": out_format,
+    })
+    for year in years:
+        SHARD_PUBLISHER.publish({**shard, "year": year})
+    TRANSFORMER_SHARDS_TOTAL.labels(result="planned").inc(len(years))
+    logging.info(f"corr={corr}: {raw >> 20} MiB raw over {len(years)} years -> shard plan {plan_id}")
+    return True
+
+def run_transform_shard(msg: dict) -> None:
+    """Transform one year of a sharded corr; the shard that completes the plan combines it."""
+    start_time = time.time()
+    corr, raw_bucket, out_bucket, out_format = _job_params(msg)
+    plan_id, year = msg.get("plan_id"), msg.get("year")
+    cli = minio_client()
+    shards = ShardStore(cli, out_bucket)
+    plan = shards.get_plan(corr, plan_id)
+    if plan is None or year not in plan.get("years", []):
+        raise ValueError(f"transform_shard: corr={corr} has no plan {plan_id!r} with year {year!r}")
+
+    if year in shards.done(corr, plan_id):
+        # redelivered after the part was stored; only the combine step may be left
+        TRANSFORMER_SHARDS_TOTAL.labels(result="redelivered").inc()
+    else:
+        with stage_timer("manifest"):
+            manifest = read_manifest(cli, raw_bucket, corr)
+        objs = {
+            a: [o for o in _objects_for_corr(cli, raw_bucket, PREFIX, a, corr, manifest)
+                if _partition_year(o["key"]) == year]
+            for a in DATASET_ALIASES
+        }
+        part = transform_partition(cli, raw_bucket, corr, manifest, objs)
+        done = shards.put_part(corr, plan_id, year, output_ready(part, out_format))
+        logging.info(f"corr={corr} plan={plan_id} year={year}: {done['rows']} rows")
+        TRANSFORMER_SHARDS_TOTAL.labels(result="done").inc()
+        TRANSFORMER_ROWS_PROCESSED_TOTAL.inc(done["rows"])
+        TRANSFORM_RUN_DURATION_SECONDS.observe(time.time() - start_time)
+        finalize_shards(cli, shards, plan, plan_id)
+        # after the part (and, for the last shard, the clean job) is handed off
+        to_silver(silver_store(cli, out_bucket), part, corr)
+        return
+
+    finalize_shards(cli, shards, plan, plan_id)
+
+def finalize_shards(cli: Minio, shards: ShardStore, plan: Dict[str, Any], plan_id: str) -> bool:
+    """
+    Once every year of the plan is done, stream the parts (in year order)
+    into the corr's merged object and publish its one clean job. Shards
+    finishing together race for an atomic claim on final.json; only the
+    winner combines. Losing the claim, or finding the parts already gone
+    (a stale claim was taken over), means another replica has it: that is
+    success, not an error. Returns True if this call combined the plan.
+    """
+    corr, out_bucket, out_format = plan["corr"], plan["xform_bucket"], plan["output_format"]
+    done = shards.done(corr, plan_id)
+    missing = [y for y in plan["years"] if y not in done]
+    if missing:
+        logging.info(f"corr={corr} plan={plan_id}: waiting on {len(missing)} of {len(plan['years'])} shards")
+        return False
+    if not shards.claim_final(corr, plan_id, TRANSFORM_SHARD_CLAIM_TIMEOUT_S):
+        logging.info(f"corr={corr} plan={plan_id}: combined by another replica")
+        return False
+
+    ext, _ = OUTPUT_FORMATS[out_format]
+    out_key = f"{PREFIX}/corr={corr}/merged.{ext}"
+    with tempfile.TemporaryDirectory(prefix="xform-shards-") as tmp:
+        parts = []
+        for year in plan["years"]:
+            if done[year].get("key"):
+                path = os.path.join(tmp, f"year={year}.parquet")
+                try:
+                    with stage_timer("download", "shard"):
+                        shards.fget_part(corr, plan_id, year, path)
+                except S3Error as e:
+                    if e.code not in {"NoSuchKey", "NoSuchObject"}:
+                        raise
+                    logging.info(f"corr={corr} plan={plan_id}: parts already combined and removed")
+                    return False
+                parts.append(path)
+        if parts:
+            write_parts(cli, out_bucket, out_key, parts, out_format)
+        else:
+            write_frame(cli, out_bucket, out_key, pl.DataFrame(), out_format)
+    rows = sum(d.get("rows", 0) for d in done.values())
+    cols = max((d.get("cols", 0) for d in done.values()), default=0)
+    logging.info(f"Wrote s3://{out_bucket}/{out_key} (rows={rows}, cols={cols}, shards={len(done)})")
+
+    publish_clean_job(job_id=plan.get("job_id"), bucket=out_bucket, file=out_key,
+                      corr_id=corr, fmt=out_format)
+    shards.put_final(corr, plan_id, {"key": out_key, "rows": rows, "cols": cols})
+    shards.remove_parts(corr, plan_id)
+    TRANSFORMER_SHARDS_TOTAL.labels(result="finalized").inc()
+    TRANSFORM_JOBS_TOTAL.labels(status="success").inc()
+    return True
 
 
 # ---------------------------------
@@ -375,6 +1786,54 @@ def wait_for_port(host: str, port: int, tries: int = 60, delay: float = 1.0):
             time.sleep(delay)
     return False
 
+def handle_transform_message(msg: dict) -> None:
+    """Run one transform message end to end (transform + clean publish); raises on failure."""
+    mtype = msg.get("type", "")
+    if mtype == "transform_shard":
+        logging.info(f"Received transform shard corr={msg.get('corr_id')} year={msg.get('year')}")
+        run_transform_shard(msg)
+        TRANSFORMER_MESSAGES_TOTAL.labels(result="processed").inc()
+        return
+    if mtype not in ("transform", "clean"):
+        logging.info(f"ignoring message type={mtype!r}")
+        TRANSFORMER_MESSAGES_TOTAL.labels(result="ignored").inc()
+        return
+
+    logging.info(f"Received transform job (type={mtype}) corr={msg.get('corr_id')}")
+    if coordinate_shards(msg):
+        TRANSFORMER_MESSAGES_TOTAL.labels(result="processed").inc()
+        return
+    try:
+        result = run_transform_job(msg)
+    except Exception:
+        discard_silver(msg.get("corr_id"))
+        raise
+    publish_transform_result(msg, result)
+
+def publish_transform_result(msg: dict, result: tuple) -> None:
+    out_bucket, out_key, out_format = result
+
+    # We publish clean jobs here -----------------------------------------------------------------------
+    try:
+        publish_clean_job(
+            job_id=msg.get("job_id"),
+            bucket=out_bucket,
+            file=out_key,     # something like "prefix/corr=abcd1234/merged.csv"
+            corr_id=msg.get("corr_id"),
+            fmt=out_format
+        )
+    except Exception:
+        discard_silver(msg.get("corr_id"))
+        raise
+    flush_silver(minio_client(), out_bucket, msg.get("corr_id"))
+    if PAGE_EVENTS_QUEUE:
+        # the clean job is out; a redelivery re-reads the raw pages instead
+        try:
+            PartialStore(minio_client(), out_bucket).remove(msg.get("corr_id"))
+        except Exception as e:
+            logging.warning(f"corr={msg.get('corr_id')}: page partials not removed: {e}")
+    TRANSFORMER_MESSAGES_TOTAL.labels(result="processed").inc()
+
 def start_consumer():
     from pika.exceptions import AMQPConnectionError, ProbableAccessDeniedError, ProbableAuthenticationError
 
@@ -406,40 +1865,129 @@ def start_consumer():
 
     ch = conn.channel()
     ch.queue_declare(queue=TRANSFORM_QUEUE, durable=True)
-    ch.basic_qos(prefetch_count=1)
+    # with coalescing, every worker needs a full batch in flight
+    ch.basic_qos(prefetch_count=max(TRANSFORM_PREFETCH, TRANSFORM_WORKERS * max(1, TRANSFORM_BATCH_MAX)))
+
+    # Jobs run on worker threads so this (I/O) thread keeps servicing heartbeats;
+    # acks/nacks are handed back to it through add_callback_threadsafe.
+    pool = ThreadPoolExecutor(max_workers=max(1, TRANSFORM_WORKERS), thread_name_prefix="job")
+
+    def settle(delivery_tag, ok: bool):
+        if not ch.is_open:
+            return  # channel is gone; the broker redelivers unacked messages
+        if ok:
+            ch.basic_ack(delivery_tag=delivery_tag)
+        else:
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=False)
 
-    def on_msg(chx, method, props, body):
+    def work(delivery_tag, body):
+        ok = True
         try:
-            msg = json.loads(body.decode("utf-8"))
-            mtype = msg.get("type", "")
-            if mtype not in ("transform", "clean"):
-                logging.info(f"ignoring message type={mtype!r}")
-                chx.basic_ack(delivery_tag=method.delivery_tag)
-                return
-
-            logging.info(f"Received transform job (type={mtype}) corr={msg.get('corr_id')}")
-            out_bucket, out_key = run_transform_job(msg)
-            
-            # We publish clean jobs here -----------------------------------------------------------------------
-            publish_clean_job(
-            job_id=msg.get("job_id"),
-            bucket=out_bucket,
-            file=out_key,     # something like "prefix/corr=abcd1234/merged.csv"
-            corr_id=msg.get("corr_id")
-            )
+            handle_transform_message(json.loads(body.decode("utf-8")))
+        except Exception:
+            traceback.print_exc()
+            TRANSFORMER_MESSAGES_TOTAL.labels(result="failed").inc()
+            ok = False
+        conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, ok))
 
-            chx.basic_ack(delivery_tag=method.delivery_tag)
+    def work_batch(items):
+        msgs, tags = [], []
+        for delivery_tag, body in items:
+            try:
+                msg = json.loads(body.decode("utf-8"))
+            except Exception:
+                traceback.print_exc()
+                TRANSFORMER_MESSAGES_TOTAL.labels(result="failed").inc()
+                conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, False))
+                continue
+            ok, alone = True, True
+            try:
+                if msg.get("type", "") not in ("transform", "clean"):
+                    handle_transform_message(msg)   # shards run on their own; anything else is ignored
+                elif coordinate_shards(msg):
+                    TRANSFORMER_MESSAGES_TOTAL.labels(result="processed").inc()
+                else:
+                    alone = False
+            except Exception:
+                traceback.print_exc()
+                TRANSFORMER_MESSAGES_TOTAL.labels(result="failed").inc()
+                ok = False
+            if alone:
+                conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, ok))
+                continue
+            msgs.append(msg)
+            tags.append(delivery_tag)
+
+        if msgs:
+            logging.info(f"Received {len(msgs)} transform jobs: corrs={[m.get('corr_id') for m in msgs]}")
+        for delivery_tag, msg, result in zip(tags, msgs, run_transform_batch(msgs) if msgs else []):
+            ok = True
+            try:
+                if isinstance(result, Exception):
+                    discard_silver(msg.get("corr_id"))
+                    raise result
+                publish_transform_result(msg, result)
+            except Exception:
+                traceback.print_exc()
+                TRANSFORMER_MESSAGES_TOTAL.labels(result="failed").inc()
+                ok = False
+            conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, ok))
+
+    def work_page(delivery_tag, body):
+        # a failed page is only a missed head start: final assembly loads its objects itself
+        ok = True
+        try:
+            msg = json.loads(body.decode("utf-8"))
+            if msg.get("type") == "page":
+                handle_page_event(msg)
+            else:
+                logging.info(f"ignoring message type={msg.get('type')!r} on '{PAGE_EVENTS_QUEUE}'")
         except Exception:
             traceback.print_exc()
-            chx.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            TRANSFORMER_PAGE_PARTIALS_TOTAL.labels(result="failed").inc()
+            ok = False
+        conn.add_callback_threadsafe(functools.partial(settle, delivery_tag, ok))
+
+    # Coalescing state; only touched on this (I/O) thread
+    pending: List[tuple] = []
+    timer = [None]
+
+    def flush():
+        if timer[0] is not None:
+            conn.remove_timeout(timer[0])
+            timer[0] = None
+        if pending:
+            pool.submit(work_batch, list(pending))
+            pending.clear()
 
-    logging.info(f"Up. Waiting for jobs on queue '{TRANSFORM_QUEUE}'")
+    def on_msg(chx, method, props, body):
+        if TRANSFORM_BATCH_MAX <= 1:
+            pool.submit(work, method.delivery_tag, body)
+            return
+        pending.append((method.delivery_tag, body))
+        if len(pending) >= TRANSFORM_BATCH_MAX:
+            flush()
+        elif timer[0] is None:
+            timer[0] = conn.call_later(TRANSFORM_BATCH_WAIT_MS / 1000.0, flush)
+
+    logging.info(f"Up. Waiting for jobs on queue '{TRANSFORM_QUEUE}' (workers={TRANSFORM_WORKERS}, "
+                 f"prefetch={TRANSFORM_PREFETCH}, batch={TRANSFORM_BATCH_MAX}/{TRANSFORM_BATCH_WAIT_MS}ms)")
     ch.basic_consume(queue=TRANSFORM_QUEUE, on_message_callback=on_msg)
+    if PAGE_EVENTS_QUEUE:
+        ch.queue_declare(queue=PAGE_EVENTS_QUEUE, durable=True)
+        ch.basic_consume(queue=PAGE_EVENTS_QUEUE,
+                         on_message_callback=lambda chx, method, props, body:
+                             pool.submit(work_page, method.delivery_tag, body))
+        logging.info(f"Pre-building page partials from queue '{PAGE_EVENTS_QUEUE}'")
     try:
         ch.start_consuming()
     except KeyboardInterrupt:
         try: ch.stop_consuming()
         except Exception: pass
+        flush()
+        pool.shutdown(wait=True)
+        try: conn.process_data_events(time_limit=0)  # flush pending acks
+        except Exception: pass
         try: conn.close()
         except Exception: pass
 
@@ -455,7 +2003,18 @@ if __name__ == "__main__":
             TRANSFORMER_UPTIME_SECONDS.set(time.time() - start_time)
             time.sleep(5)
 
-    import threading
+    # Keep the job publishers' connections alive between jobs
+    def publisher_keepalive():
+        while True:
+            time.sleep(10)
+            CLEAN_PUBLISHER.keepalive()
+            SHARD_PUBLISHER.keepalive()
+
     threading.Thread(target=update_uptime, daemon=True).start()
+    threading.Thread(target=publisher_keepalive, daemon=True).start()
+
+    if TRANSFORM_SHARD_YEARS and AGG_STATE_ENABLED:
+        logging.warning("TRANSFORM_SHARD_YEARS=true has no effect while AGG_STATE_ENABLED=true "
+                        "(agg state is single-replica); corrs run unsharded")
 
     start_consumer()
\ No newline at end of file